@@ -0,0 +1,129 @@
+"""
+Cache of analytics results, invalidated by the writes of any process.
+
+Every HabitManager write increases the version in the data_versions table in its own
+transaction. AnalyticsCache keeps the results of each database together with the
+version they were computed for: a lookup reads the version with one query, returns
+the cached result if it is unchanged and otherwise drops every result of the
+database. Parameterized results (e.g. trends per grain) are evicted least recently
+used first.
+
+Example:
+    >>> analytics_cache.cache.get(session, ('trend', 'week', 12, clock.today()),
+    ...                           lambda: rollup_module.get_trend(session, 'week', 12))
+"""
+import copy
+import threading
+import weakref
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import text
+
+# The versioned data of the habit tables.
+HABITS = 'habits'
+# Results kept per database.
+MAX_ENTRIES = 128
+
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions', 'size'])
+
+SELECT_VERSION = text("SELECT version FROM data_versions WHERE name = :name")
+BUMP_VERSION = text("INSERT INTO data_versions (name, version) VALUES (:name, 1) "
+                    "ON CONFLICT (name) DO UPDATE SET version = version + 1")
+
+
+def data_version(session, name=HABITS):
+    """
+    Returns:
+        int: The committed version of the data, 0 before the first write.
+    """
+    return session.execute(SELECT_VERSION, {'name': name}).scalar() or 0
+
+
+def bump_data_version(session, name=HABITS):
+    """
+    Increases the version of the data in the current transaction, without committing.
+
+    Args:
+        session: The database session of the write.
+        name (str): The versioned data.
+    """
+    session.execute(BUMP_VERSION, {'name': name})
+
+
+class AnalyticsCache:
+    """
+    Results of analytics by database and key, valid while the data version is unchanged.
+
+    Args:
+        max_entries (int): Results kept per database; the least recently used one is evicted first.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        """
+        Initializes AnalyticsCache with no results.
+
+        Args:
+            max_entries (int): Results kept per database.
+        """
+        self.max_entries = max_entries
+        self.hits = self.misses = self.evictions = 0
+        # Engine -> [version, OrderedDict of key -> result]; an engine that is garbage collected drops its results.
+        self._databases = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Returns the number of cached results over all databases."""
+        with self._lock:
+            return sum(len(results) for _, results in self._databases.values())
+
+    def get(self, session, key, compute):
+        """
+        Returns the cached result of key, or computes and caches it.
+
+        The version is read before compute runs, so a result is never cached for a newer
+        version than the data it was computed from.
+
+        Args:
+            session: The database session; the result is cached for the database it is bound to.
+            key (tuple): Hashable key with all parameters of the result, e.g. ('trend', 'week', 12, end).
+            compute: Callable without arguments returning the result.
+
+        Returns:
+            A shallow copy of the result, so that callers can replace its items.
+        """
+        version = data_version(session)
+        with self._lock:
+            database = self._databases.setdefault(session.get_bind(), [version, OrderedDict()])
+            if version > database[0]:
+                database[:] = [version, OrderedDict()]
+            results = database[1]
+            if database[0] == version and key in results:
+                self.hits += 1
+                results.move_to_end(key)
+                return copy.copy(results[key])
+            self.misses += 1
+        result = compute()
+        with self._lock:
+            if database[0] == version:
+                results[key] = result
+                while len(results) > self.max_entries:
+                    results.popitem(last=False)
+                    self.evictions += 1
+        return copy.copy(result)
+
+    def stats(self):
+        """
+        Returns:
+            CacheStats: The hits, misses and evictions since the last clear() and the number of cached results.
+        """
+        return CacheStats(self.hits, self.misses, self.evictions, len(self))
+
+    def clear(self):
+        """Drops all results and resets the counters."""
+        with self._lock:
+            self._databases.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+# The cache of the process, shared by the statistics screen and the HTTP service.
+cache = AnalyticsCache()
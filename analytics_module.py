@@ -1,4 +1,19 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import select, func, case, cast, and_, or_, true, Integer
+
+from db.database_module import Habit, Completion, Checkpoint, HabitSummary, CheckinEvent
+from snapshot import NULL_DAY
+
+# Status of a habit summary without completion.
+ONGOING = "ONGOING"
+# 1970-01-01, day 0 of the check-in events, was a Thursday; shifted by this many days
+# the weeks of the day numbers start on Monday like the rollup weeks.
+MONDAY_OFFSET = 3
+
+HabitStreak = namedtuple('HabitStreak', ['id', 'name', 'periodicity', 'streak'])
+CheckinStreak = namedtuple('CheckinStreak', ['habit_id', 'longest_streak', 'latest_streak'])
+TenantHabitStreak = namedtuple('TenantHabitStreak', ['tenant', 'id', 'name', 'periodicity', 'streak'])
 
 
 def get_longest_streak(habits, range_streak):
@@ -38,7 +53,7 @@ def get_longest_streak(habits, range_streak):
     streak_array = []
     for habit in habits:
         streak_array.append(calculate_streak(habit))
-    return max(streak_array)
+    return max(streak_array, default=0)
 
 
 def analyze_habits(habit_manager):
@@ -72,6 +87,262 @@ def analyze_habits(habit_manager):
     }
 
 
+def days_between(started, completed):
+    """
+    SQL counterpart of calculate_days.
+
+    Args:
+        started: Column or expression with the start date.
+        completed: Column or expression with the end date.
+
+    Returns:
+        An SQL expression with the difference in days, or 0 if it is negative or unknown.
+    """
+    days = cast(func.julianday(completed) - func.julianday(started), Integer)
+    return case((days > 0, days), else_=0)
+
+
+def first_checkpoint_id():
+    """
+    Returns a scalar subquery selecting the id of the first checkpoint of each habit.
+
+    Used as join condition so SQL queries pick the same row as habit.checkpoints[0].
+    """
+    return (select(func.min(Checkpoint.id))
+            .where(Checkpoint.habit_id == Habit.id)
+            .correlate(Habit)
+            .scalar_subquery())
+
+
+def first_completion_id():
+    """
+    Returns a scalar subquery selecting the id of the first completion of each habit.
+
+    Used as join condition so SQL queries pick the same row as habit.completions[0].
+    """
+    return (select(func.min(Completion.id))
+            .where(Completion.habit_id == Habit.id)
+            .correlate(Habit)
+            .scalar_subquery())
+
+
+def analyze_habits_in_db(habit_manager, id_range=None):
+    """
+    Analyzes the habits inside the database instead of loading ORM objects.
+
+    Computes the same results as analyze_habits with SQL aggregates. The habit lists
+    contain HabitStreak rows (id, name, periodicity, streak) instead of Habit objects.
+    Like the ORM implementation, the first checkpoint and the first completion of a
+    habit are used to calculate its streak.
+
+    Args:
+        habit_manager (HabitManager): An instance of HabitManager to interact with the database.
+        id_range (tuple): Only analyze the habits with first <= id < last. Optional.
+
+    Returns:
+        dict: A dictionary containing the longest streaks, daily habits, and weekly habits.
+    """
+    first_checkpoint = first_checkpoint_id()
+    first_completion = first_completion_id()
+    ongoing_streak = days_between(Habit.created_at, Checkpoint.current_checkpoint)
+    in_range = true() if id_range is None else and_(Habit.id >= id_range[0], Habit.id < id_range[1])
+    ongoing = (select(Habit.id, Habit.name, Habit.periodicity, ongoing_streak.label('streak'))
+               .outerjoin(Checkpoint, Checkpoint.id == first_checkpoint)
+               .where(Habit.id.notin_(select(Completion.habit_id)), in_range))
+    longest_ongoing = (select(func.max(ongoing.subquery().c.streak))
+                       .scalar_subquery())
+    longest_total = (select(func.max(days_between(Habit.created_at, Completion.completion_date)))
+                     .select_from(Habit)
+                     .join(Completion, Completion.id == first_completion)
+                     .where(in_range)
+                     .scalar_subquery())
+
+    session = habit_manager.session
+    longest_ongoing_streak, longest_total_streak = session.execute(
+        select(func.coalesce(longest_ongoing, 0), func.coalesce(longest_total, 0))).one()
+    habits_by_periodicity = defaultdict(list)
+    for row in session.execute(ongoing.where(Habit.periodicity.in_(('daily', 'weekly'))).order_by(Habit.id)):
+        habits_by_periodicity[row.periodicity].append(HabitStreak(*row))
+
+    return {
+        'longest ongoing streak': longest_ongoing_streak,
+        'longest total streak': longest_total_streak,
+        'daily_habits': habits_by_periodicity.get('daily', []),
+        'weekly_habits': habits_by_periodicity.get('weekly', [])
+    }
+
+
+def analyze_habits_from_summary(habit_manager):
+    """
+    Analyzes the habits by reading the precomputed habit_summaries table.
+
+    Returns the same dictionary as analyze_habits_in_db without calculating any streak.
+    Habits that were never checked in have no summary yet and are listed with streak 0.
+
+    Args:
+        habit_manager (HabitManager): An instance of HabitManager to interact with the database.
+
+    Returns:
+        dict: A dictionary containing the longest streaks, daily habits, and weekly habits.
+    """
+    ongoing = HabitSummary.status == ONGOING
+    session = habit_manager.session
+    longest_ongoing_streak, longest_total_streak = session.execute(
+        select(func.coalesce(func.max(case((ongoing, HabitSummary.current_streak))), 0),
+               func.coalesce(func.max(case((~ongoing, HabitSummary.current_streak))), 0))).one()
+    habits_by_periodicity = defaultdict(list)
+    for row in session.execute(select(Habit.id, Habit.name, Habit.periodicity,
+                                      func.coalesce(HabitSummary.current_streak, 0))
+                               .outerjoin(HabitSummary, HabitSummary.habit_id == Habit.id)
+                               .where(or_(ongoing, HabitSummary.habit_id.is_(None)),
+                                      Habit.periodicity.in_(('daily', 'weekly')))
+                               .order_by(Habit.id)):
+        habits_by_periodicity[row.periodicity].append(HabitStreak(*row))
+
+    return {
+        'longest ongoing streak': longest_ongoing_streak,
+        'longest total streak': longest_total_streak,
+        'daily_habits': habits_by_periodicity.get('daily', []),
+        'weekly_habits': habits_by_periodicity.get('weekly', [])
+    }
+
+
+def analyze_snapshot(snapshot):
+    """
+    Analyzes the habits of a columnar snapshot without touching the database.
+
+    Computes the same results as analyze_habits_in_db from the memory-mapped columns,
+    using the first checkpoint and the first completion of every habit.
+
+    Args:
+        snapshot (snapshot.Snapshot): The snapshot to analyze.
+
+    Returns:
+        dict: A dictionary containing the longest streaks, daily habits, and weekly habits.
+    """
+    current_checkpoints = {}
+    for habit_id, current_checkpoint in zip(snapshot.column('checkpoints', 'habit_id'),
+                                            snapshot.column('checkpoints', 'current_checkpoint')):
+        current_checkpoints.setdefault(habit_id, current_checkpoint)
+    completion_dates = {}
+    for habit_id, completion_date in zip(snapshot.column('completions', 'habit_id'),
+                                         snapshot.column('completions', 'completion_date')):
+        completion_dates.setdefault(habit_id, completion_date)
+
+    def days(started, completed):
+        if started == NULL_DAY or completed is None or completed == NULL_DAY:
+            return 0
+        return max(completed - started, 0)
+
+    periodicities = snapshot.values('habits', 'periodicity')
+    longest_ongoing_streak = longest_total_streak = 0
+    habits_by_periodicity = defaultdict(list)
+    for index, (habit_id, code, created_at) in enumerate(zip(snapshot.column('habits', 'id'),
+                                                             snapshot.column('habits', 'periodicity'),
+                                                             snapshot.column('habits', 'created_at'))):
+        if habit_id in completion_dates:
+            longest_total_streak = max(longest_total_streak, days(created_at, completion_dates[habit_id]))
+            continue
+        streak = days(created_at, current_checkpoints.get(habit_id))
+        longest_ongoing_streak = max(longest_ongoing_streak, streak)
+        periodicity = periodicities[code]
+        if periodicity in ('daily', 'weekly'):
+            habits_by_periodicity[periodicity].append(HabitStreak(habit_id, snapshot.name(index), periodicity, streak))
+
+    return {
+        'longest ongoing streak': longest_ongoing_streak,
+        'longest total streak': longest_total_streak,
+        'daily_habits': habits_by_periodicity.get('daily', []),
+        'weekly_habits': habits_by_periodicity.get('weekly', [])
+    }
+
+
+def get_checkin_streaks(session):
+    """
+    Calculates the streaks of every habit from its check-in history.
+
+    A streak is a run of consecutive periods (days for daily, weeks starting on Monday
+    for weekly habits) with at least one check-in. The runs are found in SQL as gaps and islands: within
+    a habit, period - ROW_NUMBER() is constant for consecutive periods.
+
+    Args:
+        session: The database session to use.
+
+    Returns:
+        list: CheckinStreak rows (habit_id, longest_streak, latest_streak) ordered by habit id,
+        with the streaks counted in periods. latest_streak is the run ending with the last check-in.
+    """
+    weekly = Habit.periodicity == 'weekly'
+    period = (CheckinEvent.day + case((weekly, MONDAY_OFFSET), else_=0)) // case((weekly, 7), else_=1)
+    periods = (select(CheckinEvent.habit_id, period.label('period'))
+               .join(Habit, Habit.id == CheckinEvent.habit_id)
+               .distinct()
+               .subquery())
+    islands = (select(periods.c.habit_id,
+                      (periods.c.period - func.row_number().over(partition_by=periods.c.habit_id,
+                                                                 order_by=periods.c.period)).label('island'))
+               .subquery())
+    runs = (select(islands.c.habit_id, islands.c.island, func.count().label('length'),
+                   func.max(islands.c.island).over(partition_by=islands.c.habit_id).label('latest_island'))
+            .group_by(islands.c.habit_id, islands.c.island)
+            .subquery())
+    query = (select(runs.c.habit_id, func.max(runs.c.length),
+                    func.max(case((runs.c.island == runs.c.latest_island, runs.c.length))))
+             .group_by(runs.c.habit_id)
+             .order_by(runs.c.habit_id))
+    return [CheckinStreak(*row) for row in session.execute(query)]
+
+
+def merge_analyses(results):
+    """
+    Merges analysis results of disjoint sets of habits into one result.
+
+    Args:
+        results: Iterable of dictionaries as returned by analyze_habits_in_db.
+
+    Returns:
+        dict: The longest streaks over all results and the concatenated habit lists.
+    """
+    merged = {'longest ongoing streak': 0, 'longest total streak': 0, 'daily_habits': [], 'weekly_habits': []}
+    for result in results:
+        for key in ('longest ongoing streak', 'longest total streak'):
+            merged[key] = max(merged[key], result[key])
+        for key in ('daily_habits', 'weekly_habits'):
+            merged[key].extend(result[key])
+    return merged
+
+
+def analyze_tenants(router, analyze=analyze_habits_from_summary, tenants=None):
+    """
+    Analyzes the habits of every tenant database of a shard router.
+
+    Args:
+        router (db.shards.ShardRouter): The router of the tenant databases.
+        analyze: The analysis run per tenant, returning HabitStreak rows.
+        tenants (list): The tenants to analyze. Defaults to all tenants.
+
+    Returns:
+        dict: The merged result; the habit lists contain TenantHabitStreak rows.
+    """
+    return merge_tenant_analyses(router.fan_out(analyze, tenants))
+
+
+def merge_tenant_analyses(results):
+    """
+    Merges analysis results of several tenant databases.
+
+    Args:
+        results (dict): Results as returned by analyze_habits_in_db by tenant.
+
+    Returns:
+        dict: The merged result; the habit lists contain TenantHabitStreak rows.
+    """
+    for tenant, result in results.items():
+        for key in ('daily_habits', 'weekly_habits'):
+            result[key] = [TenantHabitStreak(tenant, *habit) for habit in result[key]]
+    return merge_analyses(results.values())
+
+
 def calculate_days(started, completed):
     return (completed - started).days if completed > started else 0
 
@@ -0,0 +1,141 @@
+import contextlib
+import sys
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+import analytics_module
+from db.database_module import Base, create_indexes, get_settings, set_sqlite_pragmas
+from habit import HabitManager
+
+
+def async_url(url):
+    """
+    Returns the aiosqlite variant of a sqlite URL; other URLs are returned unchanged.
+
+    Requires the aiosqlite driver: pip install aiosqlite
+    """
+    return 'sqlite+aiosqlite://' + url[len('sqlite://'):] if url.startswith('sqlite://') else url
+
+
+class AsyncHabitManager:
+    """
+    Asyncio counterpart of HabitManager.
+
+    Every operation runs in its own session, so many coroutines can use one manager
+    concurrently. The check-in, completion and validation rules are shared with
+    HabitManager by running it on the async session with run_sync.
+
+    Args:
+        session_factory: An async_sessionmaker creating the session of each operation.
+        engine: The async engine owned by the manager, disposed of by close(). Optional.
+    """
+
+    def __init__(self, session_factory, engine=None):
+        """
+        Initializes AsyncHabitManager with an async session factory.
+
+        Args:
+            session_factory: An async_sessionmaker creating the session of each operation.
+            engine: The async engine owned by the manager, disposed of by close(). Optional.
+        """
+        self.session_factory = session_factory
+        self.engine = engine
+
+    @classmethod
+    async def create(cls, url=None, **engine_options):
+        """
+        Creates a manager with its own async engine and creates the tables and indexes if needed.
+
+        SQLite connections get the pragmas of the configured database settings.
+
+        Args:
+            url (str): The async database URL, e.g. "sqlite+aiosqlite:///habits.db".
+                Defaults to the aiosqlite variant of the configured URL.
+            **engine_options: Passed on to create_async_engine.
+
+        Returns:
+            AsyncHabitManager: The manager; call close() to dispose of the engine.
+        """
+        settings = get_settings()
+        engine = create_async_engine(url or async_url(settings.url), **engine_options)
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine.sync_engine, 'connect',
+                         lambda dbapi_connection, connection_record: set_sqlite_pragmas(dbapi_connection, settings))
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+            await connection.run_sync(create_indexes)
+        return cls(async_sessionmaker(engine, expire_on_commit=False), engine)
+
+    async def close(self):
+        """
+        Disposes of the engine created by create().
+        """
+        if self.engine is not None:
+            await self.engine.dispose()
+
+    async def _run(self, operation):
+        """
+        Runs operation(habit_manager) with a HabitManager on a new session.
+        """
+        async with self.session_factory() as session:
+            return await session.run_sync(lambda sync_session: operation(HabitManager(sync_session)))
+
+    async def add_habit(self, name, periodicity, target_date):
+        """
+        Adds a new habit and checks it in with HabitManager.add_habit, whose messages go to stderr.
+
+        Returns:
+            Habit: The new habit.
+        """
+        def add_habit(manager):
+            with contextlib.redirect_stdout(sys.stderr):
+                return manager.add_habit(name, periodicity, target_date)
+
+        return await self._run(add_habit)
+
+    async def checkin_habit(self, habit_id: int):
+        await self._run(lambda manager: manager.checkin_habit(habit_id))
+
+    async def complete_habit(self, habit_id: int):
+        """
+        Returns:
+            bool: True if the habit exists and was completed.
+        """
+        return await self._run(lambda manager: manager.complete_habit(habit_id))
+
+    async def list_habits(self):
+        """
+        Returns:
+            list: All habits without a completion.
+        """
+        return await self._run(lambda manager: manager.list_habits())
+
+    async def validate_habits(self, habit_ids=None):
+        """
+        Args:
+            habit_ids (list): Only validate these habits. Optional.
+
+        Returns:
+            list: The BrokenHabit records of the habits that were completed.
+        """
+        return await self._run(lambda manager: manager.validate_habits(interactive=False, habit_ids=habit_ids))
+
+    async def run(self, operation):
+        """
+        Runs operation(habit_manager) on a new session, for reads without a method of their own.
+
+        Returns:
+            The result of operation.
+        """
+        return await self._run(operation)
+
+    async def analyze_habits(self, analyze=analytics_module.analyze_habits_in_db):
+        """
+        Args:
+            analyze: The analytics_module function to run, returning plain rows.
+
+        Returns:
+            dict: The result of analyze.
+        """
+        return await self._run(analyze)
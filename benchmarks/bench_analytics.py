@@ -0,0 +1,44 @@
+"""
+Compares the analytics implementations on a generated database.
+
+Usage:
+    python benchmarks/bench_analytics.py [number of habits ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import analytics_module  # noqa: E402
+import columnar_analytics  # noqa: E402
+from dataset import create_database  # noqa: E402
+from habit import HabitManager  # noqa: E402
+
+DEFAULT_SIZES = (10000, 100000)
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def run(count):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_database(os.path.join(directory, 'bench.db'), count)
+        for name, analyze in (('orm', analytics_module.analyze_habits),
+                              ('sql', analytics_module.analyze_habits_in_db),
+                              ('columnar', columnar_analytics.analyze_habits_columnar)):
+            session = sessionmaker(bind=engine)()
+            print(f"{count:>9} habits  {name:<9} {timed(analyze, HabitManager(session)):8.3f}s")
+            session.close()
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    for size in [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES:
+        run(size)
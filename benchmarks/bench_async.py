@@ -0,0 +1,79 @@
+"""
+Compares check-in throughput of HabitManager and AsyncHabitManager.
+
+Usage:
+    python benchmarks/bench_async.py [number of check-ins] [concurrency]
+"""
+import asyncio
+import contextlib
+import datetime
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from async_habit import AsyncHabitManager  # noqa: E402
+from db.config import load_settings  # noqa: E402
+from db.database_module import Habit, build_engine  # noqa: E402
+from habit import HabitManager  # noqa: E402
+
+HABITS = 100
+
+
+def populate(path):
+    engine = build_engine(load_settings(url='sqlite:///' + path))
+    session = sessionmaker(bind=engine)()
+    session.execute(Habit.__table__.insert(), [
+        {'id': habit_id, 'name': 'habit ' + str(habit_id), 'periodicity': 'daily',
+         'created_at': datetime.date.today(), 'target_date': datetime.date.max}
+        for habit_id in range(1, HABITS + 1)])
+    session.commit()
+    return engine, session
+
+
+def bench_sync(path, count):
+    engine, session = populate(path)
+    manager = HabitManager(session)
+    started = time.perf_counter()
+    for number in range(count):
+        manager.checkin_habit(number % HABITS + 1)
+    elapsed = time.perf_counter() - started
+    session.close()
+    engine.dispose()
+    return elapsed
+
+
+async def bench_async(path, count, concurrency):
+    engine, session = populate(path)
+    session.close()
+    engine.dispose()
+    manager = await AsyncHabitManager.create('sqlite+aiosqlite:///' + path)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def checkin(habit_id):
+        async with semaphore:
+            await manager.checkin_habit(habit_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(checkin(number % HABITS + 1) for number in range(count)))
+    elapsed = time.perf_counter() - started
+    await manager.close()
+    return elapsed
+
+
+def main(count=2000, concurrency=16):
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        sync_seconds = bench_sync(os.path.join(directory, 'sync.db'), count)
+        async_seconds = asyncio.run(bench_async(os.path.join(directory, 'async.db'), count, concurrency))
+    print(f"sync   {count} check-ins {sync_seconds:7.3f}s  {count / sync_seconds:8.0f} ops/s")
+    print(f"async  {count} check-ins {async_seconds:7.3f}s  {count / async_seconds:8.0f} ops/s "
+          f"(concurrency {concurrency})")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,168 @@
+"""
+Load generator for the HTTP/JSON service.
+
+Starts "python cli.py serve" on a temporary synthetic database and sends a check-in heavy
+and an analytics heavy request mix from concurrent clients with persistent connections.
+Prints the requests per second, the p50/p95/p99 latency and the non-2xx responses of
+every mix.
+
+Usage:
+    python benchmarks/bench_http.py [--habits 10000] [--requests 2000] [--concurrency 8] [--mix checkin]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset import create_database  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Relative weights of the operations of every mix.
+MIXES = {
+    'checkin': {'checkin': 80, 'get_habit': 10, 'list_habits': 5, 'habit_trend': 5},
+    'analytics': {'stats': 40, 'trend': 30, 'habit_trend': 20, 'checkin': 10},
+}
+
+
+def operation_request(operation, rng, habits):
+    """
+    Returns:
+        tuple: The method, path and JSON body of one request of the operation.
+    """
+    habit_id = rng.randint(1, habits)
+    if operation == 'checkin':
+        return 'POST', f'/habits/{habit_id}/checkin', None
+    if operation == 'get_habit':
+        return 'GET', f'/habits/{habit_id}', None
+    if operation == 'list_habits':
+        return 'GET', f'/habits?order_by=name&name_prefix=habit%20{habit_id % 100}&limit=50', None
+    if operation == 'habit_trend':
+        return 'GET', f'/habits/{habit_id}/trend?grain=day&periods=30', None
+    if operation == 'stats':
+        return 'GET', '/stats', None
+    if operation == 'trend':
+        return 'GET', '/trend?grain=' + rng.choice(('day', 'week', 'month')) + '&periods=12', None
+    raise ValueError(f"unknown operation: {operation}")
+
+
+def start_service(path, pool_size):
+    """
+    Starts the service on a free port.
+
+    Returns:
+        tuple: The process and its (host, port).
+    """
+    environment = dict(os.environ, HABITS_URL='sqlite:///' + path)
+    command = [sys.executable, os.path.join(ROOT, 'cli.py'), 'serve', '--port', '0']
+    if pool_size:
+        command += ['--pool-size', str(pool_size)]
+    process = subprocess.Popen(command, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               text=True)
+    for line in process.stderr:
+        match = re.search(r'http://([^:]+):(\d+)', line)
+        if match:
+            # Keeps reading stderr so that the service never blocks on a full pipe.
+            threading.Thread(target=process.stderr.read, daemon=True).start()
+            return process, (match.group(1), int(match.group(2)))
+    raise RuntimeError(f"the service exited with {process.wait()}")
+
+
+def run_mix(address, mix, habits, requests, concurrency, seed=42):
+    """
+    Sends requests of the mix from concurrent clients.
+
+    Returns:
+        dict: Requests, requests per second, p50/p95/p99 latency in milliseconds and the count of every non-2xx status.
+    """
+    operations, weights = zip(*MIXES[mix].items())
+    rng = random.Random(seed)
+    plan = [operation_request(operation, rng, habits)
+            for operation in rng.choices(operations, weights, k=requests)]
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    next_request = iter(plan)
+
+    def client():
+        connection = http.client.HTTPConnection(*address, timeout=60)
+        try:
+            while True:
+                with lock:
+                    request = next(next_request, None)
+                if request is None:
+                    return
+                method, path, body = request
+                started = time.perf_counter()
+                connection.request(method, path, body=body and json.dumps(body))
+                response = connection.getresponse()
+                response.read()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[response.status] += 1
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {'mix': mix, 'requests': len(latencies), 'requests_per_second': round(len(latencies) / elapsed, 1),
+            **{f'p{percent}_ms': round(percentile(latencies, percent) * 1000, 2) for percent in (50, 95, 99)},
+            'errors': {str(status): count for status, count in sorted(statuses.items()) if not 200 <= status < 300}}
+
+
+def percentile(sorted_values, percent):
+    """
+    Returns:
+        float: The nearest-rank percentile of the sorted values.
+    """
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, -(-len(sorted_values) * percent // 100) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--habits', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per mix')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=None)
+    parser.add_argument('--mix', choices=sorted(MIXES), action='append', help='default: all mixes')
+    parser.add_argument('--json', action='store_true', help='print one JSON object per mix')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'habits.db')
+        create_database(path, args.habits).dispose()
+        process, address = start_service(path, args.pool_size)
+        try:
+            for mix in args.mix or sorted(MIXES, reverse=True):
+                result = run_mix(address, mix, args.habits, args.requests, args.concurrency)
+                if args.json:
+                    print(json.dumps(result))
+                else:
+                    print(f"{mix:<10} {result['requests']:>6} requests {result['requests_per_second']:>8.1f} req/s  "
+                          f"p50 {result['p50_ms']:>7.2f} ms  p95 {result['p95_ms']:>7.2f} ms  "
+                          f"p99 {result['p99_ms']:>7.2f} ms  errors {result['errors'] or 'none'}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Compares the ORM habit listings with the read-only HabitRecord variants on a generated database.
+
+For every size the ongoing habits are read with list_habits / list_habit_records (all
+rows kept in memory) and streamed with iter_habits / iter_habit_records. Every
+measurement uses a new session. The time and rows per second come from a run without
+tracing, the peak memory from a second run under tracemalloc.
+
+Usage:
+    python benchmarks/bench_read_models.py [number of habits ...]
+"""
+import collections
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from dataset import create_database  # noqa: E402
+from habit import HabitManager  # noqa: E402
+
+DEFAULT_SIZES = (100000, 1000000)
+
+OPERATIONS = (
+    ('list', 'orm', lambda manager: manager.list_habits()),
+    ('list', 'records', lambda manager: manager.list_habit_records()),
+    ('stream', 'orm', lambda manager: collections.deque(manager.iter_habits(status="ongoing"), maxlen=0)),
+    ('stream', 'records', lambda manager: collections.deque(manager.iter_habit_records(status="ongoing"), maxlen=0)),
+)
+
+
+def measure(engine, operation):
+    """
+    Returns:
+        tuple: Seconds and peak traced memory in bytes of the operation.
+    """
+    session = sessionmaker(bind=engine)()
+    started = time.perf_counter()
+    result = operation(HabitManager(session))
+    seconds = time.perf_counter() - started
+    del result
+    session.close()
+
+    session = sessionmaker(bind=engine)()
+    tracemalloc.start()
+    result = operation(HabitManager(session))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    session.close()
+    return seconds, peak
+
+
+def run(count):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_database(os.path.join(directory, 'bench.db'), count)
+        session = sessionmaker(bind=engine)()
+        ongoing = len(HabitManager(session).list_habit_records())
+        session.close()
+        for kind, name, operation in OPERATIONS:
+            seconds, peak = measure(engine, operation)
+            print(f"{count:>9} habits  {kind:<6} {name:<8} {seconds:8.3f}s  {ongoing / seconds:>10.0f} rows/s  "
+                  f"peak {peak / 2 ** 20:8.1f} MiB")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    for size in [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES:
+        run(size)
@@ -0,0 +1,93 @@
+"""
+Measures the start-up time of "cli.py list" and appends it to a history file.
+
+Each run records the best wall time, the import time reported by "python -X importtime"
+and the slowest top level imports, so regressions show up when comparing runs.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10] [--history benchmarks/startup_history.jsonl]
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, 'cli.py')
+DEFAULT_HISTORY = os.path.join(ROOT, 'benchmarks', 'startup_history.jsonl')
+TOP_IMPORTS = 5
+
+
+def parse_importtime(stderr):
+    """
+    Returns the cumulative microseconds of the top level imports from -X importtime output.
+    """
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            imports[name.strip()] = int(cumulative)
+    return imports
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(command, env, runs):
+    wall_times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, env=env, capture_output=True, check=True)
+        wall_times.append(time.perf_counter() - started)
+    imports = parse_importtime(subprocess.run([sys.executable, '-X', 'importtime'] + command[1:], env=env,
+                                              capture_output=True, text=True, check=True).stderr)
+    return min(wall_times), imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--history', default=DEFAULT_HISTORY)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, HABITS_URL='sqlite:///' + os.path.join(directory, 'habits.db'))
+        subprocess.run([sys.executable, CLI, 'add', 'benchmark'], env=env, capture_output=True, check=True)
+        wall_time, imports = measure([sys.executable, CLI, 'list'], env, args.runs)
+
+    record = {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+              'revision': git_revision(),
+              'python': sys.version.split()[0],
+              'command': 'cli.py list',
+              'wall_ms': round(wall_time * 1000, 1),
+              'import_ms': round(sum(imports.values()) / 1000, 1),
+              'slowest_imports': {name: round(micro / 1000, 1) for name, micro in
+                                  sorted(imports.items(), key=lambda item: -item[1])[:TOP_IMPORTS]}}
+
+    previous = None
+    if os.path.exists(args.history):
+        with open(args.history) as history:
+            lines = [line for line in history if line.strip()]
+        previous = json.loads(lines[-1]) if lines else None
+    with open(args.history, 'a') as history:
+        history.write(json.dumps(record) + '\n')
+
+    print(json.dumps(record, indent=2))
+    if previous is not None:
+        print(f"wall time {previous['wall_ms']} ms -> {record['wall_ms']} ms, "
+              f"import time {previous['import_ms']} ms -> {record['import_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
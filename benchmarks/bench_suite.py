@@ -0,0 +1,187 @@
+"""
+Times the HabitManager operations and analytics on synthetic databases.
+
+Every size gets a fresh database from benchmarks/dataset.py. The results are written as
+JSON and can be compared with a stored baseline; operations slower than the baseline
+by more than the tolerance are reported and make the run exit with status 1.
+
+Usage:
+    python benchmarks/bench_suite.py [--sizes 1000 10000 100000] [--output results.json]
+                                     [--baseline benchmarks/baseline.json] [--save-baseline]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+import analytics_module  # noqa: E402
+from bench_startup import git_revision  # noqa: E402
+from dataset import create_database, write_json_files  # noqa: E402
+from db.database_module import Base, Habit  # noqa: E402
+from db.initialize_db import bulk_import  # noqa: E402
+from habit import HabitManager  # noqa: E402
+from snapshot import Snapshot, export_snapshot  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+DEFAULT_OUTPUT = os.path.join(ROOT, 'benchmarks', 'results.json')
+CHECKINS = 200
+# Slowdowns below this many seconds are timer noise, not regressions.
+MIN_REGRESSION_SECONDS = 0.01
+SEED = 42
+TODAY = datetime.date.today()
+
+
+def _timed(function):
+    """Returns an operation timing function(manager) on a fresh session of the database."""
+    def operation(path, size):
+        engine = create_engine('sqlite:///' + path)
+        session = sessionmaker(bind=engine)()
+        try:
+            started = time.perf_counter()
+            function(HabitManager(session))
+            return time.perf_counter() - started
+        finally:
+            session.close()
+            engine.dispose()
+    return operation
+
+
+def _checkin_habits(manager):
+    count = manager.session.query(Habit).count()
+    rng = random.Random(SEED)
+    for _ in range(CHECKINS):
+        manager.checkin_habit(rng.randint(1, count), TODAY)
+
+
+def _load_data(path, size):
+    """Times the bulk import behind load_data_from_sql into an empty database."""
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_json_files(directory, size, seed=SEED, today=TODAY)
+        engine = create_engine('sqlite:///' + os.path.join(directory, 'import.db'))
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            return bulk_import(*paths, db_session=session).seconds
+        finally:
+            session.close()
+            engine.dispose()
+
+
+def _analyze_snapshot(path, size):
+    """Times analyze_snapshot on a snapshot of the database, excluding the export."""
+    snapshot_path = path + '.snapshot'
+    engine = create_engine('sqlite:///' + path)
+    session = sessionmaker(bind=engine)()
+    try:
+        export_snapshot(session, snapshot_path)
+    finally:
+        session.close()
+        engine.dispose()
+    try:
+        started = time.perf_counter()
+        with Snapshot(snapshot_path) as snapshot:
+            analytics_module.analyze_snapshot(snapshot)
+        return time.perf_counter() - started
+    finally:
+        os.remove(snapshot_path)
+
+
+# Operations that change the database run on a copy of it.
+OPERATIONS = {
+    'list_habits': (_timed(lambda manager: manager.list_habits()), False),
+    'get_ongoing_habits': (_timed(lambda manager: manager.get_ongoing_habits()), False),
+    'get_completed_habits': (_timed(lambda manager: manager.get_completed_habits()), False),
+    'checkin_habit': (_timed(_checkin_habits), True),
+    'validate_habits': (_timed(lambda manager: manager.validate_habits(interactive=False)), True),
+    'analyze_habits': (_timed(analytics_module.analyze_habits), False),
+    'analyze_habits_in_db': (_timed(analytics_module.analyze_habits_in_db), False),
+    'analyze_habits_from_summary': (_timed(analytics_module.analyze_habits_from_summary), False),
+    'analyze_snapshot': (_analyze_snapshot, False),
+    'load_data_from_sql': (_load_data, False),
+}
+
+
+def run(size, repeat):
+    """
+    Returns the best time in seconds of every operation on a database with size habits.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        create_database(path, size, seed=SEED, today=TODAY).dispose()
+        for name, (operation, writes) in OPERATIONS.items():
+            timings = []
+            for _ in range(repeat):
+                target = path
+                if writes:
+                    target = os.path.join(directory, 'copy.db')
+                    shutil.copyfile(path, target)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    timings.append(operation(target, size))
+            results[name] = round(min(timings), 6)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns (size, operation, baseline seconds, seconds) for every operation slower than
+    the baseline times tolerance, ignoring slowdowns below MIN_REGRESSION_SECONDS.
+    """
+    regressions = []
+    for size, timings in results.items():
+        for name, seconds in timings.items():
+            expected = baseline.get(size, {}).get(name)
+            if expected is not None and seconds > max(expected * tolerance, expected + MIN_REGRESSION_SECONDS):
+                regressions.append((size, name, expected, seconds))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='allowed slowdown factor')
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        results[str(size)] = run(size, args.repeat)
+        for name, seconds in results[str(size)].items():
+            print(f"{size:>9} habits  {name:<28} {seconds:9.4f}s")
+    record = {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+              'revision': git_revision(),
+              'python': sys.version.split()[0],
+              'results': results}
+    with open(args.output, 'w') as output:
+        json.dump(record, output, indent=2)
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        return
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline)['results'], args.tolerance)
+        for size, name, expected, seconds in regressions:
+            print(f"REGRESSION {size} habits {name}: {expected:.4f}s -> {seconds:.4f}s")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
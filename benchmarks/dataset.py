@@ -0,0 +1,149 @@
+"""
+Deterministic synthetic habit databases for the benchmarks.
+
+The same arguments always produce the same rows: dates are derived from the given
+today and the random generator is seeded. Roughly a third of the habits are completed
+and the ongoing ones have a checkpoint, a tenth of them with an expired streak.
+
+Usage:
+    python benchmarks/dataset.py habits.db 100000 [--seed 42] [--checkins 5]
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from db.database_module import Base, Habit, Completion, Checkpoint, CheckinEvent, to_day_number  # noqa: E402
+from rollup_module import rebuild_rollups  # noqa: E402
+from summary_module import rebuild_summaries  # noqa: E402
+
+BATCH_SIZE = 50000
+STATUSES = ('SUCCESSFULLY', 'FAILED', 'ABORTED')
+TABLES = {'habits': Habit.__table__, 'completions': Completion.__table__,
+          'checkpoints': Checkpoint.__table__, 'checkin_events': CheckinEvent.__table__}
+
+
+def generate_batches(habits, seed=42, today=None, completed_fraction=1 / 3, broken_fraction=0.1, checkins=0,
+                     batch_size=BATCH_SIZE):
+    """
+    Generates the rows of a synthetic database in batches.
+
+    Args:
+        habits (int): Number of habits.
+        seed (int): Seed of the random generator.
+        today (datetime.date): The day the data is generated for. Defaults to today.
+        completed_fraction (float): Share of habits with a completion instead of a checkpoint.
+        broken_fraction (float): Share of ongoing habits whose next checkpoint has passed.
+        checkins (int): Check-in events logged per habit.
+        batch_size (int): Habits per batch.
+
+    Yields:
+        dict: Lists of row dictionaries keyed by the table names of TABLES.
+    """
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    completion_id = checkpoint_id = 0
+    for first in range(1, habits + 1, batch_size):
+        batch = {name: [] for name in TABLES}
+        for habit_id in range(first, min(first + batch_size, habits + 1)):
+            periodicity = rng.choice(('daily', 'weekly'))
+            period = 7 if periodicity == 'weekly' else 1
+            created_at = today - datetime.timedelta(days=rng.randrange(30, 1000))
+            batch['habits'].append({'id': habit_id, 'name': 'habit ' + str(habit_id), 'periodicity': periodicity,
+                                    'created_at': created_at,
+                                    'target_date': today + datetime.timedelta(days=rng.randrange(1, 400))})
+            if rng.random() < completed_fraction:
+                completion_id += 1
+                last_checkin = created_at + datetime.timedelta(days=rng.randrange((today - created_at).days))
+                batch['completions'].append({'id': completion_id, 'habit_id': habit_id,
+                                             'completion_date': last_checkin,
+                                             'completion_status': rng.choice(STATUSES)})
+            else:
+                checkpoint_id += 1
+                if rng.random() < broken_fraction:
+                    last_checkin = today - datetime.timedelta(days=period + 1 + rng.randrange(30))
+                else:
+                    last_checkin = today - datetime.timedelta(days=rng.randrange(period))
+                batch['checkpoints'].append({'id': checkpoint_id, 'habit_id': habit_id,
+                                             'last_checkpoint': last_checkin - datetime.timedelta(days=period),
+                                             'current_checkpoint': last_checkin,
+                                             'next_checkpoint': last_checkin + datetime.timedelta(days=period),
+                                             'is_valid_streak': True})
+            first_day, last_day = to_day_number(created_at), to_day_number(last_checkin)
+            for _ in range(checkins):
+                batch['checkin_events'].append({'habit_id': habit_id, 'day': rng.randint(first_day, last_day),
+                                                'applied': True})
+        yield batch
+
+
+def populate(session, habits, **options):
+    """
+    Inserts a synthetic dataset and builds its habit summaries and rollups.
+
+    Args:
+        session: The database session to use.
+        habits (int): Number of habits.
+        **options: Passed on to generate_batches.
+    """
+    for batch in generate_batches(habits, **options):
+        for name, rows in batch.items():
+            if rows:
+                session.execute(TABLES[name].insert(), rows)
+    session.commit()
+    rebuild_summaries(session)
+    rebuild_rollups(session)
+
+
+def create_database(path, habits, **options):
+    """
+    Creates the SQLite database file path with a synthetic dataset.
+
+    Returns:
+        Engine: An engine for the new database.
+    """
+    engine = create_engine('sqlite:///' + path)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    populate(session, habits, **options)
+    session.close()
+    return engine
+
+
+def write_json_files(directory, habits, **options):
+    """
+    Writes a synthetic dataset as NDJSON files in the format read by db.initialize_db.bulk_import.
+
+    Returns:
+        tuple: The paths of the habits, completions and checkpoints files.
+    """
+    paths = tuple(os.path.join(directory, name + '.ndjson') for name in ('habits', 'completions', 'checkpoints'))
+    files = [open(path, 'w', encoding='utf-8') for path in paths]
+    try:
+        for batch in generate_batches(habits, **options):
+            for file, name in zip(files, ('habits', 'completions', 'checkpoints')):
+                file.writelines(json.dumps(row, default=str) + '\n' for row in batch[name])
+    finally:
+        for file in files:
+            file.close()
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('path')
+    parser.add_argument('habits', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--checkins', type=int, default=0, help='check-in events per habit')
+    args = parser.parse_args()
+    create_database(args.path, args.habits, seed=args.seed, checkins=args.checkins).dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,397 @@
+"""
+Non-interactive command line interface of the habit tracker.
+
+Every subcommand prints JSON. SQLAlchemy, questionary and the ORM models are only
+imported by the commands that need them, so "list" on a SQLite database runs on the
+standard library sqlite3 module and starts quickly.
+
+Examples:
+    python cli.py add "going jogging" --periodicity weekly --days 30
+    python cli.py checkin 3
+    python cli.py checkin-bulk events.csv
+    python cli.py checkin 3 --append-only && python cli.py compact
+    python cli.py list --periodicity daily --name-prefix go --order-by name
+    python cli.py backfill 2024-07-01 --dry-run
+    python cli.py scheduler
+    python cli.py serve --port 8080
+    python cli.py --tenant alice checkin 3 && python cli.py stats --all-tenants
+    python cli.py export-snapshot habits.snapshot && python cli.py stats --snapshot habits.snapshot
+    python main.py --profile
+"""
+import contextlib
+import datetime
+import json
+import sys
+
+import click
+
+LIST_QUERY = ("SELECT id, name, periodicity, created_at, target_date FROM habits "
+              "WHERE id NOT IN (SELECT habit_id FROM completions WHERE habit_id IS NOT NULL) ORDER BY id")
+LIST_COLUMNS = ('id', 'name', 'periodicity', 'created_at', 'target_date')
+# The filters of "list" that LIST_QUERY implements.
+DEFAULT_LIST_FILTERS = {'periodicity': None, 'name_prefix': None, 'created_from': None, 'created_to': None,
+                        'order_by': 'id', 'status': 'ongoing'}
+
+
+def echo_json(value):
+    click.echo(json.dumps(value, default=str))
+
+
+@contextlib.contextmanager
+def _habit_manager(append_only=False):
+    """
+    Yields a HabitManager for one unit of work.
+
+    Messages the manager prints for the interactive menu go to stderr, so the JSON has to be
+    echoed after the block.
+    """
+    from db.database_module import session_scope
+    from habit import HabitManager
+
+    _use_tenant_database()
+    with session_scope() as unit_session, contextlib.redirect_stdout(sys.stderr):
+        yield HabitManager(unit_session, append_only=append_only)
+
+
+def _tenant_url():
+    """Returns the database URL of the --tenant option, or None without a tenant."""
+    context = click.get_current_context(silent=True)
+    return context.find_root().obj if context is not None else None
+
+
+def _use_tenant_database():
+    """Points the module session at the database of the --tenant option, if one was given."""
+    url = _tenant_url()
+    if url is not None:
+        from db.database_module import configure, get_settings
+
+        if get_settings().url != url:
+            configure(url=url)
+
+
+def _list_with_sqlite3(path):
+    """Yields the ongoing habits ordered by id, reading the database with the sqlite3 module."""
+    import os
+    import sqlite3
+
+    if not os.path.exists(path):
+        return
+    connection = sqlite3.connect('file:' + path + '?mode=ro', uri=True)
+    try:
+        for row in connection.execute(LIST_QUERY):
+            yield dict(zip(LIST_COLUMNS, row))
+    finally:
+        connection.close()
+
+
+def run_interactive():
+    """
+    Starts the interactive menu like main.py did before the subcommands existed.
+    """
+    import main
+    from db.database_module import session
+    from db.initialize_db import initialize_database
+    from habit import HabitManager
+
+    _use_tenant_database()
+    print("Welcome to Habit Tracker!")
+    print("-------------------------\n")
+    initialize_database()
+    HabitManager(session).validate_habits()
+    main.main_menue()
+
+
+def start_profiler(context, json_path):
+    """
+    Enables an instrumentation.Profiler until the command ends and then prints its summary
+    to stderr, or writes the statistics as JSON to json_path.
+    """
+    if context.invoked_subcommand is None:
+        import main  # noqa: F401 imported before enabling, so that the menu screens are instrumented
+    from instrumentation import Profiler, format_summary
+
+    profiler = Profiler()
+    profiler.enable()
+
+    def report():
+        profiler.disable()
+        if json_path:
+            with open(json_path, 'w') as file:
+                json.dump(profiler.stats(), file, indent=2)
+        else:
+            click.echo(format_summary(profiler.stats()), err=True)
+
+    context.call_on_close(report)
+
+
+@click.group(invoke_without_command=True)
+@click.option('--tenant', default=None, help='Use the database of this tenant in the shard directory.')
+@click.option('--profile', is_flag=True, help='Print call, SQL and timing statistics on exit.')
+@click.option('--profile-json', type=click.Path(dir_okay=False), default=None,
+              help='Write the --profile statistics as JSON to this file instead.')
+@click.pass_context
+def cli(context, tenant, profile, profile_json):
+    """Habit Tracker. Without a command the interactive menu is started."""
+    if tenant is not None:
+        import os
+
+        from db.config import load_settings, shard_path
+
+        try:
+            path = shard_path(load_settings().shard_directory, tenant)
+        except ValueError as error:
+            raise click.BadParameter(str(error), param_hint='--tenant')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        context.obj = 'sqlite:///' + path
+    if profile or profile_json:
+        start_profiler(context, profile_json)
+    if context.invoked_subcommand is None:
+        run_interactive()
+
+
+@cli.command()
+@click.argument('name')
+@click.option('--periodicity', type=click.Choice(['daily', 'weekly']), default='daily', show_default=True)
+@click.option('--days', type=click.IntRange(min=1), default=None, help='Days to keep up the habit.')
+def add(name, periodicity, days):
+    """Creates a habit and checks it in."""
+    import clock
+
+    target_date = datetime.date.max if days is None else clock.today() + datetime.timedelta(days)
+    with _habit_manager() as manager:
+        habit = manager.add_habit(name, periodicity, target_date)
+        result = {'id': habit.id, 'name': habit.name, 'periodicity': habit.periodicity,
+                  'target_date': habit.target_date}
+    echo_json(result)
+
+
+APPEND_ONLY_HELP = 'Only log the check-in; "compact" applies it later.'
+
+
+@cli.command()
+@click.argument('habit_id', type=int)
+@click.option('--append-only', is_flag=True, help=APPEND_ONLY_HELP)
+def checkin(habit_id, append_only):
+    """Checks in the habit with HABIT_ID."""
+    with _habit_manager(append_only) as manager, manager.unit_of_work():
+        found = manager.get_habit(habit_id) is not None
+        if found:
+            manager.checkin_habit(habit_id)
+    echo_json({'habit_id': habit_id, 'checked_in': found})
+    if not found:
+        sys.exit(1)
+
+
+@cli.command()
+@click.argument('habit_id', type=int)
+def complete(habit_id):
+    """Completes the habit with HABIT_ID."""
+    with _habit_manager() as manager, manager.unit_of_work():
+        completed = manager.get_completion_by_habit_id(habit_id) is None and manager.complete_habit(habit_id)
+        if completed:
+            manager.delete_checkpoints_for_completed_habit(habit_id)
+    echo_json({'habit_id': habit_id, 'completed': completed})
+    if not completed:
+        sys.exit(1)
+
+
+def iter_checkin_events(file, file_format):
+    """
+    Reads (habit_id, date) events from CSV ("habit_id,date" rows, optional header) or NDJSON
+    ({"habit_id": 1, "date": "2024-07-01"} per line). Unreadable lines are yielded as None.
+    """
+    if file_format == 'csv':
+        import csv
+
+        for row in csv.reader(file):
+            if row and not (row[0].strip().lower() == 'habit_id'):
+                yield tuple(cell.strip() for cell in row)
+    else:
+        for line in file:
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                    yield record['habit_id'], record['date']
+                except (ValueError, KeyError, TypeError):
+                    yield None
+
+
+@cli.command(name='checkin-bulk')
+@click.argument('events', type=click.File('r'))
+@click.option('--format', 'file_format', type=click.Choice(['auto', 'csv', 'ndjson']), default='auto',
+              show_default=True, help='auto uses ndjson for *.ndjson and *.jsonl files and csv otherwise.')
+@click.option('--chunk-size', type=click.IntRange(min=1), default=1000, show_default=True)
+@click.option('--append-only', is_flag=True, help=APPEND_ONLY_HELP)
+def checkin_bulk(events, file_format, chunk_size, append_only):
+    """Checks in all (habit_id, date) events of the file EVENTS ("-" reads stdin)."""
+    if file_format == 'auto':
+        file_format = 'ndjson' if events.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+    with _habit_manager(append_only) as manager:
+        report = manager.checkin_habits(iter_checkin_events(events, file_format), chunk_size)
+    echo_json({'accepted': report.accepted,
+               'rejected': [{'event': index + 1, 'value': event, 'reason': reason}
+                            for index, event, reason in report.rejected]})
+
+
+def echo_json_array(items, file=None):
+    """Prints an iterable as a JSON array one element at a time."""
+    click.echo('[', nl=False, file=file)
+    for number, item in enumerate(items):
+        click.echo((', ' if number else '') + json.dumps(item, default=str), nl=False, file=file)
+    click.echo(']', file=file)
+
+
+@cli.command(name='list')
+@click.option('--status', type=click.Choice(['ongoing', 'completed', 'all']), default='ongoing', show_default=True)
+@click.option('--periodicity', type=click.Choice(['daily', 'weekly']), default=None)
+@click.option('--name-prefix', default=None, help='Only habits whose name starts with this text.')
+@click.option('--created-from', type=click.DateTime(formats=['%Y-%m-%d']), default=None)
+@click.option('--created-to', type=click.DateTime(formats=['%Y-%m-%d']), default=None)
+@click.option('--order-by', type=click.Choice(['id', 'name', 'created_at']), default='id', show_default=True)
+def list_command(status, periodicity, name_prefix, created_from, created_to, order_by):
+    """Lists the habits, by default the ongoing ones, as a streamed JSON array."""
+    from db.config import load_settings, sqlite_path
+
+    filters = {'periodicity': periodicity, 'name_prefix': name_prefix,
+               'created_from': created_from and created_from.date(), 'created_to': created_to and created_to.date(),
+               'order_by': order_by, 'status': None if status == 'all' else status}
+    path = sqlite_path(_tenant_url() or load_settings().url)
+    if path is not None and filters == DEFAULT_LIST_FILTERS:
+        echo_json_array(_list_with_sqlite3(path))
+        return
+    stdout = sys.stdout
+    with _habit_manager() as manager:
+        echo_json_array(({column: getattr(habit, column) for column in LIST_COLUMNS}
+                         for habit in manager.iter_habit_records(**filters)), file=stdout)
+
+
+@cli.command()
+@click.option('--all-tenants', is_flag=True, help='Merge the statistics of every tenant database.')
+@click.option('--snapshot', 'snapshot_path', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Analyze a snapshot written by export-snapshot instead of the database.')
+def stats(all_tenants, snapshot_path):
+    """Prints the longest streaks and the ongoing habits with their streak."""
+    import analytics_module
+
+    if snapshot_path:
+        from snapshot import Snapshot
+
+        with Snapshot(snapshot_path) as habit_snapshot:
+            result = analytics_module.analyze_snapshot(habit_snapshot)
+    elif all_tenants:
+        from db.config import load_settings
+        from db.shards import ShardRouter
+
+        router = ShardRouter(load_settings())
+        try:
+            result = analytics_module.analyze_tenants(router)
+        finally:
+            router.dispose()
+    else:
+        with _habit_manager() as manager:
+            result = analytics_module.analyze_habits_from_summary(manager)
+    for key in ('daily_habits', 'weekly_habits'):
+        result[key] = [habit._asdict() for habit in result[key]]
+    echo_json(result)
+
+
+@cli.command(name='export-snapshot')
+@click.argument('path', type=click.Path(dir_okay=False))
+def export_snapshot(path):
+    """Writes the habits, completions and checkpoints to a columnar snapshot file at PATH."""
+    import snapshot
+
+    with _habit_manager() as manager:
+        counts = snapshot.export_snapshot(manager.session, path)
+    echo_json(counts)
+
+
+@cli.command()
+@click.option('--prune-before', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Also delete the applied check-in events before this date.')
+def compact(prune_before):
+    """Applies the logged check-ins to the checkpoints and summaries."""
+    with _habit_manager() as manager:
+        compacted = manager.compact_checkin_events(prune_before=prune_before and prune_before.date())
+    echo_json({'compacted': compacted})
+
+
+@cli.command()
+@click.argument('start', type=click.DateTime(formats=['%Y-%m-%d']))
+@click.argument('end', type=click.DateTime(formats=['%Y-%m-%d']), required=False)
+@click.option('--dry-run', is_flag=True, help='Only print the habits that broke.')
+def backfill(start, end, dry_run):
+    """Completes the habits that broke from START to END (default today) on the day they broke."""
+    with _habit_manager() as manager:
+        end = end.date() if end else manager.today()
+        if dry_run:
+            broken_by_day = manager.replay_validation(start.date(), end)
+        else:
+            broken_by_day = manager.backfill_validation(start.date(), end)
+        result = {day.isoformat(): [broken_habit.id for broken_habit in broken_habits]
+                  for day, broken_habits in broken_by_day.items()}
+    echo_json(result)
+
+
+@cli.command(name='scheduler')
+@click.option('--batch-size', type=click.IntRange(min=1), default=500, show_default=True,
+              help='Habits validated per transaction.')
+def run_scheduler(batch_size):
+    """Keeps running and completes every habit as soon as its streak breaks, printing one JSON line per habit."""
+    import asyncio
+
+    from async_habit import AsyncHabitManager
+    from scheduler import DueDateScheduler
+
+    def echo_broken(broken_habits):
+        for broken_habit in broken_habits:
+            echo_json(broken_habit._asdict())
+
+    async def serve():
+        manager = await AsyncHabitManager.create()
+        try:
+            await DueDateScheduler(manager, batch_size=batch_size, on_broken=echo_broken).run()
+        finally:
+            await manager.close()
+
+    _use_tenant_database()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+@cli.command()
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', type=click.IntRange(min=0, max=65535), default=8080, show_default=True)
+@click.option('--pool-size', type=click.IntRange(min=1), default=None,
+              help='Database connections shared by the requests.  [default: 8]')
+@click.option('--verbose', is_flag=True, help='Log every request to stderr.')
+def serve(host, port, pool_size, verbose):
+    """Serves the habits as a local HTTP/JSON service until interrupted."""
+    from db.config import load_settings
+    from service import HabitService, ServiceServer
+
+    server = ServiceServer((host, port), HabitService(load_settings(url=_tenant_url(), pool_size=pool_size)),
+                           verbose)
+    click.echo(f"Serving on http://{server.server_address[0]}:{server.server_address[1]}", err=True)
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.dispose()
+
+
+@cli.command()
+def validate():
+    """Completes the habits with a broken streak and prints them."""
+    with _habit_manager() as manager:
+        broken_habits = [broken_habit._asdict() for broken_habit in manager.validate_habits(interactive=False)]
+    echo_json(broken_habits)
+
+
+if __name__ == '__main__':
+    cli()
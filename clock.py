@@ -0,0 +1,48 @@
+"""
+The current date of the habit tracker.
+
+Everything that needs "today" asks this module instead of calling date.today(), so
+tests and backfills can run the tracker as of another date:
+
+    >>> with clock.frozen(datetime.date(2024, 7, 1)):
+    ...     HabitManager(session).validate_habits(interactive=False)
+"""
+import contextlib
+import datetime
+
+_source = None
+
+
+def today():
+    """
+    Returns:
+        datetime.date: The current date, or the date the clock is set to.
+    """
+    return datetime.date.today() if _source is None else _source()
+
+
+def set_today(source):
+    """
+    Sets the date returned by today().
+
+    Args:
+        source: A datetime.date, a callable returning one, or None for the system date.
+    """
+    global _source
+    if isinstance(source, datetime.date):
+        _source = lambda: source  # noqa: E731
+    else:
+        _source = source
+
+
+@contextlib.contextmanager
+def frozen(source):
+    """
+    Sets the clock like set_today for the duration of the block.
+    """
+    previous = _source
+    set_today(source)
+    try:
+        yield
+    finally:
+        set_today(previous)
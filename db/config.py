@@ -0,0 +1,125 @@
+import configparser
+import os
+import re
+from collections import namedtuple
+
+# Kept free of SQLAlchemy imports so that callers can read the settings cheaply.
+
+DEFAULT_DATABASE_URL = 'sqlite:///habits.db'
+CONFIG_FILE_ENV = 'HABITS_CONFIG'
+CONFIG_SECTION = 'database'
+ENV_PREFIX = 'HABITS_'
+# Tenant ids become file names, so only these characters are accepted.
+TENANT_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+SHARD_PREFIX = 'tenant_'
+SHARD_SUFFIX = '.db'
+
+DatabaseSettings = namedtuple('DatabaseSettings', ['url', 'journal_mode', 'synchronous', 'mmap_size',
+                                                   'busy_timeout', 'pool_size', 'max_overflow', 'pool_timeout',
+                                                   'shard_directory', 'max_open_shards'])
+
+DEFAULTS = DatabaseSettings(url=DEFAULT_DATABASE_URL,
+                            journal_mode='WAL',
+                            synchronous='NORMAL',
+                            mmap_size=256 * 1024 * 1024,
+                            busy_timeout=5000,
+                            pool_size=None,
+                            max_overflow=None,
+                            pool_timeout=None,
+                            shard_directory='tenants',
+                            max_open_shards=16)
+
+_INTEGER_SETTINGS = {'mmap_size', 'busy_timeout', 'pool_size', 'max_overflow', 'pool_timeout', 'max_open_shards'}
+# The pragma settings are put into PRAGMA statements, so only SQLite's keywords are accepted.
+_KEYWORD_SETTINGS = {'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+                     'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA', '0', '1', '2', '3'}}
+
+
+def _convert(value):
+    # Empty values in the config file or environment unset a setting.
+    return None if value == '' else value
+
+
+def _validate(name, value):
+    """
+    Checks a setting and returns it as an int or upper case keyword where required.
+
+    Raises:
+        ValueError: If an integer setting is not an integer or a pragma setting is not one of its keywords.
+    """
+    if value is None:
+        return None
+    if name in _INTEGER_SETTINGS:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"database setting {name} must be an integer, got {value!r}") from None
+    if name in _KEYWORD_SETTINGS:
+        keyword = str(value).upper()
+        if keyword not in _KEYWORD_SETTINGS[name]:
+            raise ValueError(f"database setting {name} must be one of "
+                             f"{', '.join(sorted(_KEYWORD_SETTINGS[name]))}, got {value!r}")
+        return keyword
+    return value
+
+
+def load_settings(config_file=None, environ=None, **overrides):
+    """
+    Reads the database settings.
+
+    Later sources win: the defaults, the [database] section of the config file
+    (config_file or the file named by HABITS_CONFIG), HABITS_<SETTING> environment
+    variables (e.g. HABITS_URL, HABITS_JOURNAL_MODE) and the keyword overrides.
+
+    Args:
+        config_file (str): Path of an ini file. Optional.
+        environ (dict): The environment to read. Defaults to os.environ.
+        **overrides: Settings given explicitly, None values are ignored.
+
+    Returns:
+        DatabaseSettings: The merged settings.
+
+    Raises:
+        ValueError: If a setting has an invalid value, see _validate.
+    """
+    environ = os.environ if environ is None else environ
+    settings = DEFAULTS._asdict()
+    config_file = config_file or environ.get(CONFIG_FILE_ENV)
+    if config_file:
+        parser = configparser.ConfigParser()
+        parser.read(config_file)
+        if parser.has_section(CONFIG_SECTION):
+            for name in settings:
+                if parser.has_option(CONFIG_SECTION, name):
+                    settings[name] = _convert(parser.get(CONFIG_SECTION, name))
+    for name in settings:
+        if ENV_PREFIX + name.upper() in environ:
+            settings[name] = _convert(environ[ENV_PREFIX + name.upper()])
+    for name, value in overrides.items():
+        if name not in settings:
+            raise TypeError(f"unknown database setting: {name}")
+        if value is not None:
+            settings[name] = value
+    return DatabaseSettings(**{name: _validate(name, value) for name, value in settings.items()})
+
+
+def sqlite_path(url):
+    """
+    Returns the file path of a sqlite:/// URL, or None for other or in-memory databases.
+    """
+    prefix = 'sqlite:///'
+    if not url.startswith(prefix) or url == prefix or ':memory:' in url:
+        return None
+    return url[len(prefix):].split('?', 1)[0]
+
+
+def shard_path(directory, tenant):
+    """
+    Returns the database file of a tenant in the shard directory.
+
+    Raises:
+        ValueError: If the tenant id is not 1 to 64 letters, digits, "_" or "-".
+    """
+    if not TENANT_PATTERN.fullmatch(str(tenant)):
+        raise ValueError(f"invalid tenant id: {tenant!r}")
+    return os.path.join(directory, SHARD_PREFIX + str(tenant) + SHARD_SUFFIX)
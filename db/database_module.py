@@ -1,8 +1,12 @@
+import contextlib
 import datetime
 
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Date, Boolean
+from sqlalchemy import create_engine, event, text, Column, Integer, String, ForeignKey, Date, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import relationship, sessionmaker, scoped_session
+
+import clock
+from db.config import load_settings
 
 Base = declarative_base()
 
@@ -15,19 +19,21 @@ class Habit(Base):
         id (int): The habit's ID.
         name (str): The habit's name.
         periodicity (str): The habit's periodicity.
-        created_at (datetime.date): The habit's creation date. Defaults to today's date.
+        created_at (datetime.date): The habit's creation date. Defaults to clock.today() at insert time.
         target_date (datetime.date): The habit's target completion date. Nullable.
         completions (list[Completion]): List of completions associated with the habit.
         checkpoints (list[Checkpoint]): List of checkpoints associated with the habit.
+        summary (HabitSummary): The precomputed streak summary of the habit.
     """
     __tablename__ = 'habits'
     id = Column(Integer, primary_key=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, index=True)
     periodicity = Column(String, nullable=False)
-    created_at = Column(Date, default=datetime.datetime.today().date())
+    created_at = Column(Date, default=clock.today, index=True)
     target_date = Column(Date, nullable=True)
     completions = relationship('Completion', back_populates='habit')
     checkpoints = relationship('Checkpoint', back_populates='habit')
+    summary = relationship('HabitSummary', back_populates='habit', uselist=False)
 
 
 class Completion(Base):
@@ -43,9 +49,9 @@ class Completion(Base):
     """
     __tablename__ = 'completions'
     id = Column(Integer, primary_key=True)
-    habit_id = Column(Integer, ForeignKey('habits.id'))
+    habit_id = Column(Integer, ForeignKey('habits.id'), index=True)
     completion_status = Column(String, nullable=False)
-    completion_date = Column(Date, default=datetime.datetime.now(datetime.timezone.utc).date())
+    completion_date = Column(Date, default=clock.today)
     habit = relationship('Habit', back_populates='completions')
 
 
@@ -63,19 +69,264 @@ class Checkpoint(Base):
     """
     __tablename__ = 'checkpoints'
     id = Column(Integer, primary_key=True)
-    habit_id = Column(Integer, ForeignKey('habits.id'))
-    last_checkpoint = Column(Date, default=datetime.datetime.now(datetime.timezone.utc).date())
-    current_checkpoint = Column(Date, default=datetime.datetime.now(datetime.timezone.utc).date())
-    next_checkpoint = Column(Date, default=datetime.datetime.now(datetime.timezone.utc).date() +
-                                           datetime.timedelta(days=int(1)))
+    habit_id = Column(Integer, ForeignKey('habits.id'), index=True)
+    last_checkpoint = Column(Date, default=clock.today)
+    current_checkpoint = Column(Date, default=clock.today)
+    next_checkpoint = Column(Date, default=lambda: clock.today() + datetime.timedelta(days=1), index=True)
     is_valid_streak = Column(Boolean, default=True)
     habit = relationship('Habit', back_populates='checkpoints')
 
 
-# Set up the database engine and create all tables
-engine = create_engine('sqlite:///habits.db')
-Base.metadata.create_all(engine)
+class HabitSummary(Base):
+    """
+    Precomputed streak summary of a habit, maintained by the HabitManager writes.
+
+    Attributes:
+        habit_id (int): Primary key and foreign key to the associated habit.
+        current_streak (int): Days from creation to the last check-in or the completion.
+        best_streak (int): The longest streak recorded for the habit.
+        last_checkin (datetime.date): Date of the last check-in. Nullable.
+        status (str): "ONGOING" or the completion status of the habit.
+        habit (Habit): The habit associated with this summary.
+    """
+    __tablename__ = 'habit_summaries'
+    habit_id = Column(Integer, ForeignKey('habits.id'), primary_key=True)
+    current_streak = Column(Integer, nullable=False, default=0)
+    best_streak = Column(Integer, nullable=False, default=0)
+    last_checkin = Column(Date, nullable=True)
+    status = Column(String, nullable=False, index=True)
+    habit = relationship('Habit', back_populates='summary')
+
+
+class CheckinEvent(Base):
+    """
+    Append-only record of a single check-in.
+
+    Attributes:
+        id (int): Primary key, the order of the check-ins.
+        habit_id (int): Foreign key to the associated habit.
+        day (int): The check-in date as days since 1970-01-01, see to_day_number.
+        applied (bool): True once the check-in is folded into the checkpoint and summary of the habit.
+    """
+    __tablename__ = 'checkin_events'
+    id = Column(Integer, primary_key=True)
+    habit_id = Column(Integer, ForeignKey('habits.id'), nullable=False)
+    day = Column(Integer, nullable=False)
+    applied = Column(Boolean, nullable=False, default=False)
+    __table_args__ = (Index('ix_checkin_events_habit_id_day', 'habit_id', 'day'),
+                      Index('ix_checkin_events_pending', 'id', sqlite_where=text('applied = 0')))
+
+
+class PeriodRollup(Base):
+    """
+    Counts of the habits of one periodicity per day, week or month, maintained by the HabitManager writes.
+
+    Attributes:
+        grain (str): "day", "week" or "month".
+        period_start (datetime.date): The first day of the period; weeks start on Monday.
+        periodicity (str): The periodicity of the counted habits.
+        created (int): Habits created in the period.
+        active (int): Habits checked in at least once in the period.
+        checkins (int): Check-ins in the period.
+        successfully (int): Completions with status "SUCCESSFULLY" in the period.
+        failed (int): Completions with status "FAILED" in the period.
+        aborted (int): Completions with status "ABORTED" in the period.
+    """
+    __tablename__ = 'period_rollups'
+    grain = Column(String, primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    periodicity = Column(String, primary_key=True)
+    created = Column(Integer, nullable=False, default=0)
+    active = Column(Integer, nullable=False, default=0)
+    checkins = Column(Integer, nullable=False, default=0)
+    successfully = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    aborted = Column(Integer, nullable=False, default=0)
+
+
+class HabitRollup(Base):
+    """
+    Check-ins of one habit per day, week or month, maintained by the HabitManager writes.
+
+    Attributes:
+        habit_id (int): Foreign key to the associated habit.
+        grain (str): "day", "week" or "month".
+        period_start (datetime.date): The first day of the period; weeks start on Monday.
+        checkins (int): Check-ins of the habit in the period.
+    """
+    __tablename__ = 'habit_rollups'
+    habit_id = Column(Integer, ForeignKey('habits.id'), primary_key=True)
+    grain = Column(String, primary_key=True)
+    period_start = Column(Date, primary_key=True)
+    checkins = Column(Integer, nullable=False, default=0)
+
+
+class DataVersion(Base):
+    """
+    Version counter of the habit data, increased by every HabitManager write so that cached
+    analytics results of any process can be checked with one query.
+
+    Attributes:
+        name (str): Primary key, the versioned data; "habits" for the habit tables.
+        version (int): Increased by one in every write transaction.
+    """
+    __tablename__ = 'data_versions'
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def to_day_number(date):
+    """
+    Returns:
+        int: The days between 1970-01-01 and date.
+    """
+    return date.toordinal() - EPOCH_ORDINAL
+
+
+def from_day_number(day):
+    """
+    Returns:
+        datetime.date: The date day days after 1970-01-01.
+    """
+    return datetime.date.fromordinal(day + EPOCH_ORDINAL)
+
+
+def create_indexes(bind):
+    """
+    Creates missing secondary indexes.
+
+    create_all only creates indexes together with new tables, so databases created
+    before an index was declared get it here.
+
+    Args:
+        bind: The engine or connection to create the indexes on.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind, checkfirst=True)
+
+
+def set_sqlite_pragmas(dbapi_connection, settings):
+    """
+    Applies the journal mode, synchronous level, mmap size and busy timeout of the settings.
+
+    Args:
+        dbapi_connection: A new sqlite3 (or aiosqlite adapted) connection.
+        settings (DatabaseSettings): The settings to apply. None values are skipped.
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma in ('journal_mode', 'synchronous', 'mmap_size', 'busy_timeout'):
+        value = getattr(settings, pragma)
+        if value is not None:
+            cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def build_engine(settings, create_tables=True):
+    """
+    Creates an engine from database settings.
+
+    SQLite connections get the pragmas of the settings, and the pool options are only
+    passed on if they are set.
+
+    Args:
+        settings (DatabaseSettings): The settings, see db.config.load_settings.
+        create_tables (bool): Create missing tables and indexes.
+
+    Returns:
+        Engine: The new engine.
+    """
+    pool_options = {name: getattr(settings, name) for name in ('pool_size', 'max_overflow', 'pool_timeout')
+                    if getattr(settings, name) is not None}
+    new_engine = create_engine(settings.url, **pool_options)
+    if new_engine.dialect.name == 'sqlite':
+        event.listen(new_engine, 'connect',
+                     lambda dbapi_connection, connection_record: set_sqlite_pragmas(dbapi_connection, settings))
+    if create_tables:
+        Base.metadata.create_all(new_engine)
+        create_indexes(new_engine)
+    return new_engine
+
+
+_settings = None
+_engine = None
+
+
+def configure(**settings):
+    """
+    Sets the database settings used by get_engine and the session.
 
-# Create a session factory bound to the engine
-Session = sessionmaker(bind=engine)
-session = Session()
+    An engine built before is disposed of, and the next unit of work uses the new one.
+    Without arguments the settings are read again from the config file and environment.
+
+    Args:
+        **settings: Overrides for db.config.load_settings, e.g. url='sqlite:///other.db'.
+    """
+    global _settings, _engine
+    Session.remove()
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+    _settings = load_settings(**settings) if settings else None
+
+
+def get_settings():
+    """
+    Returns:
+        DatabaseSettings: The configured settings, read from the config file and environment by default.
+    """
+    global _settings
+    if _settings is None:
+        _settings = load_settings()
+    return _settings
+
+
+def get_engine():
+    """
+    Returns the engine of the configured database, building it on first use.
+
+    Returns:
+        Engine: The shared engine.
+    """
+    global _engine
+    if _engine is None:
+        _engine = build_engine(get_settings())
+    return _engine
+
+
+def __getattr__(name):
+    # Keeps "from db.database_module import engine" working without building it at import time.
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Thread local sessions, bound to the engine when the first session is created
+_session_factory = sessionmaker()
+Session = scoped_session(lambda: _session_factory(bind=get_engine()))
+session = Session
+
+
+@contextlib.contextmanager
+def session_scope():
+    """
+    Provides a session for one unit of work.
+
+    Commits when the block succeeds, rolls back if it raises and removes the thread
+    local session afterwards.
+
+    Yields:
+        Session: The session of the unit of work.
+    """
+    unit_session = Session()
+    try:
+        yield unit_session
+        unit_session.commit()
+    except Exception:
+        unit_session.rollback()
+        raise
+    finally:
+        Session.remove()
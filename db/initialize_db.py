@@ -1,9 +1,25 @@
 import datetime
+import json
+import time
+from collections import namedtuple
 
 from sqlalchemy import create_engine, inspect
 
-import json
-from db.database_module import session, Habit, engine, Base, Completion, Checkpoint
+from analytics_cache import bump_data_version
+from db.database_module import session, Habit, get_engine, Base, Completion, Checkpoint
+from rollup_module import rebuild_rollups, rollups_initialized
+from summary_module import rebuild_summaries, summaries_initialized
+
+HABITS_FILE = 'db/json/habit.json'
+COMPLETIONS_FILE = 'db/json/completions.json'
+CHECKPOINTS_FILE = 'db/json/checkpoints.json'
+
+# Rows per executemany() call of the bulk importer.
+IMPORT_BATCH_SIZE = 5000
+# Characters read per chunk while streaming a JSON array.
+READ_CHUNK_SIZE = 1 << 16
+
+ImportReport = namedtuple('ImportReport', ['rows', 'seconds', 'rows_per_second'])
 
 
 def tables_initialized():
@@ -22,6 +38,7 @@ def initialize_database():
 
     If the database exists and the tables are not initialized, loads data from SQL and prints a success message.
     Otherwise, prints a message indicating that the database is already initialized with values.
+    In both cases the habit summaries and rollups are built if they are missing.
 
     Returns:
         None
@@ -29,11 +46,17 @@ def initialize_database():
     Example Usage:
         >>> initialize_database()
     """
-    if database_exists(engine.url) and not tables_initialized():
+    if database_exists(get_engine().url) and not tables_initialized():
         load_data_from_sql()
+        rebuild_summaries(session)
+        rebuild_rollups(session)
         print("Values are initialized successfully.")
     else:
         print("Database already initialized with values.")
+        if not summaries_initialized(session):
+            print(f"Built {rebuild_summaries(session)} habit summaries.")
+        if not rollups_initialized(session):
+            print(f"Built {rebuild_rollups(session)} rollups.")
 
 
 def database_exists(url):
@@ -78,46 +101,175 @@ def submit_values(object_to_inject):
     session.commit()
 
 
-def load_data_from_sql():
+def parse_date(value):
     """
+    Parses an ISO formatted date string ("YYYY-MM-DD").
+
+    Uses date.fromisoformat, which is implemented in C and much faster than strptime.
 
-    Loads data from SQL databases and populates the corresponding objects with the retrieved data.
+    Args:
+        value (str): The date string or None.
 
     Returns:
-        None
+        datetime.date: The parsed date, or None if no value was given.
+    """
+    return None if value is None else datetime.date.fromisoformat(value)
+
+
+def _first_character(file):
+    """
+    Returns the first non-whitespace character of a text file and rewinds it.
+    """
+    character = file.read(1)
+    while character.isspace():
+        character = file.read(1)
+    file.seek(0)
+    return character
+
+
+def _iter_json_array(file, chunk_size):
+    """
+    Yields the elements of a top level JSON array while reading the file in chunks.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size)
+    pos = buffer.index('[') + 1
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            if pos == len(buffer):
+                raise json.JSONDecodeError("Unterminated array", buffer, pos)
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(chunk_size)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, chunk == ''
+            continue
+        yield record
+        pos = end
+
+
+def iter_json_records(path, chunk_size=READ_CHUNK_SIZE):
+    """
+    Streams the records of a JSON file without loading the whole file into memory.
+
+    Both a JSON array of objects (the format of the files in db/json) and
+    newline delimited JSON (one object per line) are accepted.
+
+    Args:
+        path (str): Path of the JSON or NDJSON file.
+        chunk_size (int): Number of characters read at once.
+
+    Yields:
+        dict: One record per array element or line.
+    """
+    with open(path, encoding='utf-8') as file:
+        if _first_character(file) == '[':
+            yield from _iter_json_array(file, chunk_size)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _habit_row(record):
+    return {'id': record['id'],
+            'name': record['name'],
+            'periodicity': record['periodicity'],
+            'created_at': parse_date(record['created_at']),
+            'target_date': parse_date(record.get('target_date'))}
+
+
+def _completion_row(record):
+    return {'id': record['id'],
+            'habit_id': record['habit_id'],
+            'completion_status': record['completion_status'],
+            'completion_date': parse_date(record['completion_date'])}
+
+
+def _checkpoint_row(record):
+    return {'id': record['id'],
+            'habit_id': record['habit_id'],
+            'last_checkpoint': parse_date(record['last_checkpoint']),
+            'current_checkpoint': parse_date(record['current_checkpoint']),
+            'next_checkpoint': parse_date(record.get('next_checkpoint')),
+            'is_valid_streak': bool(record['is_valid_streak'])}
+
+
+def _insert_batches(db_session, table, rows, path, batch_size):
+    """
+    Inserts converted records into a table in batches and returns the number of rows.
+
+    Raises:
+        ValueError: If a record cannot be converted.
+    """
+    count = 0
+    batch = []
+    try:
+        for count, record in enumerate(rows, start=1):
+            batch.append(record)
+            if len(batch) == batch_size:
+                db_session.execute(table.insert(), batch)
+                batch = []
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError) as error:
+        raise ValueError(f"malformed record {count + 1} in {path}: {error!r}") from error
+    if batch:
+        db_session.execute(table.insert(), batch)
+    return count
+
+
+def bulk_import(habits_path=HABITS_FILE, completions_path=COMPLETIONS_FILE, checkpoints_path=CHECKPOINTS_FILE,
+                db_session=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Streams habits, completions and checkpoints into the database in one transaction.
+
+    The input files are read incrementally, rows are inserted with executemany in
+    batches of batch_size and the transaction is committed once at the end. A
+    malformed record rolls back everything that was imported.
+
+    Args:
+        habits_path (str): JSON or NDJSON file with habits.
+        completions_path (str): JSON or NDJSON file with completions.
+        checkpoints_path (str): JSON or NDJSON file with checkpoints.
+        db_session: The session to import into. Defaults to the module session.
+        batch_size (int): Rows per insert statement.
+
+    Returns:
+        ImportReport: Number of imported rows, elapsed seconds and rows per second.
+
+    Raises:
+        ValueError: If a record is malformed. Nothing is imported in that case.
+    """
+    db_session = db_session or session
+    started = time.perf_counter()
+    rows = 0
+    try:
+        for table, path, converter in ((Habit.__table__, habits_path, _habit_row),
+                                       (Completion.__table__, completions_path, _completion_row),
+                                       (Checkpoint.__table__, checkpoints_path, _checkpoint_row)):
+            converted = (converter(record) for record in iter_json_records(path))
+            rows += _insert_batches(db_session, table, converted, path, batch_size)
+        bump_data_version(db_session)
+        db_session.commit()
+    except Exception:
+        db_session.rollback()
+        raise
+    seconds = time.perf_counter() - started
+    return ImportReport(rows, seconds, rows / seconds if seconds > 0 else float(rows))
+
+
+def load_data_from_sql():
+    """
+    Loads the seed data from the JSON files in db/json into the database.
+
+    Returns:
+        ImportReport: The result of the bulk import.
     """
-    habits = json.load(open('db/json/habit.json'))
-
-    completed = json.load(open('db/json/completions.json'))
-
-    checkpoint = json.load(open('db/json/checkpoints.json'))
-    date_format = '%Y-%m-%d'
-    for habit_data in habits:
-        habit = Habit(id=habit_data['id'],
-                      periodicity=habit_data['periodicity'],
-                      name=habit_data['name'],
-                      created_at=datetime.datetime.strptime(habit_data['created_at'],
-                                                            date_format).date(),
-                      target_date=datetime.datetime.strptime(habit_data['target_date'],
-                                                             date_format).date())
-        submit_values(habit)
-
-    for completion_data in completed:
-        completion = Completion(id=completion_data['id'],
-                                habit_id=completion_data['habit_id'],
-                                completion_status=completion_data['completion_status'],
-                                completion_date=datetime.datetime.strptime(completion_data['completion_date'],
-                                                                           date_format).date())
-        submit_values(completion)
-
-    for checkpoint_data in checkpoint:
-        checkpoint = Checkpoint(id=checkpoint_data['id'],
-                                habit_id=checkpoint_data['habit_id'],
-                                current_checkpoint=datetime.datetime.strptime(checkpoint_data['current_checkpoint'],
-                                                                              date_format).date(),
-                                last_checkpoint=datetime.datetime.strptime(checkpoint_data['last_checkpoint'],
-                                                                           date_format).date(),
-                                next_checkpoint=datetime.datetime.strptime(checkpoint_data['next_checkpoint'],
-                                                                           date_format).date(),
-                                is_valid_streak=checkpoint_data['is_valid_streak'])
-        submit_values(checkpoint)
+    report = bulk_import()
+    print(f"Imported {report.rows} rows in {report.seconds:.3f}s ({report.rows_per_second:.0f} rows/s).")
+    return report
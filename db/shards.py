@@ -0,0 +1,163 @@
+import collections
+import concurrent.futures
+import contextlib
+import os
+import threading
+
+from sqlalchemy.orm import sessionmaker
+
+from db.config import SHARD_PREFIX, SHARD_SUFFIX, shard_path
+from db.database_module import build_engine
+
+
+class ShardRouter:
+    """
+    Routes every tenant to its own SQLite database file.
+
+    The engines of the tenants are built on first use and kept in an LRU cache of
+    max_open engines; the least recently used engine is disposed of when another
+    tenant is opened. Connections still checked out of an evicted engine stay valid.
+
+    Args:
+        settings (DatabaseSettings): The settings for the shard engines; url is replaced per tenant.
+        directory (str): The directory of the tenant databases. Defaults to settings.shard_directory.
+        max_open (int): Number of engines kept open. Defaults to settings.max_open_shards.
+    """
+
+    def __init__(self, settings, directory=None, max_open=None):
+        """
+        Initializes ShardRouter without opening any database.
+
+        Args:
+            settings (DatabaseSettings): The settings for the shard engines; url is replaced per tenant.
+            directory (str): The directory of the tenant databases. Defaults to settings.shard_directory.
+            max_open (int): Number of engines kept open. Defaults to settings.max_open_shards.
+        """
+        self.settings = settings
+        self.directory = directory or settings.shard_directory
+        self.max_open = max_open or settings.max_open_shards
+        self._engines = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def path_for(self, tenant):
+        """
+        Returns the database file of a tenant.
+
+        Raises:
+            ValueError: If the tenant id is not 1 to 64 letters, digits, "_" or "-".
+        """
+        return shard_path(self.directory, tenant)
+
+    def tenants(self):
+        """
+        Returns:
+            list: The ids of the tenants with a database file, sorted.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[len(SHARD_PREFIX):-len(SHARD_SUFFIX)] for name in os.listdir(self.directory)
+                      if name.startswith(SHARD_PREFIX) and name.endswith(SHARD_SUFFIX))
+
+    def get_engine(self, tenant):
+        """
+        Returns the engine of a tenant, creating its database on first use.
+
+        Returns:
+            Engine: The cached engine of the tenant.
+        """
+        path = self.path_for(tenant)
+        with self._lock:
+            engine = self._engines.get(tenant)
+            if engine is not None:
+                self._engines.move_to_end(tenant)
+                return engine
+        os.makedirs(self.directory, exist_ok=True)
+        engine = build_engine(self.settings._replace(url='sqlite:///' + path))
+        with self._lock:
+            if tenant in self._engines:
+                engine.dispose()
+                engine = self._engines[tenant]
+                self._engines.move_to_end(tenant)
+                return engine
+            self._engines[tenant] = engine
+            evicted = []
+            while len(self._engines) > self.max_open:
+                evicted.append(self._engines.popitem(last=False)[1])
+        for old_engine in evicted:
+            old_engine.dispose()
+        return engine
+
+    def open_tenants(self):
+        """
+        Returns:
+            list: The tenants with an open engine, least recently used first.
+        """
+        with self._lock:
+            return list(self._engines)
+
+    @contextlib.contextmanager
+    def session_scope(self, tenant):
+        """
+        Provides a session on the database of a tenant for one unit of work.
+
+        Commits when the block succeeds and rolls back if it raises.
+
+        Yields:
+            Session: The session of the unit of work.
+        """
+        unit_session = sessionmaker(bind=self.get_engine(tenant))()
+        try:
+            yield unit_session
+            unit_session.commit()
+        except Exception:
+            unit_session.rollback()
+            raise
+        finally:
+            unit_session.close()
+
+    @contextlib.contextmanager
+    def habit_manager(self, tenant, **options):
+        """
+        Yields a HabitManager on the database of a tenant for one unit of work.
+
+        Args:
+            tenant (str): The tenant id.
+            **options: Passed on to HabitManager.
+        """
+        from habit import HabitManager
+
+        with self.session_scope(tenant) as unit_session:
+            yield HabitManager(unit_session, **options)
+
+    def fan_out(self, operation, tenants=None, max_workers=None):
+        """
+        Runs operation(habit_manager) on the database of every tenant.
+
+        The tenants are processed by a thread pool, each in its own unit of work.
+
+        Args:
+            operation: Callable receiving a HabitManager, e.g. analytics_module.analyze_habits_in_db.
+            tenants (list): The tenants to query. Defaults to all tenants with a database file.
+            max_workers (int): Threads of the pool. Defaults to max_open.
+
+        Returns:
+            dict: The result of the operation by tenant, in tenant order.
+        """
+        tenants = self.tenants() if tenants is None else list(tenants)
+
+        def run(tenant):
+            with self.habit_manager(tenant) as manager:
+                return operation(manager)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or self.max_open) as executor:
+            return dict(zip(tenants, executor.map(run, tenants)))
+
+    def dispose(self):
+        """
+        Disposes of all open engines.
+        """
+        with self._lock:
+            engines = list(self._engines.values())
+            self._engines.clear()
+        for engine in engines:
+            engine.dispose()
@@ -1,10 +1,41 @@
+import contextlib
 import datetime
+from collections import namedtuple
 
 import questionary
-from sqlalchemy import select
+from sqlalchemy import select, insert, delete, update, tuple_, exists, null, and_, or_
+from sqlalchemy.orm import Query, joinedload
 
 import analytics_module
-from db.database_module import Habit, Completion, Checkpoint
+import clock
+from analytics_cache import bump_data_version
+import rollup_module
+import summary_module
+from db.database_module import Habit, Completion, Checkpoint, CheckinEvent, to_day_number, from_day_number
+
+# Number of ids bound per IN clause, kept well below the 999 variables of older SQLite versions.
+BATCH_SIZE = 500
+# Number of events checkin_habits and compact_checkin_events commit at once.
+CHECKIN_CHUNK_SIZE = 1000
+# Number of habits iter_habits loads per query.
+PAGE_SIZE = 500
+
+# Sort keys of iter_habits; the id makes every key unique for the keyset condition.
+# created_at is nullable, see _after_key.
+HABIT_ORDERS = {'id': (Habit.id,),
+                'name': (Habit.name, Habit.id),
+                'created_at': (Habit.created_at, Habit.id)}
+
+BrokenHabit = namedtuple('BrokenHabit', ['id', 'name', 'periodicity', 'created_at', 'checkpoint_id',
+                                         'completion_status', 'completion_date'])
+
+CheckinReport = namedtuple('CheckinReport', ['accepted', 'rejected'])
+
+HabitState = namedtuple('HabitState', ['habit', 'checkpoint', 'completion'])
+
+# Read-only row of the listing screens, fetched as plain columns without identity map or relationships.
+HabitRecord = namedtuple('HabitRecord', ['id', 'name', 'periodicity', 'created_at', 'target_date',
+                                         'current_checkpoint'])
 
 
 def get_date_differenz(current_checkpoint, last_checkpoint):
@@ -35,25 +66,114 @@ def set_checkpoint(base_date, periodicity):
     return base_date + time_to_add
 
 
-def streak_is_valid(next_checkpoint, current_checkpoint):
+def streak_is_valid(next_checkpoint, current_checkpoint, today=None):
     """Check if the streak is valid.
 
     Args:
-        next_checkpoint: The next checkpoint date.
+        next_checkpoint: The next checkpoint date. None once the target date is reached.
         current_checkpoint: The current checkpoint date.
+        today: The date to check. Defaults to clock.today().
 
     Returns:
         True if the streak is valid, False otherwise.
     """
-    return True if next_checkpoint >= datetime.datetime.now().date() >= current_checkpoint \
+    today = today or clock.today()
+    return True if next_checkpoint is not None and next_checkpoint >= today >= current_checkpoint \
         else False
 
 
+def new_checkpoint(habit, checkin_date):
+    """
+    Creates the checkpoint of the first check-in of a habit.
+
+    Args:
+        habit: The habit (or a row with id and periodicity).
+        checkin_date (datetime.date): The date of the check-in.
+
+    Returns:
+        Checkpoint: The new, not yet added checkpoint.
+    """
+    return Checkpoint(habit_id=habit.id, last_checkpoint=checkin_date, current_checkpoint=checkin_date,
+                      next_checkpoint=set_checkpoint(checkin_date, habit.periodicity))
+
+
+def advance_checkpoint(checkpoint, habit, checkin_date):
+    """
+    Moves an existing checkpoint forward to a check-in.
+
+    Args:
+        checkpoint (Checkpoint): The checkpoint of the habit.
+        habit: The habit (or a row with periodicity and target_date).
+        checkin_date (datetime.date): The date of the check-in.
+    """
+    checkpoint.is_valid_streak = streak_is_valid(checkpoint.next_checkpoint, checkpoint.current_checkpoint,
+                                                 checkin_date)
+    checkpoint.last_checkpoint = checkpoint.current_checkpoint
+    checkpoint.current_checkpoint = checkin_date
+    checkpoint.next_checkpoint = set_checkpoint(checkin_date, habit.periodicity) if (
+            habit.target_date is None or habit.target_date > checkin_date) else None
+
+
+def never_checked_in(before):
+    """
+    Selects the habits without checkpoint whose first deadline is before a date.
+
+    A habit that was never checked in expires like its first checkpoint would have, one
+    period after its creation. The conditions on created_at use its index.
+
+    Args:
+        before (datetime.date): Only habits whose first deadline is before this date.
+
+    Returns:
+        Select: id, name, periodicity, created_at and a NULL checkpoint_id of the habits.
+    """
+    return (select(Habit.id, Habit.name, Habit.periodicity, Habit.created_at, null().label('checkpoint_id'))
+            .where(Habit.created_at < before - datetime.timedelta(days=1),
+                   or_(Habit.periodicity == "daily", Habit.created_at < before - datetime.timedelta(weeks=1)),
+                   ~exists().where(Checkpoint.habit_id == Habit.id)))
+
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value)
+
+
+def _after_key(columns, key):
+    """
+    Returns the condition for the rows after key in the order of columns.
+
+    SQLite sorts NULL first, and a row value comparison with a NULL matches no row, so
+    a NULL in the key is compared column by column.
+    """
+    if key[0] is not None:
+        return tuple_(*columns) > tuple_(*key)
+    if len(columns) == 1:
+        return columns[0].isnot(None)
+    return or_(columns[0].isnot(None), and_(columns[0].is_(None), _after_key(columns[1:], key[1:])))
+
+
+def _group(items, size):
+    """
+    Yields lists of size consecutive items, the last one possibly shorter.
+    """
+    page = []
+    for item in items:
+        page.append(item)
+        if len(page) == size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
 def print_list(headline, broken_habits):
     """
     Args:
         headline (str): The headline or title to be displayed before printing the list of broken habits.
-        broken_habits (list): A list containing the broken habits to be displayed.
+        broken_habits (list): A list of BrokenHabit records as returned by HabitManager.validate_habits.
 
     Returns:
         None
@@ -66,8 +186,7 @@ def print_list(headline, broken_habits):
     for broken_habit in broken_habits:
         questionary.print(
             " - " + broken_habit.name + "(ID: " + str(broken_habit.id) + "), after "
-            + str(analytics_module.get_streak(
-                broken_habit, broken_habit.completions[0].completion_date)) +
+            + str(analytics_module.get_streak(broken_habit, broken_habit.completion_date)) +
             " sucessfull Days", style='bold fg:ansiblue')
     input("Press any Key to continue...")
 
@@ -76,18 +195,86 @@ class HabitManager:
     """
     The HabitManager class is responsible for managing habits in a database.
 
+    Every check-in is appended to the checkin_events log. In append-only mode a
+    check-in is only that insert, and compact_checkin_events folds the pending
+    events into the checkpoints and summaries later.
+
+    Inside unit_of_work() the lookups by habit id are served from one query per habit.
+
     Args:
         session: The database session to use.
+        append_only (bool): Only append check-ins to the event log.
+        today: Callable returning the current date. Defaults to clock.today.
     """
 
-    def __init__(self, session):
+    def __init__(self, session, append_only=False, today=None):
         """
         Initializes HabitManager with a database session.
 
         Args:
             session: The database session to use.
+            append_only (bool): Only append check-ins to the event log.
+            today: Callable returning the current date. Defaults to clock.today.
         """
         self.session = session
+        self.append_only = append_only
+        self.today = today or clock.today
+        self._states = None
+
+    @contextlib.contextmanager
+    def unit_of_work(self):
+        """
+        Caches the habits loaded by id until the block ends.
+
+        Within the block get_habit, get_habit_by_id, get_checkpoint_by_habit_id, has_checkpoint,
+        get_completion_by_habit_id and get_completed_habit_by_habit_id share one load_habit_state
+        query per habit. Nested blocks use the cache of the outermost one.
+
+        Yields:
+            HabitManager: This manager.
+        """
+        if self._states is not None:
+            yield self
+            return
+        self._states = {}
+        try:
+            yield self
+        finally:
+            self._states = None
+
+    def load_habit_state(self, habit_id):
+        """
+        Loads a habit together with its first checkpoint and first completion in one query.
+
+        Args:
+            habit_id (int): The ID of the habit.
+
+        Returns:
+            HabitState: The habit, checkpoint and completion; each is None if it does not exist.
+        """
+        try:
+            habit_id = int(habit_id)
+        except (TypeError, ValueError):
+            return HabitState(None, None, None)
+        if self._states is not None and habit_id in self._states:
+            return self._states[habit_id]
+        row = self.session.execute(select(Habit, Checkpoint, Completion)
+                                   .outerjoin(Checkpoint, Checkpoint.habit_id == Habit.id)
+                                   .outerjoin(Completion, Completion.habit_id == Habit.id)
+                                   .where(Habit.id == habit_id)
+                                   .order_by(Checkpoint.id, Completion.id)
+                                   .limit(1)).first()
+        state = HabitState(*row) if row is not None else HabitState(None, None, None)
+        if self._states is not None:
+            self._states[habit_id] = state
+        return state
+
+    def _remember(self, habit_id, **entities):
+        """
+        Updates the cached state of a habit after adding or deleting its checkpoint or completion.
+        """
+        if self._states is not None and int(habit_id) in self._states:
+            self._states[int(habit_id)] = self._states[int(habit_id)]._replace(**entities)
 
     def add_habit(self, name, periodicity, target_date):
         """
@@ -99,14 +286,21 @@ class HabitManager:
             :param name: The name of the habit.
             :param periodicity: The periodicity of the habit.
             :param target_date: The date the habit tracker should be finished.
+
+        Returns:
+            Habit: The new habit.
         """
         new_habit = Habit(name=name, periodicity=periodicity, target_date=target_date)
         self.session.add(new_habit)
+        self.session.flush()
+        rollup_module.record_created(self.session, [(new_habit.periodicity, new_habit.created_at)])
+        bump_data_version(self.session)
         self.session.commit()
         self.checkin_habit(new_habit.id)
         print(f'Inserted new habit_id: {new_habit.id} ,habit {new_habit.name}, '
               f'Periodicity: {new_habit.periodicity}, 'f'target date: {target_date}')
         print('done')
+        return new_habit
 
     def has_checkpoint(self, habit: int):
         """
@@ -127,6 +321,10 @@ class HabitManager:
         Args:
             habit_id (int): The ID of the habit to mark as complete.
         """
+        with self.unit_of_work():
+            return self._complete_habit(habit_id)
+
+    def _complete_habit(self, habit_id):
         checkpoint_status = self.get_checkpoint_by_habit_id(habit_id)
         habit = self.get_habit_by_id(habit_id)
 
@@ -141,7 +339,14 @@ class HabitManager:
             else:
                 completion = Completion(habit_id=habit_id,
                                         completion_status="ABORTED")
+            completion.completion_date = self.today()
             self.session.add(completion)
+            self._remember(habit_id, completion=completion)
+            summary_module.upsert_summaries(self.session, [summary_module.summary_row(
+                habit.id, habit.created_at, completion.completion_date, completion.completion_status)])
+            rollup_module.record_completions(self.session, [
+                (habit.periodicity, completion.completion_date, completion.completion_status)])
+            bump_data_version(self.session)
             self.session.commit()
         return completed
 
@@ -155,6 +360,8 @@ class HabitManager:
         Returns:
             Habit: The habit with the specified ID, or None if not found.
         """
+        if self._states is not None:
+            return self.load_habit_state(habit_id).habit
         return self.session.query(Habit).filter_by(id=habit_id).first()
 
     def list_habits(self):
@@ -169,6 +376,15 @@ class HabitManager:
                 .filter(Completion.habit_id == None)
                 .all())
 
+    def list_habit_records(self):
+        """
+        Lists the habits without a completion like list_habits, as read-only records.
+
+        Returns:
+            list: HabitRecord rows ordered by id.
+        """
+        return list(self.iter_habit_records(status="ongoing"))
+
     def read_habits_by_status(self, habit_status: str):
         """
 
@@ -190,74 +406,498 @@ class HabitManager:
 
     def get_ongoing_habits(self):
         """
+        Retrieves all habits without a completion.
 
-        Returns:
+        The checkpoints are loaded in the same query, so reading habit.checkpoints does not
+        issue a query per habit.
 
+        Returns:
+            list: The ongoing habits.
         """
         subquery = select(Completion.habit_id).subquery()
-        return self.session.query(Habit).filter(Habit.id.notin_(select(subquery))).all()
+        return (self.session.query(Habit)
+                .options(joinedload(Habit.checkpoints))
+                .filter(Habit.id.notin_(select(subquery)))
+                .all())
 
     def get_completed_habits(self):
         """
+        Retrieves all habits with a completion.
 
-        Returns:
+        The completions are loaded in the same query, so reading habit.completions does not
+        issue a query per habit.
 
+        Returns:
+            list: The completed habits.
         """
         subquery = select(Completion.habit_id)
-        return self.session.query(Habit).filter(Habit.id.in_(subquery)).all()
+        return (self.session.query(Habit)
+                .options(joinedload(Habit.completions))
+                .filter(Habit.id.in_(subquery))
+                .all())
+
+    def iter_habits(self, status=None, periodicity=None, name_prefix=None, created_from=None, created_to=None,
+                    order_by='id', page_size=PAGE_SIZE):
+        """
+        Streams the habits matching the filters with keyset pagination.
+
+        Every page is one query for the next page_size habits after the sort key of the
+        last habit returned, so a page costs the same wherever it starts and at most
+        one page of habits is loaded at a time.
+
+        Args:
+            status (str): "ongoing" (no completion), "completed" or None for all habits.
+            periodicity (str): Only habits with this periodicity. Optional.
+            name_prefix (str): Only habits whose name starts with this text. Optional.
+            created_from (datetime.date): Only habits created on or after this date. Optional.
+            created_to (datetime.date): Only habits created on or before this date. Optional.
+            order_by (str): "id", "name" or "created_at".
+            page_size (int): Number of habits per query.
+
+        Yields:
+            Habit: The matching habits in sort order.
+
+        Raises:
+            ValueError: If status or order_by is unknown.
+        """
+        if order_by not in HABIT_ORDERS:
+            raise ValueError(f"unknown order: {order_by}")
+        columns = HABIT_ORDERS[order_by]
+        query = self._filter_habits(self.session.query(Habit), status, periodicity, name_prefix, created_from,
+                                    created_to)
+        for page in self._keyset_pages(query.order_by(*columns), columns, page_size, Query.all):
+            yield from page
+
+    def iter_habit_records(self, status=None, periodicity=None, name_prefix=None, created_from=None,
+                           created_to=None, order_by='id', page_size=PAGE_SIZE):
+        """
+        Streams the habits matching the filters like iter_habits, as read-only HabitRecord rows.
+
+        The columns are fetched as plain tuples together with the current checkpoint date of
+        the first checkpoint, so no ORM instances are built, tracked or lazily loaded.
+
+        Args:
+            status (str): "ongoing" (no completion), "completed" or None for all habits.
+            periodicity (str): Only habits with this periodicity. Optional.
+            name_prefix (str): Only habits whose name starts with this text. Optional.
+            created_from (datetime.date): Only habits created on or after this date. Optional.
+            created_to (datetime.date): Only habits created on or before this date. Optional.
+            order_by (str): "id", "name" or "created_at".
+            page_size (int): Number of habits per query.
+
+        Yields:
+            HabitRecord: The matching habits in sort order.
+
+        Raises:
+            ValueError: If status or order_by is unknown.
+        """
+        if order_by not in HABIT_ORDERS:
+            raise ValueError(f"unknown order: {order_by}")
+        columns = HABIT_ORDERS[order_by]
+        query = (select(Habit.id, Habit.name, Habit.periodicity, Habit.created_at, Habit.target_date,
+                        Checkpoint.current_checkpoint)
+                 .outerjoin(Checkpoint, Checkpoint.id == analytics_module.first_checkpoint_id()))
+        query = self._filter_habits(query, status, periodicity, name_prefix, created_from, created_to)
+
+        def fetch(page_query):
+            return list(map(HabitRecord._make, self.session.execute(page_query)))
+
+        for page in self._keyset_pages(query.order_by(*columns), columns, page_size, fetch):
+            yield from page
+
+    @staticmethod
+    def _filter_habits(query, status, periodicity, name_prefix, created_from, created_to):
+        """
+        Applies the filters of iter_habits to a query or select of habits.
+        """
+        if status == "ongoing":
+            query = query.filter(Habit.id.notin_(select(Completion.habit_id)))
+        elif status == "completed":
+            query = query.filter(Habit.id.in_(select(Completion.habit_id)))
+        elif status is not None:
+            raise ValueError(f"unknown habit status: {status}")
+        if periodicity is not None:
+            query = query.filter(Habit.periodicity == periodicity)
+        if name_prefix:
+            query = query.filter(Habit.name.startswith(name_prefix, autoescape=True))
+        if created_from is not None:
+            query = query.filter(Habit.created_at >= created_from)
+        if created_to is not None:
+            query = query.filter(Habit.created_at <= created_to)
+        return query
+
+    @staticmethod
+    def _keyset_pages(query, columns, page_size, fetch):
+        """
+        Yields the pages of an ordered query, each fetched with one query for the page_size
+        rows after the sort key of the last row of the previous page.
+        """
+        last_key = None
+        while True:
+            page_query = query if last_key is None else query.filter(_after_key(columns, last_key))
+            page = fetch(page_query.limit(page_size))
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            last_key = [getattr(page[-1], column.key) for column in columns]
+
+    def habit_pages(self, page_size=PAGE_SIZE, **filters):
+        """
+        Groups iter_habits into lists of page_size habits, e.g. for paged display.
+
+        Args:
+            page_size (int): Number of habits per page.
+            **filters: The filter and order arguments of iter_habits.
+
+        Yields:
+            list: The next page of habits.
+        """
+        return _group(self.iter_habits(page_size=page_size, **filters), page_size)
+
+    def habit_record_pages(self, page_size=PAGE_SIZE, **filters):
+        """
+        Groups iter_habit_records into lists of page_size records for the read-only listings.
+
+        Args:
+            page_size (int): Number of habits per page.
+            **filters: The filter and order arguments of iter_habits.
+
+        Yields:
+            list: The next page of HabitRecord rows.
+        """
+        return _group(self.iter_habit_records(page_size=page_size, **filters), page_size)
 
-    def checkin_habit(self, habit: int):
+    def checkin_habit(self, habit: int, checkin_date=None):
+        """
+        Checks in a habit, creating its checkpoint on the first check-in.
+
+        Args:
+            habit (int): The ID of the habit.
+            checkin_date (datetime.date): The date of the check-in. Defaults to the manager's today().
+        """
+        with self.unit_of_work():
+            self._checkin_habit(habit, checkin_date or self.today())
+
+    def _checkin_habit(self, habit, checkin_date):
         habit = self.get_habit(habit_id=habit)
-        if habit is not None:
-            habit_target_date = habit.target_date
+        if habit is not None and self.append_only:
+            self._append_events([(habit.id, checkin_date)], applied=False)
+            self.session.commit()
+        elif habit is not None:
             if self.has_checkpoint(habit.id):
                 checkpoint = self.get_checkpoint_by_habit_id(habit.id)
-
-                checkpoint.is_valid_streak = streak_is_valid(checkpoint.next_checkpoint, checkpoint.current_checkpoint)
-                checkpoint.last_checkpoint = checkpoint.current_checkpoint
-                checkpoint.current_checkpoint = datetime.date.today()
-                checkpoint.next_checkpoint = set_checkpoint(datetime.datetime.now().date(), habit.periodicity) if (
-                        habit_target_date > datetime.datetime.now().date()) else None
-                self.session.commit()
+                advance_checkpoint(checkpoint, habit, checkin_date)
             else:
-                checkpoint = Checkpoint(habit_id=habit.id, next_checkpoint=set_checkpoint(
-                    datetime.datetime.now().date(), habit.periodicity))
+                checkpoint = new_checkpoint(habit, checkin_date)
                 self.session.add(checkpoint)
-                self.session.commit()
+                self._remember(habit.id, checkpoint=checkpoint)
+            summary_module.upsert_summaries(self.session, [summary_module.summary_row(
+                habit.id, habit.created_at, checkpoint.current_checkpoint, last_checkin=checkpoint.current_checkpoint)])
+            rollup_module.record_checkins(self.session, [(habit.id, habit.periodicity, checkin_date)])
+            self._append_events([(habit.id, checkin_date)], applied=True)
+            bump_data_version(self.session)
+            self.session.commit()
         else:
             print("\n ... INVALID HABIT ID ... \n")
 
+    def checkin_habits(self, events, chunk_size=CHECKIN_CHUNK_SIZE):
+        """
+        Checks in a stream of (habit_id, date) events.
+
+        The events are processed in chunks: the habits and checkpoints of a chunk are
+        loaded with one query per BATCH_SIZE habits, the check-ins are applied in memory
+        in the order of the events and every chunk is committed once. The result is the
+        same as calling checkin_habit(habit_id, date) for every event.
+
+        Args:
+            events: Iterable of (habit_id, date) pairs. The date may be a datetime.date or an ISO string.
+            chunk_size (int): Number of events per commit.
+
+        Returns:
+            CheckinReport: The number of accepted events and (index, event, reason) of the rejected ones.
+        """
+        accepted = 0
+        rejected = []
+        chunk = []
+        for index, event in enumerate(events):
+            try:
+                habit_id, checkin_date = event
+                chunk.append((index, int(habit_id), _to_date(checkin_date)))
+            except (TypeError, ValueError):
+                rejected.append((index, event, "malformed event"))
+            if len(chunk) == chunk_size:
+                accepted += self._checkin_chunk(chunk, rejected)
+                chunk = []
+        if chunk:
+            accepted += self._checkin_chunk(chunk, rejected)
+        return CheckinReport(accepted, rejected)
+
+    def _append_events(self, checkins, applied):
+        """
+        Appends (habit_id, date) check-ins to the event log without committing.
+        """
+        self.session.execute(insert(CheckinEvent), [
+            {'habit_id': habit_id, 'day': to_day_number(checkin_date), 'applied': applied}
+            for habit_id, checkin_date in checkins])
+
+    def _checkin_chunk(self, chunk, rejected, pending_event_ids=None):
+        """
+        Applies a chunk of (index, habit_id, date) check-ins and commits it.
+
+        New check-ins are appended to the event log, and in append-only mode nothing
+        else is written. When pending_event_ids is given the chunk replays logged
+        events, which are marked as applied instead.
+
+        Returns:
+            int: The number of accepted check-ins.
+        """
+        habits = {}
+        for habit_ids in _group({habit_id for _, habit_id, _ in chunk}, BATCH_SIZE):
+            habits.update((habit.id, habit) for habit in
+                          self.session.query(Habit.id, Habit.periodicity, Habit.created_at, Habit.target_date)
+                          .filter(Habit.id.in_(habit_ids)))
+        accepted = []
+        for index, habit_id, checkin_date in chunk:
+            if habit_id in habits:
+                accepted.append((habit_id, checkin_date))
+            else:
+                rejected.append((index, (habit_id, checkin_date), "unknown habit"))
+        try:
+            if self.append_only and pending_event_ids is None:
+                if accepted:
+                    self._append_events(accepted, applied=False)
+            else:
+                self._apply_checkins(habits, accepted)
+                if pending_event_ids is None:
+                    if accepted:
+                        self._append_events(accepted, applied=True)
+                else:
+                    for start in range(0, len(pending_event_ids), BATCH_SIZE):
+                        self.session.execute(update(CheckinEvent)
+                                             .where(CheckinEvent.id.in_(pending_event_ids[start:start + BATCH_SIZE]))
+                                             .values(applied=True))
+                bump_data_version(self.session)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        return len(accepted)
+
+    def _apply_checkins(self, habits, checkins):
+        """
+        Applies (habit_id, date) check-ins of known habits to their checkpoints and summaries.
+        """
+        checkpoints = {}
+        for habit_ids in _group(habits.keys(), BATCH_SIZE):
+            for checkpoint in (self.session.query(Checkpoint)
+                               .filter(Checkpoint.habit_id.in_(habit_ids))
+                               .order_by(Checkpoint.id)):
+                checkpoints.setdefault(checkpoint.habit_id, checkpoint)
+        summaries = []
+        for habit_id, checkin_date in checkins:
+            habit = habits[habit_id]
+            checkpoint = checkpoints.get(habit_id)
+            if checkpoint is None:
+                checkpoint = checkpoints[habit_id] = new_checkpoint(habit, checkin_date)
+                self.session.add(checkpoint)
+            else:
+                advance_checkpoint(checkpoint, habit, checkin_date)
+            summaries.append(summary_module.summary_row(habit_id, habit.created_at, checkin_date,
+                                                        last_checkin=checkin_date))
+        self.session.flush()
+        summary_module.upsert_summaries(self.session, summaries)
+        rollup_module.record_checkins(self.session, [(habit_id, habits[habit_id].periodicity, checkin_date)
+                                                     for habit_id, checkin_date in checkins])
+
+    def compact_checkin_events(self, chunk_size=CHECKIN_CHUNK_SIZE, prune_before=None):
+        """
+        Folds the pending check-in events into the checkpoints and summaries.
+
+        The events are replayed in the order they were logged, one committed chunk at a
+        time, with the same rules as checkin_habit.
+
+        Args:
+            chunk_size (int): Number of events per commit.
+            prune_before (datetime.date): Also delete applied events before this date. By default
+                the whole history is kept.
+
+        Returns:
+            int: The number of compacted events.
+        """
+        compacted = 0
+        while True:
+            events = (self.session.query(CheckinEvent.id, CheckinEvent.habit_id, CheckinEvent.day)
+                      .filter(CheckinEvent.applied == False)
+                      .order_by(CheckinEvent.id)
+                      .limit(chunk_size)
+                      .all())
+            if not events:
+                break
+            self._checkin_chunk([(event_id, habit_id, from_day_number(day)) for event_id, habit_id, day in events],
+                                [], pending_event_ids=[event.id for event in events])
+            compacted += len(events)
+        if prune_before is not None:
+            self.session.execute(delete(CheckinEvent)
+                                 .where(CheckinEvent.applied == True,
+                                        CheckinEvent.day < to_day_number(prune_before)))
+            bump_data_version(self.session)
+            self.session.commit()
+        return compacted
+
     def get_habit_by_id(self, habit_id: int):
-        return self.session.query(Habit).filter_by(id=habit_id).first()
+        return self.get_habit(habit_id)
 
     def get_completed_habit_by_habit_id(self, habit_id: int):
-        return self.session.query(Completion).filter_by(habit_id=habit_id).first()
+        return self.get_completion_by_habit_id(habit_id)
 
     def delete_checkpoints_for_completed_habit(self, habit_id: int):
         self.session.query(Checkpoint).filter(Checkpoint.habit_id == habit_id).delete()
+        self._remember(habit_id, checkpoint=None)
+        bump_data_version(self.session)
         self.session.commit()
 
     def get_checkpoint_by_habit_id(self, habit_id: int):
+        if self._states is not None:
+            return self.load_habit_state(habit_id).checkpoint
         return self.session.query(Checkpoint).filter_by(habit_id=habit_id).first()
 
     def delete_checkpoint(self, checkpoint: Checkpoint):
         self.session.delete(checkpoint)
         return self.session.commit
 
-    def validate_habits(self):
-        ongoing_habits = self.read_habits_by_status("running")
-        broken_habits = []
-        for habit in ongoing_habits:
-            checkpoint = habit.checkpoints[0]
-            if checkpoint is None or not streak_is_valid(checkpoint.next_checkpoint, checkpoint.current_checkpoint):
-                self.delete_checkpoint(checkpoint)
-                broken_habits.append(habit)
-                self.session.commit()
-                self.complete_habit(habit.id)
-            else:
-                pass
-        if len(broken_habits) != 0:
+    def find_broken_habits(self, today=None, habit_ids=None):
+        """
+        Finds every ongoing habit whose checkpoint has expired with a single query.
+
+        Habits without checkpoint expire one period after their creation, see never_checked_in.
+
+        Args:
+            today (datetime.date): The reference date. Defaults to the manager's today().
+            habit_ids (list): Only check these habits. Optional.
+
+        Returns:
+            list: BrokenHabit records with completion_status "FAILED" and completion_date set to today.
+        """
+        today = today or self.today()
+        checkpointed = (select(Habit.id, Habit.name, Habit.periodicity, Habit.created_at,
+                               Checkpoint.id.label('checkpoint_id'))
+                        .join(Habit, Habit.id == Checkpoint.habit_id)
+                        .where(Checkpoint.next_checkpoint < today))
+        unchecked = never_checked_in(today)
+        if habit_ids is not None:
+            checkpointed = checkpointed.where(Habit.id.in_(habit_ids))
+            unchecked = unchecked.where(Habit.id.in_(habit_ids))
+        ongoing = Habit.id.notin_(select(Completion.habit_id))
+        # Sorted here: an ORDER BY on the union would make SQLite walk all habits in id order.
+        rows = sorted(self.session.execute(checkpointed.where(ongoing).union_all(unchecked.where(ongoing))),
+                      key=lambda row: row.id)
+        return [BrokenHabit(habit_id, name, periodicity, created_at, checkpoint_id, "FAILED", today)
+                for habit_id, name, periodicity, created_at, checkpoint_id in rows]
+
+    def validate_habits(self, interactive=True, habit_ids=None):
+        """
+        Completes every habit with a broken streak in one transaction.
+
+        Pending check-in events are compacted first, so append-only check-ins count.
+        The expired checkpoints are deleted, and a completion is written and the summary is
+        updated for each broken habit.
+
+        Args:
+            interactive (bool): Print the broken habits and wait for a key press.
+            habit_ids (list): Only validate these habits, e.g. the ones a scheduler found due. Optional.
+
+        Returns:
+            list: The BrokenHabit records that were completed.
+        """
+        self.compact_checkin_events()
+        broken_habits = self.find_broken_habits(habit_ids=habit_ids)
+        self._complete_broken_habits(broken_habits)
+        if interactive and broken_habits:
             print_list("you broke the streak for following Habits:\n", broken_habits)
+        return broken_habits
+
+    def replay_validation(self, start, end):
+        """
+        Finds the habits validate_habits would have completed on each day from start to end.
+
+        Instead of validating once per day, the expired checkpoints are read in one query:
+        a habit whose next checkpoint is before end breaks on the day after its next
+        checkpoint, or on start if that day has already passed. This matches running
+        validate_habits on every day of the range with the current checkpoints.
+
+        Args:
+            start (datetime.date): The first day the validation did not run.
+            end (datetime.date): The last day to replay.
+
+        Returns:
+            dict: The BrokenHabit records by the day they break, in date order. Their
+            completion_date is that day.
+        """
+        ongoing = Habit.id.notin_(select(Completion.habit_id))
+        checkpointed = (select(Habit.id, Habit.name, Habit.periodicity, Habit.created_at,
+                               Checkpoint.id.label('checkpoint_id'), Checkpoint.next_checkpoint)
+                        .join(Habit, Habit.id == Checkpoint.habit_id)
+                        .where(Checkpoint.next_checkpoint < end, ongoing))
+        unchecked = never_checked_in(end).add_columns(null().label('next_checkpoint')).where(ongoing)
+        rows = sorted(self.session.execute(checkpointed.union_all(unchecked)), key=lambda row: row.id)
+        broken_by_day = {}
+        for habit_id, name, periodicity, created_at, checkpoint_id, next_checkpoint in rows:
+            next_checkpoint = next_checkpoint or set_checkpoint(created_at, periodicity)
+            day = max(start, next_checkpoint + datetime.timedelta(days=1))
+            broken_by_day.setdefault(day, []).append(
+                BrokenHabit(habit_id, name, periodicity, created_at, checkpoint_id, "FAILED", day))
+        return dict(sorted(broken_by_day.items()))
+
+    def backfill_validation(self, start, end):
+        """
+        Completes the habits that broke while the validation did not run, dated the day they broke.
+
+        Args:
+            start (datetime.date): The first day the validation did not run.
+            end (datetime.date): The last day to backfill, usually today.
+
+        Returns:
+            dict: The completed BrokenHabit records by day, see replay_validation.
+        """
+        self.compact_checkin_events()
+        broken_by_day = self.replay_validation(start, end)
+        self._complete_broken_habits([broken_habit for broken_habits in broken_by_day.values()
+                                      for broken_habit in broken_habits])
+        return broken_by_day
+
+    def _complete_broken_habits(self, broken_habits):
+        """
+        Writes the completions and summaries of broken habits and deletes their checkpoints
+        in one transaction.
+        """
+        if not broken_habits:
+            return
+        try:
+            self.session.execute(insert(Completion), [
+                {"habit_id": broken_habit.id,
+                 "completion_status": broken_habit.completion_status,
+                 "completion_date": broken_habit.completion_date}
+                for broken_habit in broken_habits])
+            checkpoint_ids = [broken_habit.checkpoint_id for broken_habit in broken_habits
+                              if broken_habit.checkpoint_id is not None]
+            for start in range(0, len(checkpoint_ids), BATCH_SIZE):
+                self.session.execute(delete(Checkpoint)
+                                     .where(Checkpoint.id.in_(checkpoint_ids[start:start + BATCH_SIZE])))
+            summary_module.upsert_summaries(self.session, [
+                summary_module.summary_row(broken_habit.id, broken_habit.created_at, broken_habit.completion_date,
+                                           broken_habit.completion_status)
+                for broken_habit in broken_habits])
+            rollup_module.record_completions(self.session, [
+                (broken_habit.periodicity, broken_habit.completion_date, broken_habit.completion_status)
+                for broken_habit in broken_habits])
+            bump_data_version(self.session)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
 
     def get_completion_by_habit_id(self, habit_id):
+        if self._states is not None:
+            return self.load_habit_state(habit_id).completion
         return self.session.query(Completion).filter_by(habit_id=habit_id).first()
@@ -0,0 +1,240 @@
+"""
+Call, SQL and timing statistics of the habit tracker operations.
+
+While a Profiler is enabled every public HabitManager method, the analytics_module
+entry points and the menu screens of main.py are wrapped, and every SQL statement
+is attributed to the operations running when it was executed. Nested operations
+are counted inclusively, so a screen includes the statements of the analytics it
+calls and the time not spent in SQL is left to Python code and rendering. Generators
+and context managers are attributed while they run, not while the caller consumes
+their items or runs the with block.
+
+Example:
+    >>> with Profiler() as profiler:
+    ...     analytics_module.analyze_habits(HabitManager(session))
+    >>> print(format_summary(profiler.stats()))
+"""
+import contextlib
+import contextvars
+import functools
+import inspect
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import analytics_module
+from habit import HabitManager
+
+ANALYTICS_FUNCTIONS = ('analyze_habits', 'analyze_habits_in_db', 'analyze_habits_from_summary',
+                       'get_longest_streak', 'get_checkin_streaks', 'analyze_tenants')
+SCREENS = ('view_statistics', 'set_milestone_for_habit', 'print_habits_as_list', 'complete_habit',
+           'predefined_habit', 'create_habit')
+# Name of the statistics of SQL executed outside of any instrumented operation.
+UNATTRIBUTED = '(no operation)'
+STAT_FIELDS = ('calls', 'seconds', 'statements', 'sql_seconds', 'rows', 'lazy_loads')
+
+# Names of the instrumented operations running in the current thread or task.
+_running = contextvars.ContextVar('running_operations', default=())
+
+
+def default_targets():
+    """
+    Returns the (owner, attribute names, label prefix) triples instrumented by default.
+
+    The screens of main.py are only included if main was imported already.
+    """
+    import sys
+
+    methods = tuple(name for name, _ in inspect.getmembers(HabitManager, inspect.isfunction)
+                    if not name.startswith('_'))
+    targets = [(HabitManager, methods, 'HabitManager.'),
+               (analytics_module, ANALYTICS_FUNCTIONS, 'analytics_module.')]
+    if 'main' in sys.modules:
+        targets.append((sys.modules['main'], SCREENS, 'main.'))
+    return targets
+
+
+class Profiler:
+    """
+    Collects per operation statistics while enabled.
+
+    For each operation the number of calls, the wall time, the SQL statements with
+    their time, the rows returned by session queries and the relationship lazy loads
+    are recorded. Query results of an enabled profiler are buffered to count their
+    rows, except for queries streamed with yield_per.
+
+    Args:
+        targets: (owner, attribute names, label prefix) triples to wrap. Defaults to default_targets().
+    """
+
+    def __init__(self, targets=None):
+        """
+        Initializes Profiler without enabling it.
+
+        Args:
+            targets: (owner, attribute names, label prefix) triples to wrap. Defaults to default_targets().
+        """
+        self.targets = targets
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._originals = []
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    @property
+    def enabled(self):
+        return bool(self._originals)
+
+    def enable(self):
+        """
+        Wraps the target operations and starts listening to SQL events.
+        """
+        if self.enabled:
+            return
+        for owner, names, prefix in (self.targets if self.targets is not None else default_targets()):
+            for name in names:
+                original = owner.__dict__.get(name) if inspect.isclass(owner) else getattr(owner, name, None)
+                if original is not None:
+                    self._originals.append((owner, name, original))
+                    setattr(owner, name, self._wrap(original, prefix + name))
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(Session, 'do_orm_execute', self._do_orm_execute)
+
+    def disable(self):
+        """
+        Restores the wrapped operations and stops listening to SQL events. The statistics are kept.
+        """
+        if not self.enabled:
+            return
+        event.remove(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.remove(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.remove(Session, 'do_orm_execute', self._do_orm_execute)
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def stats(self):
+        """
+        Returns:
+            dict: The statistics of every operation by name, each a dict with the keys of STAT_FIELDS.
+        """
+        with self._lock:
+            return {name: dict(values) for name, values in self._stats.items()}
+
+    def _add(self, names, field, amount):
+        with self._lock:
+            for name in names or (UNATTRIBUTED,):
+                values = self._stats.get(name)
+                if values is None:
+                    values = self._stats[name] = dict.fromkeys(STAT_FIELDS, 0)
+                values[field] += amount
+
+    def _wrap(self, function, name):
+        if not inspect.isgeneratorfunction(function) and inspect.isgeneratorfunction(
+                getattr(function, '__wrapped__', None)):
+            # A contextlib.contextmanager: __enter__ and __exit__ resume the generator it wraps.
+            return functools.wraps(function)(contextlib.contextmanager(self._wrap(function.__wrapped__, name)))
+        profiler = self
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            running = _running.get()
+            outermost = name not in running
+            token = _running.set(running + (name,))
+            started = time.perf_counter()
+            result = None
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                _running.reset(token)
+                seconds = time.perf_counter() - started
+                if outermost and not inspect.isgenerator(result):
+                    profiler._add_call(name, seconds)
+            if inspect.isgenerator(result):
+                return profiler._steps(result, name, outermost, seconds)
+            return result
+
+        return wrapper
+
+    def _steps(self, generator, name, outermost, seconds):
+        """
+        Runs every step of a generator returned by an operation as that operation.
+
+        The call is counted when the generator is exhausted or closed, with the time of its steps.
+        """
+        step = functools.partial(generator.send, None)
+        try:
+            while True:
+                token = _running.set(_running.get() + (name,))
+                started = time.perf_counter()
+                try:
+                    item = step()
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    _running.reset(token)
+                    seconds += time.perf_counter() - started
+                try:
+                    step = functools.partial(generator.send, (yield item))
+                except GeneratorExit:
+                    raise
+                except BaseException as error:
+                    step = functools.partial(generator.throw, error)
+        finally:
+            generator.close()
+            if outermost:
+                self._add_call(name, seconds)
+
+    def _add_call(self, name, seconds):
+        self._add((name,), 'calls', 1)
+        self._add((name,), 'seconds', seconds)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info['profiler_started'].pop()
+        names = set(_running.get())
+        self._add(names, 'statements', 1)
+        self._add(names, 'sql_seconds', seconds)
+
+    def _do_orm_execute(self, orm_execute_state):
+        names = set(_running.get())
+        if orm_execute_state.is_relationship_load:
+            self._add(names, 'lazy_loads', 1)
+        if orm_execute_state.execution_options.get('yield_per') or not orm_execute_state.is_select:
+            return None
+        result = orm_execute_state.invoke_statement()
+        frozen = result.freeze()
+        self._add(names, 'rows', len(frozen.data))
+        return frozen()
+
+
+def format_summary(stats):
+    """
+    Formats statistics as a table sorted by wall time.
+
+    Args:
+        stats (dict): The result of Profiler.stats().
+
+    Returns:
+        str: One line per operation.
+    """
+    lines = [f"{'operation':<52} {'calls':>6} {'seconds':>9} {'sql':>6} {'sql s':>8} {'rows':>8} {'lazy':>5}"]
+    for name, values in sorted(stats.items(), key=lambda item: -item[1]['seconds']):
+        lines.append(f"{name:<52} {values['calls']:>6} {values['seconds']:>9.4f} {values['statements']:>6} "
+                     f"{values['sql_seconds']:>8.4f} {values['rows']:>8} {values['lazy_loads']:>5}")
+    return '\n'.join(lines)
@@ -5,9 +5,16 @@ import click
 import questionary
 
 import analytics_module
+import clock
+import rollup_module
+from analytics_cache import cache
 from habit import HabitManager
 from db.database_module import session
-from db.initialize_db import initialize_database
+
+# Number of habits the menus show before asking to continue.
+DISPLAY_PAGE_SIZE = 20
+# Number of days, weeks or months the trend screens show.
+TREND_PERIODS = 12
 
 
 def view_statistics():
@@ -28,11 +35,32 @@ def view_statistics():
         "Statistic Menu:",
         choices=[
             "get longest streak",
+            "completion trend",
+            "check-in trend",
+            "check-in trend of a habit",
         ]
     ).ask()
     manager = HabitManager(session)
-    if choice == "get longest streak":
-        longest_streak = analytics_module.analyze_habits(manager)
+    # Unchanged data is read from the cache, which costs one query for the data version.
+    today = clock.today()
+    if choice in ("completion trend", "check-in trend"):
+        grain = questionary.select("Per:", choices=list(rollup_module.GRAINS)).ask()
+        rows = cache.get(session, ('trend', grain, TREND_PERIODS, today),
+                         lambda: rollup_module.get_trend(session, grain, TREND_PERIODS, end=today))
+        print_trend(rows, choice == "completion trend")
+    elif choice == "check-in trend of a habit":
+        answer = questionary.text("type Habit ID:").ask()
+        grain = questionary.select("Per:", choices=list(rollup_module.GRAINS)).ask()
+        if answer.isdigit():
+            rows = cache.get(session, ('habit trend', int(answer), grain, TREND_PERIODS, today),
+                             lambda: rollup_module.get_habit_trend(session, int(answer), grain, TREND_PERIODS,
+                                                                   end=today))
+            for period_start, checkins in rows:
+                questionary.print("\t" + period_start.isoformat() + "  " + "#" * checkins + " " + str(checkins),
+                                  style='bold fg:ansiblue')
+    elif choice == "get longest streak":
+        longest_streak = cache.get(session, ('analyze_habits_from_summary',),
+                                   lambda: analytics_module.analyze_habits_from_summary(manager))
 
         # Print the result in a readable format
         print("Analysis Result:")
@@ -43,16 +71,33 @@ def view_statistics():
         print("Daily ongoing Habits:")
         for habit in longest_streak['daily_habits']:
             questionary.print("\t- " + habit.name + "(ID: " + str(habit.id) + ") -" +
-                              str(analytics_module.get_streak(habit, habit.checkpoints[0].current_checkpoint)) +
-                              " days streak", style='bold fg:ansiblue')
+                              str(habit.streak) + " days streak", style='bold fg:ansiblue')
         print("Weekly ongoing Habits:")
         for habit in longest_streak['weekly_habits']:
             questionary.print("\t- " + habit.name + "(ID: " + str(habit.id) + ") -" +
-                              str(analytics_module.get_streak(habit, habit.checkpoints[0].current_checkpoint)) +
-                              " days streak", style='bold fg:ansiblue')
+                              str(habit.streak) + " days streak", style='bold fg:ansiblue')
     input("Press any Key to continue...")
 
 
+def print_trend(rows, completions):
+    """
+    Prints one line per period of rollup_module.get_trend.
+
+    Args:
+        rows (list): The TrendRow of every period, oldest first.
+        completions (bool): Print the completions and the success rate instead of the check-ins.
+    """
+    for row in rows:
+        if completions:
+            finished = row.successfully + row.failed + row.aborted
+            rate = f"{row.successfully / finished:.0%}" if finished else "-"
+            text = (f"{row.successfully} successfully, {row.failed} failed, {row.aborted} aborted, "
+                    f"success rate {rate}")
+        else:
+            text = f"{row.checkins} check-ins of {row.active} habits, {row.created} new habits"
+        questionary.print("\t" + row.period_start.isoformat() + "  " + text, style='bold fg:ansiblue')
+
+
 def set_milestone_for_habit():
     """
     Set milestone for habit.
@@ -172,7 +217,7 @@ def create_habit(name, periodicity, target_day):
     """
     target_day = datetime.datetime.max.date() if \
         (target_day == "" or not str.isdigit(target_day)) else \
-        (datetime.datetime.now().date() + datetime.timedelta(int(target_day)))
+        (clock.today() + datetime.timedelta(int(target_day)))
 
     manager = HabitManager(session)
     manager.add_habit(name, periodicity, target_day)
@@ -201,22 +246,23 @@ def complete_habit():
     """
 
     manager = HabitManager(session)
-    for item in manager.list_habits():
-        questionary.print("Habit: " + item.name +
-                          " | Habit ID: " + str(item.id) +
-                          " | Created on: " + str(item.created_at)
-                          , style='bold fg:ansiblue')
+    print_paged(manager.habit_record_pages(status="ongoing", page_size=DISPLAY_PAGE_SIZE),
+                lambda item: questionary.print("Habit: " + item.name +
+                                               " | Habit ID: " + str(item.id) +
+                                               " | Created on: " + str(item.created_at)
+                                               , style='bold fg:ansiblue'))
 
     habit_id = questionary.text("Enter the ID of the habit to complete: ").ask()
-    if (not habit_id.isdigit() or
-            (manager.get_completed_habit_by_habit_id(habit_id) is not None
-             and manager.get_habit_by_id(habit_id) is not None)):
-        input("Invalid or no habit ID given.\n "
-              "Press any Key to continue...")
-    else:
-        if manager.complete_habit(habit_id):
-            click.echo(f'Habit with ID {habit_id} marked as complete.')
-            manager.delete_checkpoints_for_completed_habit(habit_id)
+    with manager.unit_of_work():
+        if (not habit_id.isdigit() or
+                (manager.get_completed_habit_by_habit_id(habit_id) is not None
+                 and manager.get_habit_by_id(habit_id) is not None)):
+            input("Invalid or no habit ID given.\n "
+                  "Press any Key to continue...")
+        else:
+            if manager.complete_habit(habit_id):
+                click.echo(f'Habit with ID {habit_id} marked as complete.')
+                manager.delete_checkpoints_for_completed_habit(habit_id)
     input("Press any Key to continue...")
 
 
@@ -224,8 +270,8 @@ def print_habits_as_list():
     """
     Prints a list of habits.
 
-    This method retrieves a list of habits using the `list_habits()`
-    method and prints each habit's details.
+    This method streams the ongoing habits page by page and prints each habit's details,
+    asking before each further page.
 
     Example usage:
     ```python
@@ -233,25 +279,46 @@ def print_habits_as_list():
     ```
 
     """
-    habits = list_habits()
-    for habit in habits:
-        click.echo(f'Habit {habit.id}: {habit.name} - {habit.periodicity} - created at: {habit.created_at}')
+    manager = HabitManager(session)
+    print_paged(manager.habit_record_pages(status="ongoing", page_size=DISPLAY_PAGE_SIZE),
+                lambda habit: click.echo(f'Habit {habit.id}: {habit.name} - {habit.periodicity} - '
+                                         f'created at: {habit.created_at}'))
+
+
+def print_paged(pages, render):
+    """
+    Renders pages of habits and asks before showing the next page.
+
+    Args:
+        pages: Iterable of lists of habits, e.g. HabitManager.habit_pages().
+        render: Called with each habit of a shown page.
+
+    Returns:
+        bool: False if the user stopped before the last page.
+    """
+    pages = iter(pages)
+    page = next(pages, None)
+    while page is not None:
+        for habit in page:
+            render(habit)
+        page = next(pages, None)
+        if page is not None and input("-- Enter for more, q to stop --").strip().lower() == 'q':
+            return False
+    return True
 
 
 def list_habits():
     """
-    Retrieves a list of habits from the HabitManager.
+    Retrieves the ongoing habits from the HabitManager as read-only records.
 
-    :return: A list of habits.
+    :return: A list of HabitRecord rows.
     """
     manager = HabitManager(session)
-    habits = manager.list_habits()
+    habits = manager.list_habit_records()
     return habits
 
 
 if __name__ == '__main__':
-    print("Welcome to Habit Tracker!")
-    print("-------------------------\n")
-    initialize_database()
-    HabitManager(session).validate_habits()
-    main_menue()
+    from cli import cli
+
+    cli()
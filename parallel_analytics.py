@@ -0,0 +1,161 @@
+"""
+Runs analyze_habits_in_db on partitions of the habits in worker processes.
+
+The habits of one SQLite file are split into id ranges, or every shard file is its own
+partition. Each worker process opens one read-only connection per file and analyzes
+its partitions; the partial results (longest streaks and the habit lists per
+periodicity) are merged with analytics_module.merge_analyses.
+
+Usage:
+    python parallel_analytics.py habits.db [--workers 8]
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import sqlite3
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, StaticPool
+
+import analytics_module
+from db.database_module import Habit
+from habit import HabitManager
+
+# Partitions per worker, so that a slow partition does not leave the other workers idle.
+PARTITIONS_PER_WORKER = 4
+
+HABIT_LISTS = ('daily_habits', 'weekly_habits')
+
+# Engines of the worker process by database path, one read-only connection each.
+_engines = {}
+
+
+def _read_only_connector(path):
+    uri = 'file:' + os.path.abspath(path) + '?mode=ro'
+    return lambda: sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+
+def _read_only_engine(path):
+    engine = _engines.get(path)
+    if engine is None:
+        engine = _engines[path] = create_engine('sqlite://', poolclass=StaticPool, creator=_read_only_connector(path))
+    return engine
+
+
+def _forget_engines():
+    # Forked workers inherit the engines of the parent; a SQLite connection must not be
+    # used on both sides of fork(), so every worker opens its own.
+    _engines.clear()
+
+
+def _executor(workers):
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_forget_engines)
+
+
+def analyze_partition(path, id_range=None):
+    """
+    Analyzes the habits of a database file, or the habits in an id range of it.
+
+    Runs in the worker processes, but can also be called directly.
+
+    Args:
+        path (str): The SQLite database file.
+        id_range (tuple): Only analyze the habits with first <= id < last. Optional.
+
+    Returns:
+        dict: The result of analytics_module.analyze_habits_in_db for the partition.
+    """
+    session = sessionmaker(bind=_read_only_engine(path))()
+    try:
+        return analytics_module.analyze_habits_in_db(HabitManager(session), id_range=id_range)
+    finally:
+        session.close()
+
+
+def _analyze_partition_tuples(path, id_range=None):
+    # Plain tuples pickle several times faster than HabitStreak rows.
+    result = analyze_partition(path, id_range)
+    for key in HABIT_LISTS:
+        result[key] = [tuple(habit) for habit in result[key]]
+    return result
+
+
+def _as_habit_streaks(result):
+    for key in HABIT_LISTS:
+        result[key] = [analytics_module.HabitStreak._make(habit) for habit in result[key]]
+    return result
+
+
+def id_ranges(path, partitions):
+    """
+    Splits the id range of the habits of a database into partitions of equal width.
+
+    Runs in the parent process on a connection of its own that is closed afterwards.
+
+    Returns:
+        list: (first, last) pairs with first <= id < last, an empty list for an empty table.
+    """
+    engine = create_engine('sqlite://', poolclass=NullPool, creator=_read_only_connector(path))
+    try:
+        with engine.connect() as connection:
+            low, high = connection.execute(select(func.min(Habit.id), func.max(Habit.id))).one()
+    finally:
+        engine.dispose()
+    if low is None:
+        return []
+    width = max(1, -(-(high - low + 1) // partitions))
+    return [(first, min(first + width, high + 1)) for first in range(low, high + 1, width)]
+
+
+def analyze_habits_parallel(path, workers=None, partitions=None):
+    """
+    Analyzes the habits of one database file in worker processes.
+
+    Args:
+        path (str): The SQLite database file.
+        workers (int): Number of processes. Defaults to the number of CPUs.
+        partitions (int): Number of id ranges. Defaults to PARTITIONS_PER_WORKER per worker.
+
+    Returns:
+        dict: The same dictionary as analytics_module.analyze_habits_in_db.
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = id_ranges(path, partitions or workers * PARTITIONS_PER_WORKER)
+    with _executor(workers) as executor:
+        results = executor.map(_analyze_partition_tuples, [path] * len(ranges), ranges)
+        return analytics_module.merge_analyses(_as_habit_streaks(result) for result in results)
+
+
+def analyze_files_parallel(paths, workers=None):
+    """
+    Analyzes several database files, e.g. the tenant shards, one file per task.
+
+    Args:
+        paths (dict): The database files by name, e.g. by tenant.
+        workers (int): Number of processes. Defaults to the number of CPUs.
+
+    Returns:
+        dict: The merged result; the habit lists contain TenantHabitStreak rows tagged with the names.
+    """
+    names = list(paths)
+    with _executor(workers or os.cpu_count() or 1) as executor:
+        results = executor.map(_analyze_partition_tuples, [paths[name] for name in names])
+        return analytics_module.merge_tenant_analyses(dict(zip(names, map(_as_habit_streaks, results))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('path')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    result = analyze_habits_parallel(args.path, args.workers)
+    print(json.dumps({'longest ongoing streak': result['longest ongoing streak'],
+                      'longest total streak': result['longest total streak'],
+                      'daily_habits': len(result['daily_habits']),
+                      'weekly_habits': len(result['weekly_habits'])}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+"""
+Maintains the per day, week and month rollups behind the trend statistics.
+
+period_rollups counts, per periodicity and period, the habits created, the habits
+checked in (active), the check-ins and the completions by status; habit_rollups
+counts the check-ins of every habit per period. HabitManager adds to both in the
+transaction of each write, so the trend screens read a fixed number of rows no
+matter how long the history is.
+
+The check-ins are rebuilt from the applied check-in events, so check-ins pruned with
+"compact --prune-before" are lost by a rebuild.
+"""
+import datetime
+from collections import Counter, defaultdict, namedtuple
+
+import click
+from sqlalchemy import select, insert, delete, func, text, bindparam, Date
+
+import clock
+from analytics_cache import bump_data_version
+from db.database_module import (Habit, Completion, CheckinEvent, PeriodRollup, HabitRollup, from_day_number,
+                                session)
+
+GRAINS = ('day', 'week', 'month')
+COUNT_COLUMNS = ('created', 'active', 'checkins', 'successfully', 'failed', 'aborted')
+# The period_rollups column counting each completion status.
+STATUS_COLUMNS = {'SUCCESSFULLY': 'successfully', 'FAILED': 'failed', 'ABORTED': 'aborted'}
+# Rows read per round trip while rebuilding.
+REBUILD_BATCH_SIZE = 10000
+
+TrendRow = namedtuple('TrendRow', ('period_start',) + COUNT_COLUMNS)
+
+# The SQLite upserts of SQLAlchemy are compiled on every execution, these text statements are cached.
+UPSERT_PERIOD_ROLLUP = text(
+    f"INSERT INTO period_rollups (grain, period_start, periodicity, {', '.join(COUNT_COLUMNS)}) "
+    f"VALUES (:grain, :period_start, :periodicity, {', '.join(':' + column for column in COUNT_COLUMNS)}) "
+    f"ON CONFLICT (grain, period_start, periodicity) DO UPDATE SET "
+    f"{', '.join(f'{column} = {column} + excluded.{column}' for column in COUNT_COLUMNS)}"
+).bindparams(bindparam('period_start', type_=Date))
+# Rows per multi-row upsert of habit rollups, 4 parameters each. SQLite before 3.35 has no
+# RETURNING and, before 3.32, a limit of 999 variables, so it gets smaller batches.
+HABIT_ROLLUP_BATCH_SIZE = 1000
+LEGACY_HABIT_ROLLUP_BATCH_SIZE = 200
+UPSERT_HABIT_ROLLUPS = ("INSERT INTO habit_rollups (habit_id, grain, period_start, checkins) VALUES {} "
+                        "ON CONFLICT (habit_id, grain, period_start) "
+                        "DO UPDATE SET checkins = checkins + excluded.checkins")
+RETURNING_HABIT_ROLLUPS = " RETURNING habit_id, grain, period_start, checkins"
+SELECT_HABIT_ROLLUPS = ("SELECT habit_id, grain, period_start, checkins FROM habit_rollups "
+                        "WHERE habit_id IN ({}) AND period_start IN ({})")
+
+
+def period_start(grain, date):
+    """
+    Returns:
+        datetime.date: The first day of the day, week (starting Monday) or month containing date.
+    """
+    if grain == 'day':
+        return date
+    if grain == 'week':
+        return date - datetime.timedelta(days=date.weekday())
+    if grain == 'month':
+        return date.replace(day=1)
+    raise ValueError(f"Unknown grain {grain!r}, expected one of {GRAINS}")
+
+
+def period_starts(grain, end, count):
+    """
+    Returns:
+        list: The first days of the count periods up to the one containing end, oldest first.
+    """
+    starts = [period_start(grain, end)]
+    while len(starts) < count:
+        starts.append(period_start(grain, starts[-1] - datetime.timedelta(days=1)))
+    return starts[::-1]
+
+
+def _upsert_period_counts(session, counts):
+    """
+    Adds {(grain, period_start, periodicity): Counter of COUNT_COLUMNS} to period_rollups without committing.
+    """
+    if not counts:
+        return
+    session.execute(UPSERT_PERIOD_ROLLUP, [dict({column: values[column] for column in COUNT_COLUMNS},
+                                                grain=grain, period_start=start, periodicity=periodicity)
+                                           for (grain, start, periodicity), values in counts.items()])
+
+
+def record_created(session, habits):
+    """
+    Counts new habits without committing.
+
+    Args:
+        session: The database session whose transaction the writes join.
+        habits (list): (periodicity, created_at) pairs.
+    """
+    counts = defaultdict(Counter)
+    for periodicity, created_at in habits:
+        for grain in GRAINS:
+            counts[grain, period_start(grain, created_at), periodicity]['created'] += 1
+    _upsert_period_counts(session, counts)
+
+
+def record_completions(session, completions):
+    """
+    Counts completions by status without committing.
+
+    Args:
+        session: The database session whose transaction the writes join.
+        completions (list): (periodicity, completion_date, completion_status) triples.
+    """
+    counts = defaultdict(Counter)
+    for periodicity, completion_date, status in completions:
+        if status in STATUS_COLUMNS:
+            for grain in GRAINS:
+                counts[grain, period_start(grain, completion_date), periodicity][STATUS_COLUMNS[status]] += 1
+    _upsert_period_counts(session, counts)
+
+
+def record_checkins(session, checkins):
+    """
+    Counts check-ins per habit and per periodicity without committing.
+
+    A habit counts as active in a period with its first check-in there. The habit
+    rollups are upserted with RETURNING, and a returned count equal to the added count
+    means the row is new.
+
+    Args:
+        session: The database session whose transaction the writes join.
+        checkins (list): (habit_id, periodicity, date) triples.
+    """
+    habit_counts = Counter()
+    periodicities = {}
+    for habit_id, periodicity, checkin_date in checkins:
+        periodicities[habit_id] = periodicity
+        for grain in GRAINS:
+            habit_counts[habit_id, grain, period_start(grain, checkin_date)] += 1
+    counts = defaultdict(Counter)
+    for (habit_id, grain, start), total in _upsert_habit_rollups(session, habit_counts):
+        added = habit_counts[habit_id, grain, start]
+        key = (grain, start, periodicities[habit_id])
+        counts[key]['checkins'] += added
+        if total == added:
+            counts[key]['active'] += 1
+    _upsert_period_counts(session, counts)
+
+
+def _upsert_habit_rollups(session, habit_counts):
+    """
+    Adds {(habit_id, grain, period_start): check-ins} to habit_rollups without committing.
+
+    Runs one multi-row INSERT per batch with exec_driver_sql; building thousands of
+    SQLAlchemy bind parameters per statement would cost more than the upsert itself.
+    Dates are bound as ISO strings like the Date columns store them. The stored counts
+    come from RETURNING, or from a SELECT of the batch on SQLite before 3.35.
+
+    Yields:
+        tuple: ((habit_id, grain, period_start), stored check-ins) of every upserted row.
+    """
+    connection = session.connection()
+    returning = connection.dialect.insert_returning
+    batch_size = HABIT_ROLLUP_BATCH_SIZE if returning else LEGACY_HABIT_ROLLUP_BATCH_SIZE
+    items = [((habit_id, grain, start.isoformat()), count) for (habit_id, grain, start), count in habit_counts.items()]
+    for first in range(0, len(items), batch_size):
+        batch = dict(items[first:first + batch_size])
+        parameters = tuple(value for key, count in batch.items() for value in key + (count,))
+        statement = UPSERT_HABIT_ROLLUPS.format(', '.join(['(?, ?, ?, ?)'] * len(batch)))
+        if returning:
+            rows = connection.exec_driver_sql(statement + RETURNING_HABIT_ROLLUPS, parameters).all()
+        else:
+            connection.exec_driver_sql(statement, parameters)
+            habit_ids = {habit_id for habit_id, _, _ in batch}
+            starts = {start for _, _, start in batch}
+            rows = [row for row in connection.exec_driver_sql(
+                        SELECT_HABIT_ROLLUPS.format(', '.join('?' * len(habit_ids)), ', '.join('?' * len(starts))),
+                        tuple(habit_ids) + tuple(starts))
+                    if tuple(row[:3]) in batch]
+        for habit_id, grain, start, total in rows:
+            yield (habit_id, grain, datetime.date.fromisoformat(start)), total
+
+
+def _derive_rollups(session):
+    """
+    Aggregates the rollups from habits, completions and the applied check-in events.
+
+    Returns:
+        tuple: ({(grain, period_start, periodicity): Counter}, {(habit_id, grain, period_start): check-ins}).
+    """
+    period_counts = defaultdict(Counter)
+    habit_counts = Counter()
+    for periodicity, created_at in session.execute(
+            select(Habit.periodicity, Habit.created_at).where(Habit.created_at.isnot(None))
+            .execution_options(yield_per=REBUILD_BATCH_SIZE)):
+        for grain in GRAINS:
+            period_counts[grain, period_start(grain, created_at), periodicity]['created'] += 1
+    for periodicity, completion_date, status in session.execute(
+            select(Habit.periodicity, Completion.completion_date, Completion.completion_status)
+            .join(Habit, Habit.id == Completion.habit_id)
+            .where(Completion.completion_date.isnot(None))
+            .execution_options(yield_per=REBUILD_BATCH_SIZE)):
+        if status in STATUS_COLUMNS:
+            for grain in GRAINS:
+                period_counts[grain, period_start(grain, completion_date), periodicity][STATUS_COLUMNS[status]] += 1
+    for habit_id, periodicity, day in session.execute(
+            select(CheckinEvent.habit_id, Habit.periodicity, CheckinEvent.day)
+            .join(Habit, Habit.id == CheckinEvent.habit_id)
+            .where(CheckinEvent.applied)
+            .execution_options(yield_per=REBUILD_BATCH_SIZE)):
+        checkin_date = from_day_number(day)
+        for grain in GRAINS:
+            start = period_start(grain, checkin_date)
+            habit_counts[habit_id, grain, start] += 1
+            counts = period_counts[grain, start, periodicity]
+            counts['checkins'] += 1
+            counts['active'] += habit_counts[habit_id, grain, start] == 1
+    return period_counts, habit_counts
+
+
+def rebuild_rollups(session):
+    """
+    Regenerates the period and habit rollups from the raw tables.
+
+    Args:
+        session: The database session to use.
+
+    Returns:
+        int: The number of period rollups written.
+    """
+    period_counts, habit_counts = _derive_rollups(session)
+    try:
+        session.execute(delete(PeriodRollup))
+        session.execute(delete(HabitRollup))
+        _upsert_period_counts(session, period_counts)
+        if habit_counts:
+            session.execute(insert(HabitRollup.__table__), [
+                {'habit_id': habit_id, 'grain': grain, 'period_start': start, 'checkins': count}
+                for (habit_id, grain, start), count in habit_counts.items()])
+        bump_data_version(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return len(period_counts)
+
+
+def verify_rollups(session):
+    """
+    Compares the rollup tables with the rollups derived from the raw tables.
+
+    Args:
+        session: The database session to use.
+
+    Returns:
+        list: The keys of the missing, outdated or left over rollups; period rollups are
+        (grain, period_start, periodicity), habit rollups (habit_id, grain, period_start).
+    """
+    period_counts, habit_counts = _derive_rollups(session)
+    expected = {key: tuple(values[column] for column in COUNT_COLUMNS) for key, values in period_counts.items()}
+    stored = {(rollup.grain, rollup.period_start, rollup.periodicity):
+              tuple(getattr(rollup, column) for column in COUNT_COLUMNS)
+              for rollup in session.execute(select(PeriodRollup)).scalars()}
+    stored_habits = {(rollup.habit_id, rollup.grain, rollup.period_start): rollup.checkins
+                     for rollup in session.execute(select(HabitRollup)).scalars()}
+    mismatches = [key for key in expected.keys() | stored.keys() if expected.get(key) != stored.get(key)]
+    mismatches += [key for key in habit_counts.keys() | stored_habits.keys()
+                   if habit_counts.get(key) != stored_habits.get(key)]
+    return sorted(mismatches, key=str)
+
+
+def rollups_initialized(session):
+    """
+    Checks if the rollups exist for a database with habits.
+
+    Returns:
+        bool: False if there are habits but no rollups, True otherwise.
+    """
+    return (session.query(PeriodRollup.grain).first() is not None
+            or session.query(Habit.id).first() is None)
+
+
+def get_trend(session, grain, periods, end=None, periodicity=None):
+    """
+    Reads the rollups of the last periods.
+
+    Args:
+        session: The database session to use.
+        grain (str): "day", "week" or "month".
+        periods (int): Number of periods, ending with the one containing end.
+        end (datetime.date): Defaults to clock.today().
+        periodicity (str): Only count the habits of this periodicity. Defaults to all.
+
+    Returns:
+        list: One TrendRow per period, oldest first; periods without rollup count zero.
+    """
+    starts = period_starts(grain, end or clock.today(), periods)
+    query = (select(PeriodRollup.period_start, *[func.sum(getattr(PeriodRollup, column)) for column in COUNT_COLUMNS])
+             .where(PeriodRollup.grain == grain, PeriodRollup.period_start.between(starts[0], starts[-1]))
+             .group_by(PeriodRollup.period_start))
+    if periodicity is not None:
+        query = query.where(PeriodRollup.periodicity == periodicity)
+    rows = {row[0]: row for row in session.execute(query)}
+    return [TrendRow(*rows[start]) if start in rows else TrendRow(start, *[0] * len(COUNT_COLUMNS))
+            for start in starts]
+
+
+def get_habit_trend(session, habit_id, grain, periods, end=None):
+    """
+    Reads the check-ins of a habit in the last periods.
+
+    Args:
+        session: The database session to use.
+        habit_id (int): The ID of the habit.
+        grain (str): "day", "week" or "month".
+        periods (int): Number of periods, ending with the one containing end.
+        end (datetime.date): Defaults to clock.today().
+
+    Returns:
+        list: (period_start, check-ins) pairs, oldest first.
+    """
+    starts = period_starts(grain, end or clock.today(), periods)
+    checkins = dict(session.execute(
+        select(HabitRollup.period_start, HabitRollup.checkins)
+        .where(HabitRollup.habit_id == habit_id, HabitRollup.grain == grain,
+               HabitRollup.period_start.between(starts[0], starts[-1]))).all())
+    return [(start, checkins.get(start, 0)) for start in starts]
+
+
+@click.command()
+@click.option('--verify', is_flag=True, help='Only compare the rollups with the raw tables.')
+def main(verify):
+    """Rebuilds or verifies the rollup tables."""
+    if not verify:
+        click.echo(f'Rebuilt {rebuild_rollups(session)} period rollups.')
+    mismatches = verify_rollups(session)
+    if mismatches:
+        raise click.ClickException(f'{len(mismatches)} rollups differ, e.g. {mismatches[:10]}')
+    click.echo('Rollups are consistent.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+"""
+Background validation of the habits at the moment their checkpoints expire.
+
+DueDateScheduler keeps a min-heap of the next checkpoint of every ongoing habit. It
+sleeps until the earliest checkpoint has passed and then validates only the habits
+that are due, in batches, instead of checking all ongoing habits at start-up. A habit
+that was never checked in is due one period after its creation.
+
+Check-ins, new habits and completions of the same process update the heap through
+ORM events. Writes of other processes are picked up by polling for new checkpoints
+and habits, and every due habit is checked against the database before it is completed, so a
+check-in the heap missed only delays its entry.
+
+Usage:
+    python cli.py scheduler
+"""
+import asyncio
+import datetime
+import heapq
+
+from sqlalchemy import event, exists, func, select
+
+import clock
+from db.database_module import Habit, Checkpoint, Completion
+from habit import set_checkpoint
+
+# Habits validated per transaction.
+BATCH_SIZE = 500
+# Longest sleep, so the checkpoints of other processes are found within this many seconds.
+POLL_SECONDS = 60.0
+
+
+def load_deadlines(habit_manager, after_checkpoint_id=0, habit_ids=None):
+    """
+    Reads the next checkpoints of the ongoing habits.
+
+    Args:
+        habit_manager (HabitManager): An instance of HabitManager to interact with the database.
+        after_checkpoint_id (int): Only read the checkpoints with a greater id, i.e. new ones.
+        habit_ids (list): Only read the checkpoints of these habits. Optional.
+
+    Returns:
+        list: (checkpoint id, habit id, next checkpoint) rows ordered by checkpoint id;
+        checkpoints without a next checkpoint are skipped.
+    """
+    query = (select(Checkpoint.id, Checkpoint.habit_id, Checkpoint.next_checkpoint)
+             .where(Checkpoint.id > after_checkpoint_id,
+                    Checkpoint.next_checkpoint.isnot(None),
+                    Checkpoint.habit_id.notin_(select(Completion.habit_id).where(Completion.habit_id.isnot(None)))))
+    if habit_ids is not None:
+        query = query.where(Checkpoint.habit_id.in_(habit_ids))
+    return habit_manager.session.execute(query.order_by(Checkpoint.id)).all()
+
+
+def load_unchecked_deadlines(habit_manager, after_habit_id=0, habit_ids=None):
+    """
+    Reads the first deadlines of the ongoing habits that were never checked in.
+
+    Such a habit breaks one period after its creation, as its first checkpoint would,
+    see habit.never_checked_in.
+
+    Args:
+        habit_manager (HabitManager): An instance of HabitManager to interact with the database.
+        after_habit_id (int): Only read the habits with a greater id, i.e. new ones.
+        habit_ids (list): Only read these habits. Optional.
+
+    Returns:
+        tuple: The (habit id, deadline) rows ordered by habit id, and the greatest habit id
+        at the time of the query, or after_habit_id if there is none.
+    """
+    query = (select(Habit.id, Habit.periodicity, Habit.created_at)
+             .where(Habit.id > after_habit_id,
+                    Habit.created_at.isnot(None),
+                    ~exists().where(Checkpoint.habit_id == Habit.id),
+                    Habit.id.notin_(select(Completion.habit_id).where(Completion.habit_id.isnot(None)))))
+    if habit_ids is not None:
+        query = query.where(Habit.id.in_(habit_ids))
+    rows = [(habit_id, set_checkpoint(created_at, periodicity))
+            for habit_id, periodicity, created_at in habit_manager.session.execute(query.order_by(Habit.id))]
+    # Read in the same transaction, so a habit added after the rows were read gets a greater id.
+    last_habit_id = habit_manager.session.execute(select(func.max(Habit.id))).scalar()
+    return rows, max(last_habit_id or 0, after_habit_id)
+
+
+def seconds_until_due(next_checkpoint, now=None):
+    """
+    Returns:
+        float: Seconds until the start of the day after next_checkpoint, when the habit breaks.
+    """
+    now = now or datetime.datetime.now()
+    due = datetime.datetime.combine(next_checkpoint + datetime.timedelta(days=1), datetime.time.min)
+    return max((due - now).total_seconds(), 0.0)
+
+
+class DueDateScheduler:
+    """
+    Completes the habits with a broken streak as soon as their checkpoint expires.
+
+    The heap holds (next checkpoint, habit id) entries. Rescheduling a habit pushes a new
+    entry and leaves the old one in the heap; entries that do not match the current
+    deadline of their habit are skipped when they reach the top.
+
+    Args:
+        manager (AsyncHabitManager): The manager used for all database access.
+        batch_size (int): Habits validated per transaction.
+        poll_seconds (float): Longest sleep between two polls for new checkpoints.
+        on_broken: Callable receiving the list of BrokenHabit records of every batch. Optional.
+    """
+
+    def __init__(self, manager, batch_size=BATCH_SIZE, poll_seconds=POLL_SECONDS, on_broken=None):
+        """
+        Initializes DueDateScheduler with an empty heap.
+
+        Args:
+            manager (AsyncHabitManager): The manager used for all database access.
+            batch_size (int): Habits validated per transaction.
+            poll_seconds (float): Longest sleep between two polls for new checkpoints.
+            on_broken: Callable receiving the list of BrokenHabit records of every batch. Optional.
+        """
+        self.manager = manager
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.on_broken = on_broken
+        self._heap = []
+        self._deadlines = {}
+        self._last_checkpoint_id = 0
+        self._last_habit_id = 0
+        self._loop = None
+        self._changed = None
+        self._stopping = False
+
+    def __len__(self):
+        """Returns the number of scheduled habits."""
+        return len(self._deadlines)
+
+    def schedule(self, habit_id, next_checkpoint):
+        """
+        Sets the deadline of a habit, or removes it if next_checkpoint is None.
+        """
+        if next_checkpoint is None:
+            self.unschedule(habit_id)
+            return
+        if self._deadlines.get(habit_id) == next_checkpoint:
+            return
+        self._deadlines[habit_id] = next_checkpoint
+        heapq.heappush(self._heap, (next_checkpoint, habit_id))
+        if len(self._heap) > 2 * len(self._deadlines) + self.batch_size:
+            self._heap = [(deadline, scheduled_id) for scheduled_id, deadline in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        if self._heap[0] == (next_checkpoint, habit_id):
+            self._wake()
+
+    def unschedule(self, habit_id):
+        """
+        Removes the deadline of a habit, e.g. when it is completed.
+        """
+        self._deadlines.pop(habit_id, None)
+
+    def next_deadline(self):
+        """
+        Returns:
+            datetime.date: The earliest next checkpoint, or None if no habit is scheduled.
+        """
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, today=None):
+        """
+        Removes and returns the habits whose next checkpoint is before today.
+
+        Returns:
+            list: The ids of the due habits, earliest deadline first.
+        """
+        today = today or clock.today()
+        due = []
+        while (deadline := self.next_deadline()) is not None and deadline < today:
+            habit_id = heapq.heappop(self._heap)[1]
+            del self._deadlines[habit_id]
+            due.append(habit_id)
+        return due
+
+    async def refresh(self):
+        """
+        Schedules the checkpoints and habits written since the last refresh, e.g. by other processes.
+
+        The first refresh loads the deadlines of all ongoing habits.
+        """
+        rows, self._last_habit_id = await self.manager.run(
+            lambda manager: load_unchecked_deadlines(manager, self._last_habit_id))
+        for habit_id, deadline in rows:
+            self.schedule(habit_id, deadline)
+        rows = await self.manager.run(lambda manager: load_deadlines(manager, self._last_checkpoint_id))
+        for checkpoint_id, habit_id, next_checkpoint in rows:
+            self.schedule(habit_id, next_checkpoint)
+            self._last_checkpoint_id = checkpoint_id
+
+    async def run_due(self):
+        """
+        Validates the habits due by clock.today() in batches and reschedules the ones
+        checked in meanwhile.
+
+        Returns:
+            list: The BrokenHabit records of the habits that were completed.
+        """
+        due = self.pop_due()
+        broken_habits = []
+        for start in range(0, len(due), self.batch_size):
+            batch = due[start:start + self.batch_size]
+            broken_batch = await self.manager.validate_habits(habit_ids=batch)
+            for broken_habit in broken_batch:
+                self.unschedule(broken_habit.id)
+            broken_ids = {broken_habit.id for broken_habit in broken_batch}
+            remaining = [habit_id for habit_id in batch if habit_id not in broken_ids]
+            if remaining:
+                rows = await self.manager.run(lambda manager: load_deadlines(manager, habit_ids=remaining))
+                for _, habit_id, next_checkpoint in rows:
+                    self.schedule(habit_id, next_checkpoint)
+                rows, _ = await self.manager.run(
+                    lambda manager: load_unchecked_deadlines(manager, habit_ids=remaining))
+                for habit_id, deadline in rows:
+                    self.schedule(habit_id, deadline)
+            if broken_batch and self.on_broken is not None:
+                self.on_broken(broken_batch)
+            broken_habits.extend(broken_batch)
+        return broken_habits
+
+    async def run(self):
+        """
+        Loads the deadlines and validates the due habits until stop() is called.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self._stopping = False
+        self.listen()
+        try:
+            while not self._stopping:
+                await self.refresh()
+                await self.run_due()
+                deadline = self.next_deadline()
+                timeout = self.poll_seconds if deadline is None else min(seconds_until_due(deadline),
+                                                                         self.poll_seconds)
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._changed.clear()
+        finally:
+            self.ignore()
+            self._loop = None
+
+    def stop(self):
+        """
+        Makes run() return after the current batch. Can be called from other threads.
+        """
+        self._stopping = True
+        self._wake()
+
+    def listen(self):
+        """
+        Updates the heap on every habit, checkpoint and completion written through the ORM in this process.
+        """
+        event.listen(Habit, 'after_insert', self._habit_written)
+        event.listen(Checkpoint, 'after_insert', self._checkpoint_written)
+        event.listen(Checkpoint, 'after_update', self._checkpoint_written)
+        event.listen(Completion, 'after_insert', self._completion_written)
+
+    def ignore(self):
+        """
+        Stops the updates started by listen().
+        """
+        event.remove(Habit, 'after_insert', self._habit_written)
+        event.remove(Checkpoint, 'after_insert', self._checkpoint_written)
+        event.remove(Checkpoint, 'after_update', self._checkpoint_written)
+        event.remove(Completion, 'after_insert', self._completion_written)
+
+    def _habit_written(self, mapper, connection, habit):
+        if habit.created_at is not None:
+            self._call(self.schedule, habit.id, set_checkpoint(habit.created_at, habit.periodicity))
+
+    def _checkpoint_written(self, mapper, connection, checkpoint):
+        self._call(self.schedule, checkpoint.habit_id, checkpoint.next_checkpoint)
+
+    def _completion_written(self, mapper, connection, completion):
+        self._call(self.unschedule, completion.habit_id)
+
+    def _call(self, callback, *args):
+        """Runs callback on the event loop of run(), or right away if the scheduler is not running."""
+        if self._loop is None:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def _wake(self):
+        if self._changed is None:
+            return
+        if self._loop is None:
+            self._changed.set()
+        else:
+            self._loop.call_soon_threadsafe(self._changed.set)
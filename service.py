@@ -0,0 +1,524 @@
+"""
+Local HTTP/JSON service exposing HabitManager and the analytics.
+
+Every request is handled in its own thread with its own session. The sessions share
+one engine whose pool holds at most pool_size connections; a request that cannot get
+a connection within pool_timeout seconds is answered with 503.
+
+SQLite reports a conflicting writer as "database is locked" once busy_timeout has
+passed, and right away when a transaction that has read an older snapshot tries to
+write. Such requests are rolled back and retried with backoff, and answered with 503
+and a Retry-After header if they still fail. Requests that commit more than once
+(adding a habit, completing a habit, bulk check-ins) are not retried, as their first
+commits would repeat.
+
+Endpoints:
+    GET  /health                  also reports the hits and misses of the analytics cache
+    GET  /habits?status=ongoing&periodicity=daily&name_prefix=go&order_by=name&limit=100
+    POST /habits                  {"name": "reading", "periodicity": "daily", "days": 30}
+    GET  /habits/<id>
+    POST /habits/<id>/checkin     {"date": "2024-07-01"}, the body is optional
+    POST /habits/<id>/complete
+    GET  /habits/<id>/trend?grain=week&periods=12
+    POST /checkins                {"events": [[1, "2024-07-01"], {"habit_id": 2, "date": "2024-07-01"}]}
+    POST /validate
+    GET  /stats
+    GET  /trend?grain=week&periods=12&periodicity=daily
+
+Usage:
+    python cli.py serve --port 8080
+    python benchmarks/bench_http.py
+"""
+import datetime
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import traceback
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker
+
+import analytics_module
+import clock
+import rollup_module
+from analytics_cache import cache
+from db.database_module import build_engine
+from habit import HABIT_ORDERS, HabitManager
+
+# Connections of the pool; requests beyond it wait for a free connection.
+POOL_SIZE = 8
+# Seconds a request waits for a connection before it is answered with 503.
+POOL_TIMEOUT = 5
+# Retries of a request failing with a busy or locked database.
+BUSY_RETRIES = 3
+# Seconds before the first retry; every further retry waits twice as long.
+RETRY_DELAY = 0.05
+# Seconds clients are asked to wait after a 503.
+RETRY_AFTER = 1
+# Largest accepted request body.
+MAX_BODY_SIZE = 16 * 1024 * 1024
+HABIT_COLUMNS = ('id', 'name', 'periodicity', 'created_at', 'target_date')
+PERIODICITIES = ('daily', 'weekly')
+STATUSES = {'ongoing': 'ongoing', 'completed': 'completed', 'all': None}
+
+Route = namedtuple('Route', ['method', 'pattern', 'function', 'retry'])
+Request = namedtuple('Request', ['match', 'query', 'body'])
+
+ROUTES = []
+
+
+class HTTPError(Exception):
+    """
+    An error answered with its status and a JSON {"error": message} body.
+
+    Args:
+        status (int): The HTTP status code.
+        message (str): The error message.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def route(method, path, retry=True):
+    """
+    Registers a handler function(manager, request) returning (status, payload).
+
+    A payload that is an iterator is streamed as a JSON array.
+
+    Args:
+        method (str): "GET" or "POST".
+        path (str): Regular expression matching the whole path.
+        retry (bool): Repeat the request if the database is busy. Only for requests that commit at most once.
+    """
+    def register(function):
+        ROUTES.append(Route(method, re.compile(path + '$'), function, retry))
+        return function
+    return register
+
+
+def is_busy_error(error):
+    """
+    Returns:
+        bool: True if error is SQLite reporting a busy or locked database.
+    """
+    if not isinstance(error, OperationalError):
+        return False
+    name = getattr(error.orig, 'sqlite_errorname', '')
+    return name.startswith(('SQLITE_BUSY', 'SQLITE_LOCKED')) or 'database is locked' in str(error.orig)
+
+
+def _parameter(request, name, default=None, convert=str, choices=None):
+    """
+    Reads a query parameter.
+
+    Raises:
+        HTTPError: 400 if the value cannot be converted or is not one of choices.
+    """
+    values = request.query.get(name)
+    if not values:
+        return default
+    try:
+        value = convert(values[-1])
+    except ValueError:
+        raise HTTPError(400, f"invalid {name}: {values[-1]!r}") from None
+    if choices is not None and value not in choices:
+        raise HTTPError(400, f"invalid {name}: {value!r}, expected one of {sorted(choices)}")
+    return value
+
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise ValueError(value)
+    return number
+
+
+def _date(value):
+    if not isinstance(value, str):
+        raise ValueError(value)
+    return datetime.date.fromisoformat(value)
+
+
+def _body_field(request, name, default=None, convert=None):
+    """
+    Reads a field of the JSON object body.
+
+    Raises:
+        HTTPError: 400 if the body is not an object or the value cannot be converted.
+    """
+    body = request.body if request.body is not None else {}
+    if not isinstance(body, dict):
+        raise HTTPError(400, "the body must be a JSON object")
+    value = body.get(name)
+    if value is None:
+        return default
+    try:
+        return convert(value) if convert is not None else value
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"invalid {name}: {value!r}") from None
+
+
+def _habit_id(request):
+    return int(request.match.group('habit_id'))
+
+
+def _habit_json(habit):
+    return {column: getattr(habit, column) for column in HABIT_COLUMNS}
+
+
+def _trend_options(request):
+    grain = _parameter(request, 'grain', 'week', choices=rollup_module.GRAINS)
+    periods = _parameter(request, 'periods', 12, _positive_int)
+    return grain, periods
+
+
+@route('GET', '/health')
+def health(manager, request):
+    return 200, {'status': 'ok', 'analytics_cache': cache.stats()._asdict()}
+
+
+@route('GET', '/habits')
+def list_habits(manager, request):
+    filters = {'status': STATUSES[_parameter(request, 'status', 'ongoing', choices=STATUSES)],
+               'periodicity': _parameter(request, 'periodicity', choices=PERIODICITIES),
+               'name_prefix': _parameter(request, 'name_prefix'),
+               'created_from': _parameter(request, 'created_from', convert=_date),
+               'created_to': _parameter(request, 'created_to', convert=_date),
+               'order_by': _parameter(request, 'order_by', 'id', choices=HABIT_ORDERS)}
+    limit = _parameter(request, 'limit', None, _positive_int)
+    return 200, (record._asdict() for record in itertools.islice(manager.iter_habit_records(**filters), limit))
+
+
+@route('POST', '/habits', retry=False)
+def add_habit(manager, request):
+    name = _body_field(request, 'name')
+    if not isinstance(name, str) or not name.strip():
+        raise HTTPError(400, "name is required")
+    periodicity = _body_field(request, 'periodicity', 'daily')
+    if periodicity not in PERIODICITIES:
+        raise HTTPError(400, f"invalid periodicity: {periodicity!r}")
+    days = _body_field(request, 'days', convert=_positive_int)
+    target_date = datetime.date.max if days is None else clock.today() + datetime.timedelta(days)
+    return 201, _habit_json(manager.add_habit(name, periodicity, target_date))
+
+
+@route('GET', r'/habits/(?P<habit_id>\d+)')
+def get_habit(manager, request):
+    habit, checkpoint, completion = manager.load_habit_state(_habit_id(request))
+    if habit is None:
+        raise HTTPError(404, f"no habit {_habit_id(request)}")
+    result = _habit_json(habit)
+    result['checkpoint'] = checkpoint and {'current_checkpoint': checkpoint.current_checkpoint,
+                                           'next_checkpoint': checkpoint.next_checkpoint,
+                                           'is_valid_streak': checkpoint.is_valid_streak}
+    result['completion'] = completion and {'completion_status': completion.completion_status,
+                                           'completion_date': completion.completion_date}
+    return 200, result
+
+
+@route('POST', r'/habits/(?P<habit_id>\d+)/checkin')
+def checkin(manager, request):
+    habit_id = _habit_id(request)
+    checkin_date = _body_field(request, 'date', convert=_date)
+    with manager.unit_of_work():
+        if manager.get_habit(habit_id) is None:
+            raise HTTPError(404, f"no habit {habit_id}")
+        manager.checkin_habit(habit_id, checkin_date)
+    return 200, {'habit_id': habit_id, 'checked_in': True}
+
+
+@route('POST', r'/habits/(?P<habit_id>\d+)/complete', retry=False)
+def complete(manager, request):
+    habit_id = _habit_id(request)
+    with manager.unit_of_work():
+        if manager.get_habit(habit_id) is None:
+            raise HTTPError(404, f"no habit {habit_id}")
+        if manager.get_completion_by_habit_id(habit_id) is not None:
+            raise HTTPError(409, f"habit {habit_id} is already completed")
+        manager.complete_habit(habit_id)
+        manager.delete_checkpoints_for_completed_habit(habit_id)
+    return 200, {'habit_id': habit_id, 'completed': True}
+
+
+@route('GET', r'/habits/(?P<habit_id>\d+)/trend')
+def habit_trend(manager, request):
+    grain, periods = _trend_options(request)
+    if manager.get_habit(_habit_id(request)) is None:
+        raise HTTPError(404, f"no habit {_habit_id(request)}")
+    habit_id, end = _habit_id(request), clock.today()
+    rows = cache.get(manager.session, ('habit trend', habit_id, grain, periods, end),
+                     lambda: rollup_module.get_habit_trend(manager.session, habit_id, grain, periods, end=end))
+    return 200, [{'period_start': start, 'checkins': checkins} for start, checkins in rows]
+
+
+@route('POST', '/checkins', retry=False)
+def checkin_bulk(manager, request):
+    events = _body_field(request, 'events', [])
+    if not isinstance(events, list):
+        raise HTTPError(400, "events must be a list")
+    report = manager.checkin_habits((event.get('habit_id'), event.get('date')) if isinstance(event, dict) else event
+                                    for event in events)
+    return 200, {'accepted': report.accepted,
+                 'rejected': [{'event': index + 1, 'value': event, 'reason': reason}
+                              for index, event, reason in report.rejected]}
+
+
+@route('POST', '/validate')
+def validate(manager, request):
+    return 200, [broken_habit._asdict() for broken_habit in manager.validate_habits(interactive=False)]
+
+
+@route('GET', '/stats')
+def stats(manager, request):
+    result = cache.get(manager.session, ('analyze_habits_from_summary',),
+                       lambda: analytics_module.analyze_habits_from_summary(manager))
+    for key in ('daily_habits', 'weekly_habits'):
+        result[key] = [habit._asdict() for habit in result[key]]
+    return 200, result
+
+
+@route('GET', '/trend')
+def trend(manager, request):
+    grain, periods = _trend_options(request)
+    periodicity = _parameter(request, 'periodicity', choices=PERIODICITIES)
+    end = clock.today()
+    rows = cache.get(manager.session, ('trend', grain, periods, end, periodicity),
+                     lambda: rollup_module.get_trend(manager.session, grain, periods, end=end, periodicity=periodicity))
+    return 200, [row._asdict() for row in rows]
+
+
+def find_route(method, path):
+    """
+    Returns:
+        tuple: The Route and the match of path.
+
+    Raises:
+        HTTPError: 404 if no route matches the path, 405 if none matches the method.
+    """
+    allowed = False
+    for candidate in ROUTES:
+        match = candidate.pattern.match(path)
+        if match is not None:
+            if candidate.method == method:
+                return candidate, match
+            allowed = True
+    if allowed:
+        raise HTTPError(405, f"{method} is not allowed for {path}")
+    raise HTTPError(404, f"no endpoint {path}")
+
+
+class HabitService:
+    """
+    Runs the routes with a session per request on a bounded pool.
+
+    Args:
+        settings (DatabaseSettings): The settings of the database; pool_size, max_overflow and
+            pool_timeout default to POOL_SIZE, no overflow and POOL_TIMEOUT.
+        busy_retries (int): Retries of a request failing with a busy or locked database.
+        retry_delay (float): Seconds before the first retry.
+    """
+
+    def __init__(self, settings, busy_retries=BUSY_RETRIES, retry_delay=RETRY_DELAY):
+        """
+        Initializes HabitService and creates missing tables.
+
+        Args:
+            settings (DatabaseSettings): The settings of the database.
+            busy_retries (int): Retries of a request failing with a busy or locked database.
+            retry_delay (float): Seconds before the first retry.
+        """
+        settings = settings._replace(pool_size=settings.pool_size or POOL_SIZE,
+                                     max_overflow=settings.max_overflow or 0,
+                                     pool_timeout=settings.pool_timeout or POOL_TIMEOUT)
+        self.engine = build_engine(settings)
+        self.sessions = sessionmaker(bind=self.engine)
+        self.busy_retries = busy_retries
+        self.retry_delay = retry_delay
+
+    def call(self, selected, request, respond):
+        """
+        Runs a route in a new session and passes its result to respond while the session is open.
+
+        The session is committed after respond, so a streamed payload is read in the same
+        transaction. Busy or locked errors raised before respond are retried if the route allows it.
+
+        Args:
+            selected (Route): The route to run.
+            request (Request): The request.
+            respond: Callable receiving the status and the payload.
+        """
+        for attempt in itertools.count():
+            session = self.sessions()
+            responded = False
+            try:
+                status, payload = selected.function(HabitManager(session), request)
+                responded = True
+                respond(status, payload)
+                session.commit()
+                return
+            except OperationalError as error:
+                session.rollback()
+                if responded or not (selected.retry and is_busy_error(error) and attempt < self.busy_retries):
+                    raise
+            except BaseException:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+            time.sleep(self.retry_delay * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def dispose(self):
+        """Closes the connections of the pool."""
+        self.engine.dispose()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    Parses a request, runs its route on the HabitService of the server and writes the JSON response.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        self._responded = False
+        url = urlsplit(self.path)
+        try:
+            selected, match = find_route(method, url.path)
+            request = Request(match, parse_qs(url.query), self._read_body())
+            self.server.service.call(selected, request, self._respond)
+        except HTTPError as error:
+            self._error(error.status, error.message)
+        except PoolTimeoutError:
+            self._error(503, "all database connections are in use", {'Retry-After': str(RETRY_AFTER)})
+        except OperationalError as error:
+            if is_busy_error(error):
+                self._error(503, "the database is busy", {'Retry-After': str(RETRY_AFTER)})
+            else:
+                self._internal_error()
+        except Exception:
+            self._internal_error()
+
+    def _internal_error(self):
+        self.log_error("%s", traceback.format_exc())
+        self._error(500, "internal error")
+
+    def _read_body(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Without a valid length the rest of the request cannot be skipped.
+            self.close_connection = True
+            raise HTTPError(400, "the Content-Length header is not a non-negative integer")
+        if length > MAX_BODY_SIZE:
+            self.close_connection = True
+            raise HTTPError(413, "the body is too large")
+        if not length:
+            return None
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            raise HTTPError(400, "the body is not valid JSON") from None
+
+    def _respond(self, status, payload, headers=None):
+        self._responded = True
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if isinstance(payload, (dict, list)):
+            body = json.dumps(payload, default=str).encode()
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        # Iterators are streamed with chunked encoding, one chunk per element.
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        separator = '['
+        for item in payload:
+            self._write_chunk(separator + json.dumps(item, default=str))
+            separator = ','
+        self._write_chunk('[]' if separator == '[' else ']')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def _error(self, status, message, headers=None):
+        if self._responded:
+            # The status line is sent already; only closing the connection tells the client.
+            self.close_connection = True
+            return
+        self._respond(status, {'error': message}, headers)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ServiceServer(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer holding the HabitService of its request handlers.
+
+    Args:
+        address (tuple): (host, port); port 0 picks a free port.
+        service (HabitService): The service running the requests.
+        verbose (bool): Log every request to stderr.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, service, verbose=False):
+        """
+        Initializes ServiceServer and binds the address.
+
+        Args:
+            address (tuple): (host, port); port 0 picks a free port.
+            service (HabitService): The service running the requests.
+            verbose (bool): Log every request to stderr.
+        """
+        super().__init__(address, RequestHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+def start_server(settings, host='127.0.0.1', port=0, verbose=False):
+    """
+    Starts a server in a background thread, e.g. for tests and benchmarks.
+
+    Args:
+        settings (DatabaseSettings): The settings of the database.
+        host (str): The address to listen on.
+        port (int): The port; 0 picks a free port, see server.server_address.
+        verbose (bool): Log every request to stderr.
+
+    Returns:
+        ServiceServer: The running server; call stop_server to shut it down.
+    """
+    server = ServiceServer((host, port), HabitService(settings), verbose)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stop_server(server):
+    """Stops a server of start_server and closes its connections."""
+    server.shutdown()
+    server.server_close()
+    server.service.dispose()
@@ -0,0 +1,262 @@
+"""
+Binary columnar snapshots of the habits, completions and checkpoints.
+
+A snapshot is written once from the database and read with mmap, so analytics jobs run
+on a consistent copy of the data without holding a SQLite read lock. The file holds one
+array per column: dates as int32 day numbers (see db.database_module.to_day_number),
+ids as int64, strings with few distinct values (periodicity, completion status) as int8
+codes into a table in the header, and the habit names as UTF-8 in one blob indexed by
+int64 offsets.
+
+Layout:
+    MAGIC, the header length (uint32, little endian), a JSON header with the enum tables
+    and the (offset, length) of every column, then the columns, each aligned to 8 bytes
+    and stored in native byte order.
+
+Example:
+    >>> export_snapshot(session, 'habits.snapshot')
+    >>> with Snapshot('habits.snapshot') as snapshot:
+    ...     analytics_module.analyze_snapshot(snapshot)
+"""
+import array
+import contextlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+from sqlalchemy import select
+
+from db.database_module import Habit, Completion, Checkpoint, to_day_number
+
+MAGIC = b'HABITSNP'
+VERSION = 1
+ALIGNMENT = 8
+# Day number of NULL dates.
+NULL_DAY = -2 ** 31
+
+# Type codes of the array module: int64, int32 and int8.
+ID, DAY, CODE = 'q', 'i', 'b'
+# (table, column name, type code, ORM column); CODE columns are encoded with an enum table.
+COLUMNS = (
+    ('habits', 'id', ID, Habit.id),
+    ('habits', 'periodicity', CODE, Habit.periodicity),
+    ('habits', 'created_at', DAY, Habit.created_at),
+    ('habits', 'target_date', DAY, Habit.target_date),
+    ('completions', 'habit_id', ID, Completion.habit_id),
+    ('completions', 'completion_status', CODE, Completion.completion_status),
+    ('completions', 'completion_date', DAY, Completion.completion_date),
+    ('checkpoints', 'habit_id', ID, Checkpoint.habit_id),
+    ('checkpoints', 'last_checkpoint', DAY, Checkpoint.last_checkpoint),
+    ('checkpoints', 'current_checkpoint', DAY, Checkpoint.current_checkpoint),
+    ('checkpoints', 'next_checkpoint', DAY, Checkpoint.next_checkpoint),
+    ('checkpoints', 'is_valid_streak', CODE, Checkpoint.is_valid_streak),
+)
+TABLE_ORDER = {'habits': Habit.id, 'completions': Completion.id, 'checkpoints': Checkpoint.id}
+# Rows fetched per round trip while exporting.
+EXPORT_BATCH_SIZE = 10000
+
+
+def _encode(type_code, value, codes):
+    if type_code == DAY:
+        return NULL_DAY if value is None else to_day_number(value)
+    if type_code == CODE:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+        return code
+    return -1 if value is None else value
+
+
+def _read_table(session, table, columns, names):
+    """
+    Returns the columns of a table as arrays and the enum tables of its CODE columns.
+
+    The rows are ordered by primary key, so the first row of a habit is its first record.
+    """
+    arrays = [array.array(type_code) for _, _, type_code, _ in columns]
+    codes = [{} for _ in columns]
+    statement = (select(*[column for _, _, _, column in columns],
+                        *([Habit.name] if names is not None else []))
+                 .order_by(TABLE_ORDER[table])
+                 .execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for row in session.execute(statement):
+        for index, (_, _, type_code, _) in enumerate(columns):
+            arrays[index].append(_encode(type_code, row[index], codes[index]))
+        if names is not None:
+            names.append(row[-1])
+    return arrays, codes
+
+
+@contextlib.contextmanager
+def _read_transaction(session):
+    """
+    Runs the block in one read transaction of the session.
+
+    The sqlite3 module only opens transactions for writes, so consecutive SELECTs could
+    see different commits; an explicit BEGIN pins them to one state of the database.
+    """
+    connection = session.connection()
+    dbapi_connection = connection.connection.dbapi_connection
+    if connection.dialect.name != 'sqlite' or dbapi_connection.in_transaction:
+        yield
+        return
+    connection.exec_driver_sql('BEGIN')
+    try:
+        yield
+    finally:
+        if dbapi_connection.in_transaction:
+            connection.exec_driver_sql('ROLLBACK')
+
+
+def export_snapshot(session, path):
+    """
+    Writes the habits, completions and checkpoints of the database to a snapshot file.
+
+    The tables are read in one transaction, and the file is written next to path and
+    renamed, so readers of an older snapshot at path are never disturbed.
+
+    Args:
+        session: The database session to read from.
+        path (str): The snapshot file.
+
+    Returns:
+        dict: The number of rows written per table.
+    """
+    columns = {}
+    enums = {}
+    names = []
+    with _read_transaction(session):
+        for table in TABLE_ORDER:
+            table_columns = [column for column in COLUMNS if column[0] == table]
+            arrays, codes = _read_table(session, table, table_columns, names if table == 'habits' else None)
+            for (_, name, type_code, _), values, value_codes in zip(table_columns, arrays, codes):
+                columns[table + '.' + name] = values
+                if type_code == CODE:
+                    enums[table + '.' + name] = sorted(value_codes, key=value_codes.get)
+
+    encoded_names = [name.encode('utf-8') for name in names]
+    name_offsets = array.array(ID, [0])
+    for encoded_name in encoded_names:
+        name_offsets.append(name_offsets[-1] + len(encoded_name))
+    columns['habits.name_offsets'] = name_offsets
+    columns['habits.names'] = b''.join(encoded_names)
+
+    layout = {}
+    offset = 0
+    for key, values in columns.items():
+        offset += -offset % ALIGNMENT
+        size = len(values) * (values.itemsize if isinstance(values, array.array) else 1)
+        layout[key] = [values.typecode if isinstance(values, array.array) else 'B', offset, size]
+        offset += size
+    header = json.dumps({'version': VERSION, 'byteorder': sys.byteorder, 'enums': enums,
+                         'columns': layout}).encode('utf-8')
+    data_start = len(MAGIC) + 4 + len(header)
+    data_start += -data_start % ALIGNMENT
+
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        for key, values in columns.items():
+            file.seek(data_start + layout[key][1])
+            file.write(values)
+        file.truncate(data_start + offset)
+    os.replace(temporary_path, path)
+    return {table: len(columns[table + '.id' if table == 'habits' else table + '.habit_id'])
+            for table in TABLE_ORDER}
+
+
+class Snapshot:
+    """
+    A snapshot file mapped into memory.
+
+    The columns are memoryviews on the mapping; nothing is copied until values are read.
+
+    Args:
+        path (str): The snapshot file written by export_snapshot.
+
+    Raises:
+        ValueError: If the file is not a snapshot of this version and byte order.
+    """
+
+    def __init__(self, path):
+        """
+        Maps a snapshot file and reads its header.
+
+        Args:
+            path (str): The snapshot file written by export_snapshot.
+
+        Raises:
+            ValueError: If the file is not a snapshot of this version and byte order.
+        """
+        with open(path, 'rb') as file:
+            self._mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+        except Exception:
+            self._mapping.close()
+            raise
+        self._views = {}
+
+    def _read_header(self):
+        if self._mapping[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a habit snapshot")
+        header_length, = struct.unpack_from('<I', self._mapping, len(MAGIC))
+        header_start = len(MAGIC) + 4
+        header = json.loads(self._mapping[header_start:header_start + header_length])
+        if header['version'] != VERSION or header['byteorder'] != sys.byteorder:
+            raise ValueError(f"Unsupported snapshot version {header['version']} ({header['byteorder']} endian)")
+        self._data_start = header_start + header_length + (-(header_start + header_length) % ALIGNMENT)
+        self._layout = header['columns']
+        self.enums = header['enums']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        """Returns the number of habits."""
+        return len(self.column('habits', 'id'))
+
+    def column(self, table, name):
+        """
+        Returns a column as a memoryview of its type, e.g. int32 for dates.
+
+        Args:
+            table (str): "habits", "completions" or "checkpoints".
+            name (str): The column name, or "name_offsets" and "names" for the habit names.
+        """
+        key = table + '.' + name
+        view = self._views.get(key)
+        if view is None:
+            type_code, offset, size = self._layout[key]
+            start = self._data_start + offset
+            view = self._views[key] = memoryview(self._mapping)[start:start + size].cast(type_code)
+        return view
+
+    def values(self, table, name):
+        """
+        Returns:
+            list: The decoded values of a CODE column, indexed by code.
+        """
+        return self.enums[table + '.' + name]
+
+    def name(self, index):
+        """
+        Returns:
+            str: The name of the habit at row index.
+        """
+        offsets = self.column('habits', 'name_offsets')
+        return str(self.column('habits', 'names')[offsets[index]:offsets[index + 1]], 'utf-8')
+
+    def close(self):
+        """
+        Releases the columns and unmaps the file. Columns returned before become invalid.
+        """
+        for view in self._views.values():
+            view.release()
+        self._views = {}
+        self._mapping.close()
@@ -0,0 +1,145 @@
+import click
+from sqlalchemy import select, delete, case, func, literal
+from sqlalchemy.dialects.sqlite import insert
+
+from analytics_cache import bump_data_version
+from analytics_module import ONGOING, calculate_days, days_between, first_checkpoint_id, first_completion_id
+from db.database_module import Habit, Completion, Checkpoint, HabitSummary, session
+
+
+def summary_row(habit_id, created_at, end_date, status=ONGOING, last_checkin=None):
+    """
+    Builds the values of a habit summary.
+
+    Args:
+        habit_id (int): The ID of the habit.
+        created_at (datetime.date): The creation date of the habit.
+        end_date (datetime.date): The current checkpoint or the completion date.
+        status (str): ONGOING or the completion status.
+        last_checkin (datetime.date): The date of the check-in, None keeps the stored date.
+
+    Returns:
+        dict: The values for upsert_summaries.
+    """
+    return {'habit_id': habit_id,
+            'current_streak': calculate_days(created_at, end_date),
+            'last_checkin': last_checkin,
+            'status': status}
+
+
+def upsert_summaries(session, rows):
+    """
+    Inserts or updates habit summaries without committing.
+
+    The best streak is raised to the new current streak if that is longer, and a
+    missing last_checkin keeps the stored one. The streaks and status of a completed
+    habit are final, so later check-ins only update its last_checkin.
+
+    Args:
+        session: The database session whose transaction the writes join.
+        rows (list): Values built by summary_row.
+    """
+    if not rows:
+        return
+    statement = insert(HabitSummary.__table__)
+    ongoing = HabitSummary.status == ONGOING
+    statement = statement.on_conflict_do_update(
+        index_elements=[HabitSummary.habit_id],
+        set_={'current_streak': case((ongoing, statement.excluded.current_streak), else_=HabitSummary.current_streak),
+              'best_streak': case((ongoing, func.max(HabitSummary.best_streak, statement.excluded.current_streak)),
+                                  else_=HabitSummary.best_streak),
+              'last_checkin': func.coalesce(statement.excluded.last_checkin, HabitSummary.last_checkin),
+              'status': case((ongoing, statement.excluded.status), else_=HabitSummary.status)})
+    session.execute(statement, [dict(row, best_streak=row['current_streak']) for row in rows])
+
+
+def _expected_summaries():
+    """
+    Returns a select deriving the summary of every habit from the raw tables.
+    """
+    completed = Completion.id.isnot(None)
+    return (select(Habit.id,
+                   days_between(Habit.created_at, func.coalesce(Completion.completion_date,
+                                                                Checkpoint.current_checkpoint)),
+                   Checkpoint.current_checkpoint,
+                   func.coalesce(Completion.completion_status, literal(ONGOING)))
+            .outerjoin(Checkpoint, Checkpoint.id == first_checkpoint_id())
+            .outerjoin(Completion, Completion.id == first_completion_id())
+            .where(completed | Checkpoint.id.isnot(None)))
+
+
+def rebuild_summaries(session):
+    """
+    Regenerates the habit_summaries table from habits, checkpoints and completions.
+
+    The raw tables do not keep a history of streaks, so the best streak is reset to the current one.
+
+    Args:
+        session: The database session to use.
+
+    Returns:
+        int: The number of summaries written.
+    """
+    try:
+        session.execute(delete(HabitSummary))
+        expected = _expected_summaries().subquery()
+        session.execute(insert(HabitSummary.__table__).from_select(
+            ['habit_id', 'current_streak', 'best_streak', 'last_checkin', 'status'],
+            select(expected.c[0], expected.c[1], expected.c[1], expected.c[2], expected.c[3])))
+        bump_data_version(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return session.query(HabitSummary).count()
+
+
+def verify_summaries(session):
+    """
+    Compares the habit_summaries table with the summaries derived from the raw tables.
+
+    Args:
+        session: The database session to use.
+
+    Returns:
+        list: IDs of the habits whose summary is missing, outdated or left over.
+    """
+    def comparable(current_streak, last_checkin, status):
+        # The checkpoint of a completed habit is deleted, so its last check-in cannot be derived.
+        return current_streak, last_checkin if status == ONGOING else None, status
+
+    expected = {row[0]: comparable(*row[1:]) for row in session.execute(_expected_summaries())}
+    stored = {}
+    for summary in session.execute(select(HabitSummary)).scalars():
+        stored[summary.habit_id] = comparable(summary.current_streak, summary.last_checkin, summary.status)
+        if summary.best_streak < summary.current_streak:
+            stored[summary.habit_id] = None
+    return sorted(habit_id for habit_id in expected.keys() | stored.keys()
+                  if expected.get(habit_id) != stored.get(habit_id))
+
+
+def summaries_initialized(session):
+    """
+    Checks if the summaries exist for a database with habits.
+
+    Returns:
+        bool: False if there are habits but no summaries, True otherwise.
+    """
+    return (session.query(HabitSummary.habit_id).first() is not None
+            or session.query(Habit.id).first() is None)
+
+
+@click.command()
+@click.option('--verify', is_flag=True, help='Only compare the summaries with the raw tables.')
+def main(verify):
+    """Rebuilds or verifies the habit summary table."""
+    if not verify:
+        click.echo(f'Rebuilt {rebuild_summaries(session)} habit summaries.')
+    mismatches = verify_summaries(session)
+    if mismatches:
+        raise click.ClickException(f'{len(mismatches)} summaries differ, e.g. habit IDs {mismatches[:10]}')
+    click.echo('Habit summaries are consistent.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import analytics_module
+import clock
+from analytics_cache import AnalyticsCache, CacheStats, data_version
+from db.database_module import Base
+from habit import HabitManager
+
+TODAY = datetime.date(2024, 7, 1)
+
+
+@patch('builtins.print')
+@patch('habit.questionary.print')
+class TestAnalyticsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_engine('sqlite:///' + os.path.join(self.directory.name, 'habits.db'))
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.manager = HabitManager(self.session)
+        self.cache = AnalyticsCache(max_entries=2)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def analyze(self, session=None):
+        session = session or self.session
+        return self.cache.get(session, ('analysis',),
+                              lambda: analytics_module.analyze_habits_from_summary(HabitManager(session)))
+
+    def test_writes_invalidate_results(self, *mocks):
+        with clock.frozen(TODAY):
+            habit = self.manager.add_habit('reading', 'daily', datetime.date.max)
+            self.assertEqual(1, len(self.analyze()['daily_habits']))
+            self.assertEqual(1, len(self.analyze()['daily_habits']))
+            self.assertEqual(CacheStats(1, 1, 0, 1), self.cache.stats())
+
+            version = data_version(self.session)
+            self.manager.checkin_habit(habit.id, TODAY + datetime.timedelta(days=1))
+            self.manager.complete_habit(habit.id)
+            self.manager.validate_habits(interactive=False)
+            self.assertEqual(version + 2, data_version(self.session))
+            self.assertEqual([], self.analyze()['daily_habits'])
+        self.assertEqual(2, self.cache.stats().misses)
+
+    def test_writes_of_other_processes_invalidate_results(self, *mocks):
+        self.analyze()
+        other_engine = create_engine(self.engine.url)
+        other_session = sessionmaker(bind=other_engine)()
+        try:
+            HabitManager(other_session).add_habit('reading', 'weekly', datetime.date.max)
+        finally:
+            other_session.close()
+            other_engine.dispose()
+
+        self.assertEqual(1, len(self.analyze()['weekly_habits']))
+        self.assertEqual(CacheStats(0, 2, 0, 1), self.cache.stats())
+
+    def test_callers_get_copies(self, *mocks):
+        self.analyze()['daily_habits'] = None
+
+        self.assertEqual([], self.analyze()['daily_habits'])
+
+    def test_least_recently_used_results_are_evicted(self, *mocks):
+        for key in ('a', 'b', 'a', 'c', 'a', 'b'):
+            self.cache.get(self.session, (key,), lambda: key)
+
+        self.assertEqual(CacheStats(2, 4, 2, 2), self.cache.stats())
+        self.cache.clear()
+        self.assertEqual(CacheStats(0, 0, 0, 0), self.cache.stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
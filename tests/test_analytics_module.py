@@ -0,0 +1,61 @@
+import datetime
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import analytics_module
+from db.database_module import Base, Habit, Completion, Checkpoint
+from habit import HabitManager
+
+
+class TestAnalyzeHabitsInDb(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.manager = HabitManager(self.session)
+
+    def tearDown(self):
+        self.session.close()
+
+    def add_habit(self, habit_id, periodicity, created_at, current_checkpoint=None, completion_date=None):
+        self.session.add(Habit(id=habit_id, name="habit " + str(habit_id), periodicity=periodicity,
+                               created_at=created_at, target_date=datetime.date.max))
+        if current_checkpoint is not None:
+            self.session.add(Checkpoint(habit_id=habit_id, current_checkpoint=current_checkpoint,
+                                        last_checkpoint=current_checkpoint, next_checkpoint=current_checkpoint))
+        if completion_date is not None:
+            self.session.add(Completion(habit_id=habit_id, completion_status="SUCCESSFULLY",
+                                        completion_date=completion_date))
+        self.session.commit()
+
+    def test_empty_tables(self):
+        expected = {'longest ongoing streak': 0, 'longest total streak': 0, 'daily_habits': [], 'weekly_habits': []}
+        self.assertEqual(expected, analytics_module.analyze_habits(self.manager))
+        self.assertEqual(expected, analytics_module.analyze_habits_in_db(self.manager))
+
+    def test_matches_orm_implementation(self):
+        start = datetime.date(2024, 7, 1)
+        self.add_habit(1, "daily", start, current_checkpoint=datetime.date(2024, 7, 19))
+        self.add_habit(2, "weekly", start, current_checkpoint=datetime.date(2024, 7, 29))
+        self.add_habit(3, "daily", start, current_checkpoint=datetime.date(2024, 6, 20))
+        self.add_habit(4, "daily", start, completion_date=datetime.date(2024, 8, 31))
+        self.add_habit(5, "weekly", start, current_checkpoint=start, completion_date=datetime.date(2024, 7, 2))
+
+        expected = analytics_module.analyze_habits(self.manager)
+        result = analytics_module.analyze_habits_in_db(self.manager)
+
+        self.assertEqual(28, result['longest ongoing streak'])
+        self.assertEqual(61, result['longest total streak'])
+        self.assertEqual(expected['longest ongoing streak'], result['longest ongoing streak'])
+        self.assertEqual(expected['longest total streak'], result['longest total streak'])
+        for key in ('daily_habits', 'weekly_habits'):
+            self.assertEqual([(habit.id, habit.name) for habit in expected[key]],
+                             [(habit.id, habit.name) for habit in result[key]])
+        self.assertEqual([18, 0], [habit.streak for habit in result['daily_habits']])
+
+
+if __name__ == '__main__':
+    unittest.main()
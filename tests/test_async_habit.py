@@ -0,0 +1,44 @@
+import asyncio
+import datetime
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from analytics_cache import data_version
+from async_habit import AsyncHabitManager
+
+
+@unittest.skipIf(importlib.util.find_spec('aiosqlite') is None, "aiosqlite is not installed")
+@patch('builtins.print')
+class TestAsyncHabitManager(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.manager = await AsyncHabitManager.create(
+            'sqlite+aiosqlite:///' + os.path.join(self.directory.name, 'habits.db'))
+
+    async def asyncTearDown(self):
+        await self.manager.close()
+        self.directory.cleanup()
+
+    async def test_concurrent_operations(self, mock_print):
+        habits = await asyncio.gather(*(self.manager.add_habit("habit " + str(number), "daily", datetime.date.max)
+                                        for number in range(10)))
+        self.assertEqual(20, await self.manager.run(lambda manager: data_version(manager.session)))
+        await asyncio.gather(*(self.manager.checkin_habit(habit.id) for habit in habits))
+
+        self.assertTrue(await self.manager.complete_habit(habits[0].id))
+        self.assertFalse(await self.manager.complete_habit(999))
+        ongoing = await self.manager.list_habits()
+        self.assertEqual(sorted(habit.id for habit in habits[1:]), sorted(habit.id for habit in ongoing))
+        self.assertEqual([], await self.manager.validate_habits())
+
+        result = await self.manager.analyze_habits()
+        self.assertEqual(9, len(result['daily_habits']))
+        self.assertEqual(0, result['longest ongoing streak'])
+
+
+if __name__ == '__main__':
+    unittest.main()
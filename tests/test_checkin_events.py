@@ -0,0 +1,104 @@
+import datetime
+import random
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import analytics_module
+from db.database_module import Base, Habit, Checkpoint, CheckinEvent, HabitSummary, to_day_number, from_day_number
+from habit import HabitManager
+
+START = datetime.date(2024, 7, 1)
+
+
+@patch('builtins.print')
+class TestCheckinEvents(unittest.TestCase):
+
+    def create_manager(self, append_only=False):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        for habit_id in range(1, 6):
+            session.add(Habit(id=habit_id, name="habit " + str(habit_id),
+                              periodicity="daily" if habit_id % 2 else "weekly", created_at=START,
+                              target_date=START + datetime.timedelta(days=10 * habit_id)))
+        session.commit()
+        return HabitManager(session, append_only=append_only)
+
+    def state(self, manager):
+        checkpoints = [(c.id, c.habit_id, c.last_checkpoint, c.current_checkpoint, c.next_checkpoint,
+                        c.is_valid_streak) for c in manager.session.query(Checkpoint).order_by(Checkpoint.id)]
+        summaries = [(s.habit_id, s.current_streak, s.best_streak, s.last_checkin, s.status)
+                     for s in manager.session.query(HabitSummary).order_by(HabitSummary.habit_id)]
+        return checkpoints, summaries
+
+    def events(self, manager):
+        return [(e.habit_id, from_day_number(e.day), e.applied)
+                for e in manager.session.query(CheckinEvent).order_by(CheckinEvent.id)]
+
+    def test_day_numbers_round_trip(self, mock_print):
+        self.assertEqual(START, from_day_number(to_day_number(START)))
+        self.assertEqual(1, to_day_number(START + datetime.timedelta(days=1)) - to_day_number(START))
+
+    def test_checkins_are_logged(self, mock_print):
+        manager = self.create_manager()
+
+        manager.checkin_habit(1, START)
+        manager.checkin_habits([(2, START), (9, START)])
+
+        self.assertEqual([(1, START, True), (2, START, True)], self.events(manager))
+
+    def test_compaction_matches_direct_checkins(self, mock_print):
+        rng = random.Random(3)
+        checkins = [(rng.randint(1, 6), START + datetime.timedelta(days=rng.randint(0, 60))) for _ in range(200)]
+        direct = self.create_manager()
+        for habit_id, checkin_date in checkins:
+            direct.checkin_habit(habit_id, checkin_date)
+        logged = self.create_manager(append_only=True)
+        for habit_id, checkin_date in checkins[:100]:
+            logged.checkin_habit(habit_id, checkin_date)
+        logged.checkin_habits(checkins[100:])
+
+        self.assertEqual(([], []), self.state(logged))
+        self.assertEqual(len([c for c in checkins if c[0] <= 5]), logged.compact_checkin_events(chunk_size=32))
+        self.assertEqual(self.state(direct), self.state(logged))
+        self.assertEqual(self.events(direct), self.events(logged))
+        self.assertEqual(0, logged.compact_checkin_events())
+
+    def test_compaction_prunes_applied_events(self, mock_print):
+        manager = self.create_manager(append_only=True)
+        for day in range(5):
+            manager.checkin_habit(1, START + datetime.timedelta(days=day))
+
+        manager.compact_checkin_events(prune_before=START + datetime.timedelta(days=3))
+
+        self.assertEqual([START + datetime.timedelta(days=3), START + datetime.timedelta(days=4)],
+                         [checkin_date for _, checkin_date, _ in self.events(manager)])
+        self.assertEqual(START + datetime.timedelta(days=4), manager.get_checkpoint_by_habit_id(1).current_checkpoint)
+
+    def test_pending_events_use_partial_index(self, mock_print):
+        manager = self.create_manager()
+        plan = manager.session.execute(text("EXPLAIN QUERY PLAN SELECT id, habit_id, day FROM checkin_events "
+                                            "WHERE applied = 0 ORDER BY id")).all()
+
+        self.assertIn('ix_checkin_events_pending', ' '.join(row[-1] for row in plan))
+
+    def test_gaps_and_islands_streaks(self, mock_print):
+        manager = self.create_manager(append_only=True)
+        for offset in (0, 1, 2, 4, 5, 5, 9):
+            manager.checkin_habit(1, START + datetime.timedelta(days=offset))
+        for offset in (0, 7, 8, 14, 28):
+            manager.checkin_habit(2, START + datetime.timedelta(days=offset))
+        # Sunday and the following Monday are consecutive weeks.
+        for offset in (6, 7):
+            manager.checkin_habit(4, START + datetime.timedelta(days=offset))
+
+        self.assertEqual([analytics_module.CheckinStreak(1, 3, 1), analytics_module.CheckinStreak(2, 3, 1),
+                          analytics_module.CheckinStreak(4, 2, 2)],
+                         analytics_module.get_checkin_streaks(manager.session))
+
+
+if __name__ == '__main__':
+    unittest.main()
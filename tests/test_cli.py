@@ -0,0 +1,89 @@
+import json
+import os
+import tempfile
+import unittest
+
+from click.testing import CliRunner
+
+from cli import cli
+from db.database_module import configure
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.env = {'HABITS_URL': 'sqlite:///' + os.path.join(self.directory.name, 'habits.db')}
+        self.runner = CliRunner(env=self.env, mix_stderr=False)
+        configure()
+
+    def tearDown(self):
+        configure()
+        self.directory.cleanup()
+
+    def invoke(self, *args):
+        result = self.runner.invoke(cli, args)
+        return result.exit_code, json.loads(result.stdout)
+
+    def test_list_without_database(self):
+        self.assertEqual((0, []), self.invoke('list'))
+
+    def test_commands_print_json(self):
+        exit_code, habit = self.invoke('add', 'reading', '--periodicity', 'weekly')
+        self.assertEqual((0, 'reading', 'weekly'), (exit_code, habit['name'], habit['periodicity']))
+        self.assertEqual((0, {'habit_id': habit['id'], 'checked_in': True}), self.invoke('checkin', str(habit['id'])))
+        self.assertEqual((1, {'habit_id': 99, 'checked_in': False}), self.invoke('checkin', '99'))
+
+        exit_code, habits = self.invoke('list')
+        self.assertEqual([(habit['id'], 'reading')], [(item['id'], item['name']) for item in habits])
+        exit_code, result = self.invoke('stats')
+        self.assertEqual([habit['id']], [item['id'] for item in result['weekly_habits']])
+        self.assertEqual((0, []), self.invoke('validate'))
+        self.assertEqual(0, self.invoke('checkin', str(habit['id']), '--append-only')[0])
+        self.assertEqual((0, {'compacted': 1}), self.invoke('compact'))
+
+        self.assertEqual((0, {'habit_id': habit['id'], 'completed': True}), self.invoke('complete', str(habit['id'])))
+        self.assertEqual((0, []), self.invoke('list'))
+
+    def test_list_filters(self):
+        for name in ('reading', 'running', 'rowing'):
+            self.invoke('add', name)
+
+        exit_code, habits = self.invoke('list', '--name-prefix', 'r', '--order-by', 'name', '--status', 'all')
+        self.assertEqual(['reading', 'rowing', 'running'], [habit['name'] for habit in habits])
+        self.assertEqual((0, []), self.invoke('list', '--periodicity', 'weekly'))
+
+    def test_tenants(self):
+        self.runner.env['HABITS_SHARD_DIRECTORY'] = os.path.join(self.directory.name, 'tenants')
+        self.invoke('--tenant', 'alice', 'add', 'reading')
+        self.invoke('--tenant', 'bob', 'add', 'running')
+
+        self.assertEqual(['running'], [habit['name'] for habit in self.invoke('--tenant', 'bob', 'list')[1]])
+        self.assertEqual((0, []), self.invoke('list'))
+        exit_code, result = self.invoke('stats', '--all-tenants')
+        self.assertEqual([('alice', 'reading'), ('bob', 'running')],
+                         [(habit['tenant'], habit['name']) for habit in result['daily_habits']])
+        self.assertEqual(2, self.runner.invoke(cli, ['--tenant', '../x', 'list']).exit_code)
+
+    def test_stats_from_snapshot(self):
+        path = os.path.join(self.directory.name, 'habits.snapshot')
+        self.invoke('add', 'reading')
+        self.invoke('add', 'running', '--periodicity', 'weekly')
+
+        self.assertEqual((0, {'habits': 2, 'completions': 0, 'checkpoints': 2}),
+                         self.invoke('export-snapshot', path))
+        self.assertEqual(self.invoke('stats'), self.invoke('stats', '--snapshot', path))
+
+    def test_profile_writes_json(self):
+        path = os.path.join(self.directory.name, 'profile.json')
+        exit_code, habit = self.invoke('--profile-json', path, 'add', 'reading')
+
+        with open(path) as file:
+            stats = json.load(file)
+        self.assertEqual(0, exit_code)
+        self.assertEqual(1, stats['HabitManager.add_habit']['calls'])
+        self.assertGreater(stats['HabitManager.add_habit']['statements'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
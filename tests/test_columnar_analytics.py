@@ -0,0 +1,73 @@
+import datetime
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import analytics_module
+import columnar_analytics
+from db.database_module import Base, Habit, Completion, Checkpoint
+from habit import HabitManager
+
+
+@unittest.skipIf(columnar_analytics.np is None, "numpy is not installed")
+class TestColumnarAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.manager = HabitManager(self.session)
+        start = datetime.date(2024, 7, 1)
+        for habit_id, periodicity, current_checkpoint, completion_date in (
+                (1, "daily", datetime.date(2024, 7, 19), None),
+                (2, "weekly", datetime.date(2024, 7, 29), None),
+                (3, "daily", datetime.date(2024, 7, 11), None),
+                (4, "daily", None, datetime.date(2024, 7, 15)),
+                (5, "weekly", None, datetime.date(2024, 8, 1))):
+            self.session.add(Habit(id=habit_id, name="habit " + str(habit_id), periodicity=periodicity,
+                                   created_at=start, target_date=datetime.date(2024, 7, 31)))
+            if current_checkpoint is not None:
+                self.session.add(Checkpoint(habit_id=habit_id, current_checkpoint=current_checkpoint))
+            if completion_date is not None:
+                self.session.add(Completion(habit_id=habit_id, completion_status="SUCCESSFULLY",
+                                            completion_date=completion_date))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_streaks_match_get_streak(self):
+        columns = columnar_analytics.load_columns(self.session)
+        streaks, ongoing = columnar_analytics.compute_streaks(columns)
+
+        expected = [analytics_module.get_streak(habit, habit.checkpoints[0].current_checkpoint
+                                                if not habit.completions else habit.completions[0].completion_date)
+                    for habit in self.session.query(Habit).order_by(Habit.id)]
+        self.assertEqual(expected, streaks.tolist())
+        self.assertEqual([True, True, True, False, False], ongoing.tolist())
+
+    def test_analyze_habits_columnar(self):
+        expected = analytics_module.analyze_habits(self.manager)
+        result = columnar_analytics.analyze_habits_columnar(self.manager, percentiles=(50,), bins=2)
+
+        self.assertEqual(expected['longest ongoing streak'], result['longest ongoing streak'])
+        self.assertEqual(expected['longest total streak'], result['longest total streak'])
+        self.assertEqual({'count': 2, 'mean': 14.0, 'max': 18, 'percentiles': {50: 14.0}},
+                         result['streak_distribution']['daily'])
+        self.assertEqual(([1, 0], [0.0, 0.5, 1.0]), result['completion_rate_histogram']['daily'])
+        self.assertEqual(([0, 1], [0.0, 0.5, 1.0]), result['completion_rate_histogram']['weekly'])
+
+    def test_empty_tables(self):
+        self.session.query(Checkpoint).delete()
+        self.session.query(Completion).delete()
+        self.session.query(Habit).delete()
+
+        result = columnar_analytics.analyze_habits_columnar(self.manager)
+
+        self.assertEqual(0, result['longest ongoing streak'])
+        self.assertEqual(0, result['streak_distribution']['weekly']['count'])
+
+
+if __name__ == '__main__':
+    unittest.main()
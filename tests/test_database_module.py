@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import text
+
+from db import database_module
+from db.config import load_settings, sqlite_path
+from db.database_module import Habit, configure, get_engine, session_scope
+
+
+class TestDatabaseSettings(unittest.TestCase):
+
+    def test_sources_are_merged_in_order(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ini', delete=False) as config_file:
+            config_file.write("[database]\nurl = sqlite:///from_file.db\nbusy_timeout = 100\npool_size = 3\n")
+        try:
+            settings = load_settings(environ={'HABITS_CONFIG': config_file.name, 'HABITS_BUSY_TIMEOUT': '200'},
+                                     synchronous='FULL')
+        finally:
+            os.unlink(config_file.name)
+
+        self.assertEqual('sqlite:///from_file.db', settings.url)
+        self.assertEqual(200, settings.busy_timeout)
+        self.assertEqual(3, settings.pool_size)
+        self.assertEqual('FULL', settings.synchronous)
+        self.assertEqual('WAL', settings.journal_mode)
+
+    def test_invalid_settings_are_rejected(self):
+        settings = load_settings(environ={}, journal_mode='wal', synchronous='normal', busy_timeout='100')
+        self.assertEqual(('WAL', 'NORMAL', 100), (settings.journal_mode, settings.synchronous, settings.busy_timeout))
+        for setting in [{'journal_mode': 'WAL; DROP TABLE habits'}, {'synchronous': 'FAST'},
+                        {'busy_timeout': '5s'}, {'mmap_size': '1; PRAGMA foreign_keys=OFF'}]:
+            with self.subTest(setting=setting), self.assertRaisesRegex(ValueError, list(setting)[0]):
+                load_settings(environ={}, **setting)
+        with self.assertRaisesRegex(ValueError, 'pool_size'):
+            load_settings(environ={'HABITS_POOL_SIZE': 'many'})
+
+    def test_sqlite_path(self):
+        self.assertEqual('habits.db', sqlite_path('sqlite:///habits.db'))
+        self.assertIsNone(sqlite_path('sqlite://'))
+        self.assertIsNone(sqlite_path('postgresql://localhost/habits'))
+
+
+class TestEngineFactory(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'habits.db')
+        configure(url='sqlite:///' + self.path, busy_timeout=1234)
+
+    def tearDown(self):
+        configure()
+        self.directory.cleanup()
+
+    def test_engine_is_built_lazily_with_pragmas(self):
+        self.assertIsNone(database_module._engine)
+        self.assertFalse(os.path.exists(self.path))
+
+        with get_engine().connect() as connection:
+            self.assertEqual('wal', connection.execute(text('PRAGMA journal_mode')).scalar())
+            self.assertEqual(1, connection.execute(text('PRAGMA synchronous')).scalar())
+            self.assertEqual(1234, connection.execute(text('PRAGMA busy_timeout')).scalar())
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_session_scope_commits_or_rolls_back(self):
+        with session_scope() as unit_session:
+            unit_session.add(Habit(name="yoga", periodicity="daily"))
+        with self.assertRaises(RuntimeError):
+            with session_scope() as unit_session:
+                unit_session.add(Habit(name="jogging", periodicity="daily"))
+                unit_session.flush()
+                raise RuntimeError("abort")
+
+        with session_scope() as unit_session:
+            self.assertEqual(["yoga"], [habit.name for habit in unit_session.query(Habit)])
+
+
+if __name__ == '__main__':
+    unittest.main()
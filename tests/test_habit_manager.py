@@ -0,0 +1,263 @@
+import datetime
+import random
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import clock
+from db.database_module import Base, Habit, Completion, Checkpoint, HabitSummary
+from habit import HabitManager
+
+
+class TestHabitManager(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.manager = HabitManager(self.session)
+        self.today = datetime.date.today()
+
+    def tearDown(self):
+        self.session.close()
+
+    def add_habit(self, habit_id, next_checkpoint, periodicity="daily"):
+        self.session.add(Habit(id=habit_id, name="habit " + str(habit_id), periodicity=periodicity,
+                               created_at=self.today - datetime.timedelta(days=10),
+                               target_date=datetime.date.max))
+        self.session.add(Checkpoint(habit_id=habit_id, last_checkpoint=self.today - datetime.timedelta(days=4),
+                                    current_checkpoint=self.today - datetime.timedelta(days=3),
+                                    next_checkpoint=next_checkpoint))
+        self.session.commit()
+
+    def test_validate_habits_completes_expired_habits(self):
+        self.add_habit(1, self.today - datetime.timedelta(days=2))
+        self.add_habit(2, self.today + datetime.timedelta(days=1))
+        self.add_habit(3, self.today - datetime.timedelta(days=1), periodicity="weekly")
+
+        broken_habits = self.manager.validate_habits(interactive=False)
+
+        self.assertEqual([1, 3], [broken_habit.id for broken_habit in broken_habits])
+        self.assertEqual([(1, "FAILED"), (3, "FAILED")],
+                         [(c.habit_id, c.completion_status) for c in self.session.query(Completion)
+                          .order_by(Completion.habit_id)])
+        self.assertEqual([2], [c.habit_id for c in self.session.query(Checkpoint)])
+
+    def test_validate_habits_ignores_completed_habits(self):
+        self.add_habit(1, self.today - datetime.timedelta(days=2))
+        self.session.add(Completion(habit_id=1, completion_status="SUCCESSFULLY"))
+        self.session.commit()
+
+        self.assertEqual([], self.manager.validate_habits(interactive=False))
+        self.assertEqual(1, self.session.query(Completion).count())
+
+    def test_validate_habits_completes_habits_without_checkpoint(self):
+        for habit_id, periodicity, age in [(1, "daily", 2), (2, "daily", 1), (3, "weekly", 8), (4, "weekly", 7)]:
+            self.session.add(Habit(id=habit_id, name="habit " + str(habit_id), periodicity=periodicity,
+                                   created_at=self.today - datetime.timedelta(days=age),
+                                   target_date=datetime.date.max))
+        self.session.commit()
+
+        broken_habits = self.manager.validate_habits(interactive=False)
+
+        self.assertEqual([(1, None), (3, None)],
+                         [(broken_habit.id, broken_habit.checkpoint_id) for broken_habit in broken_habits])
+        self.assertEqual([1, 3], [c.habit_id for c in self.session.query(Completion).order_by(Completion.habit_id)])
+
+    @patch('builtins.input', return_value='')
+    @patch('habit.questionary.print')
+    def test_validate_habits_prints_broken_habits(self, mock_print, mock_input):
+        self.add_habit(1, self.today - datetime.timedelta(days=2))
+
+        self.manager.validate_habits()
+
+        mock_print.assert_any_call(" - habit 1(ID: 1), after 10 sucessfull Days", style='bold fg:ansiblue')
+        mock_input.assert_called_once()
+
+
+@patch('builtins.print')
+class TestCheckinHabits(unittest.TestCase):
+
+    def create_manager(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        start = datetime.date(2024, 7, 1)
+        for habit_id in range(1, 6):
+            session.add(Habit(id=habit_id, name="habit " + str(habit_id),
+                              periodicity="daily" if habit_id % 2 else "weekly", created_at=start,
+                              target_date=start + datetime.timedelta(days=10 * habit_id)))
+        session.commit()
+        return HabitManager(session)
+
+    def state(self, manager):
+        checkpoints = [(c.id, c.habit_id, c.last_checkpoint, c.current_checkpoint, c.next_checkpoint,
+                        c.is_valid_streak) for c in manager.session.query(Checkpoint).order_by(Checkpoint.id)]
+        summaries = [(s.habit_id, s.current_streak, s.best_streak, s.last_checkin, s.status)
+                     for s in manager.session.query(HabitSummary).order_by(HabitSummary.habit_id)]
+        return checkpoints, summaries
+
+    def test_matches_sequential_checkins(self, mock_print):
+        rng = random.Random(7)
+        events = [(rng.randint(1, 7), datetime.date(2024, 7, 1) + datetime.timedelta(days=rng.randint(0, 60)))
+                  for _ in range(300)]
+        sequential = self.create_manager()
+        for habit_id, checkin_date in events:
+            sequential.checkin_habit(habit_id, checkin_date)
+        bulk = self.create_manager()
+
+        with patch('habit.BATCH_SIZE', 3):
+            report = bulk.checkin_habits(events, chunk_size=16)
+
+        self.assertEqual(self.state(sequential), self.state(bulk))
+        self.assertEqual(len([event for event in events if event[0] <= 5]), report.accepted)
+        self.assertEqual({"unknown habit"}, {reason for _, _, reason in report.rejected})
+
+    def test_rejects_malformed_events(self, mock_print):
+        manager = self.create_manager()
+
+        report = manager.checkin_habits([(1, "2024-07-02"), ("x", "2024-07-03"), (1, "2024-02-30"), None,
+                                         (2, datetime.date(2024, 7, 4))])
+
+        self.assertEqual(2, report.accepted)
+        self.assertEqual([1, 2, 3], [index for index, _, _ in report.rejected])
+        self.assertEqual(datetime.date(2024, 7, 2), manager.get_checkpoint_by_habit_id(1).current_checkpoint)
+
+
+class TestIterHabits(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        start = datetime.date(2024, 1, 1)
+        for habit_id in range(1, 26):
+            self.session.add(Habit(id=habit_id, name=("run " if habit_id % 3 else "read ") + str(100 - habit_id),
+                                   periodicity="daily" if habit_id % 2 else "weekly",
+                                   created_at=start + datetime.timedelta(days=habit_id)))
+        for habit_id in range(20, 26):
+            self.session.add(Completion(habit_id=habit_id, completion_status="SUCCESSFULLY"))
+        self.session.commit()
+        self.manager = HabitManager(self.session)
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_pages_match_the_unpaged_query(self):
+        for order_by, key in (('id', lambda habit: habit.id), ('name', lambda habit: (habit.name, habit.id)),
+                              ('created_at', lambda habit: (habit.created_at, habit.id))):
+            with self.subTest(order_by=order_by):
+                expected = sorted(self.manager.list_habits(), key=key)
+                self.assertEqual(expected, list(self.manager.iter_habits(status="ongoing", order_by=order_by,
+                                                                         page_size=4)))
+
+    def test_habits_without_creation_date(self):
+        for habit in self.session.query(Habit).filter(Habit.id.in_([3, 6, 7])):
+            habit.created_at = None
+        self.session.commit()
+
+        for iterate in (self.manager.iter_habits, self.manager.iter_habit_records):
+            with self.subTest(iterate=iterate.__name__):
+                habits = iterate(status="ongoing", order_by='created_at', page_size=2)
+                self.assertEqual([3, 6, 7, 1, 2] + list(range(4, 6)) + list(range(8, 20)),
+                                 [habit.id for habit in habits])
+
+    def test_filters(self):
+        habits = self.manager.iter_habits(periodicity="weekly", name_prefix="run", page_size=2,
+                                          created_from=datetime.date(2024, 1, 5),
+                                          created_to=datetime.date(2024, 1, 22))
+
+        self.assertEqual([4, 8, 10, 14, 16, 20], [habit.id for habit in habits])
+        self.assertEqual(list(range(20, 26)), [habit.id for habit in self.manager.iter_habits(status="completed")])
+        self.assertEqual([], list(self.manager.iter_habits(name_prefix="r%")))
+
+    def test_habit_pages(self):
+        self.assertEqual([10, 10, 5], [len(page) for page in self.manager.habit_pages(page_size=10)])
+        with self.assertRaises(ValueError):
+            next(self.manager.iter_habits(order_by="periodicity"))
+
+    def test_records_match_the_habits(self):
+        self.session.add(Checkpoint(habit_id=3, current_checkpoint=datetime.date(2024, 2, 1)))
+        self.session.add(Checkpoint(habit_id=3, current_checkpoint=datetime.date(2024, 3, 1)))
+        self.session.commit()
+        self.session.expunge_all()
+
+        for filters in ({'status': 'ongoing', 'order_by': 'name'}, {'periodicity': 'weekly', 'name_prefix': 'run'},
+                        {'status': 'completed', 'order_by': 'created_at'}):
+            with self.subTest(**filters):
+                records = list(self.manager.iter_habit_records(page_size=4, **filters))
+                self.assertEqual([(habit.id, habit.name, habit.periodicity, habit.created_at, habit.target_date)
+                                  for habit in self.manager.iter_habits(**filters)],
+                                 [record[:5] for record in records])
+        self.session.expunge_all()
+        records = self.manager.list_habit_records()
+
+        self.assertEqual(19, len(records))
+        self.assertEqual(datetime.date(2024, 2, 1), records[2].current_checkpoint)
+        self.assertEqual([], list(self.session.identity_map.values()))
+        self.assertEqual([4, 4, 4, 4, 3],
+                         [len(page) for page in self.manager.habit_record_pages(page_size=4, status="ongoing")])
+
+
+class TestReplayValidation(unittest.TestCase):
+    start = datetime.date(2024, 7, 1)
+
+    def create_session(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        rng = random.Random(11)
+        for habit_id in range(1, 41):
+            next_checkpoint = self.start + datetime.timedelta(days=rng.randint(-5, 15))
+            session.add(Habit(id=habit_id, name="habit " + str(habit_id), periodicity="daily",
+                              created_at=self.start - datetime.timedelta(days=30), target_date=datetime.date.max))
+            session.add(Checkpoint(habit_id=habit_id, last_checkpoint=next_checkpoint - datetime.timedelta(days=2),
+                                   current_checkpoint=next_checkpoint - datetime.timedelta(days=1),
+                                   next_checkpoint=None if habit_id % 10 == 0 else next_checkpoint))
+        for habit_id, periodicity in [(41, "daily"), (42, "weekly")]:
+            session.add(Habit(id=habit_id, name="habit " + str(habit_id), periodicity=periodicity,
+                              created_at=self.start - datetime.timedelta(days=3), target_date=datetime.date.max))
+        session.add(Completion(habit_id=1, completion_status="ABORTED", completion_date=self.start))
+        session.commit()
+        return session
+
+    def state(self, session):
+        completions = [(c.habit_id, c.completion_status, c.completion_date)
+                       for c in session.query(Completion).order_by(Completion.habit_id)]
+        summaries = [(s.habit_id, s.current_streak, s.status)
+                     for s in session.query(HabitSummary).order_by(HabitSummary.habit_id)]
+        return completions, summaries, session.query(Checkpoint).count()
+
+    def test_backfill_matches_daily_validation(self):
+        end = self.start + datetime.timedelta(days=10)
+        daily = self.create_session()
+        expected = {}
+        for offset in range(11):
+            day = self.start + datetime.timedelta(days=offset)
+            broken_habits = HabitManager(daily, today=lambda: day).validate_habits(interactive=False)
+            if broken_habits:
+                expected[day] = [broken_habit.id for broken_habit in broken_habits]
+        replayed = self.create_session()
+
+        broken_by_day = HabitManager(replayed).backfill_validation(self.start, end)
+
+        self.assertEqual(expected, {day: [broken_habit.id for broken_habit in broken_habits]
+                                    for day, broken_habits in broken_by_day.items()})
+        self.assertEqual(self.state(daily), self.state(replayed))
+
+    def test_clock_sets_defaults_and_today(self):
+        session = self.create_session()
+        with clock.frozen(self.start):
+            session.add(Habit(name="new", periodicity="daily"))
+            session.commit()
+            broken_habits = HabitManager(session).validate_habits(interactive=False)
+
+        self.assertEqual(self.start, session.query(Habit).filter_by(name="new").one().created_at)
+        self.assertEqual({self.start}, {broken_habit.completion_date for broken_habit in broken_habits})
+        self.assertEqual(datetime.date.today(), clock.today())
+
+
+if __name__ == '__main__':
+    unittest.main()
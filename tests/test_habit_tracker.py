@@ -3,14 +3,15 @@ import os
 import unittest
 from unittest.mock import patch, MagicMock
 
-from main import view_statistics, set_milestone_for_habit, clear_screen, create_habit, list_habits
+from main import view_statistics, set_milestone_for_habit, clear_screen, create_habit, list_habits, print_paged
 
 
 class TestHabitTracker(unittest.TestCase):
 
     @patch('main.questionary.select')
-    @patch('main.analytics_module.analyze_habits')
-    def test_view_statistics(self, mock_analyze_habits, mock_select):
+    @patch('main.analytics_module.analyze_habits_from_summary')
+    @patch('main.cache.get', side_effect=lambda session, key, compute: compute())
+    def test_view_statistics(self, mock_cache_get, mock_analyze_habits, mock_select):
         mock_select.return_value.ask.return_value = "get longest streak"
         mock_analyze_habits.return_value = {
             'longest total streak': 10,
@@ -59,7 +60,15 @@ class TestHabitTracker(unittest.TestCase):
         mock_manager = mock_HabitManager.return_value
         list_habits()
 
-        mock_manager.list_habits.assert_called_once()
+        mock_manager.list_habit_records.assert_called_once()
+
+    @patch('builtins.input', side_effect=['', 'q'])
+    def test_print_paged_stops_on_request(self, mock_input):
+        rendered = []
+
+        self.assertFalse(print_paged(iter([[1, 2], [3, 4], [5, 6], [7]]), rendered.append))
+        self.assertEqual([1, 2, 3, 4], rendered)
+        self.assertEqual(2, mock_input.call_count)
 
 
 if __name__ == '__main__':
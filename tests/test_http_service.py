@@ -0,0 +1,133 @@
+import datetime
+import http.client
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy.exc import OperationalError
+
+import clock
+from db.config import load_settings
+from service import start_server, stop_server
+
+TODAY = datetime.date(2024, 7, 1)
+
+
+@patch('builtins.print')
+class TestHttpService(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'habits.db')
+        self.server = start_server(load_settings(url='sqlite:///' + self.path, busy_timeout=50, pool_size=2))
+        self.server.service.retry_delay = 0.01
+        self.connection = http.client.HTTPConnection(*self.server.server_address, timeout=10)
+
+    def tearDown(self):
+        self.connection.close()
+        stop_server(self.server)
+        self.directory.cleanup()
+
+    def request(self, method, path, body=None):
+        self.connection.request(method, path, body=None if body is None else json.dumps(body),
+                                headers={'Content-Type': 'application/json'})
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_habit_lifecycle(self, mock_print):
+        with clock.frozen(TODAY):
+            status, habit = self.request('POST', '/habits', {'name': 'reading', 'periodicity': 'weekly', 'days': 30})
+            self.assertEqual((201, 'reading', str(TODAY + datetime.timedelta(30))),
+                             (status, habit['name'], habit['target_date']))
+            self.request('POST', '/habits', {'name': 'running'})
+            self.assertEqual((200, {'habit_id': habit['id'], 'checked_in': True}),
+                             self.request('POST', f"/habits/{habit['id']}/checkin", {'date': '2024-07-05'}))
+
+            status, state = self.request('GET', f"/habits/{habit['id']}")
+            self.assertEqual('2024-07-05', state['checkpoint']['current_checkpoint'])
+            self.assertIsNone(state['completion'])
+            self.assertEqual((200, {'habit_id': habit['id'], 'completed': True}),
+                             self.request('POST', f"/habits/{habit['id']}/complete"))
+            self.assertEqual(409, self.request('POST', f"/habits/{habit['id']}/complete")[0])
+
+            status, habits = self.request('GET', '/habits')
+            self.assertEqual((200, ['running']), (status, [item['name'] for item in habits]))
+            self.assertEqual((200, []), self.request('GET', '/habits?name_prefix=x'))
+            self.assertEqual(1, len(self.request('GET', '/habits?status=all&limit=1')[1]))
+            status, result = self.request('GET', '/stats')
+            self.assertEqual(['running'], [item['name'] for item in result['daily_habits']])
+            status, rows = self.request('GET', '/trend?grain=month&periods=1')
+            self.assertEqual((200, 2, 1), (status, rows[0]['created'], rows[0]['successfully']))
+            self.assertEqual((200, [{'period_start': '2024-07-01', 'checkins': 2}]),
+                             self.request('GET', f"/habits/{habit['id']}/trend?grain=month&periods=1"))
+
+    def test_bulk_checkins_and_validation(self, mock_print):
+        with clock.frozen(TODAY):
+            habit_id = self.request('POST', '/habits', {'name': 'reading'})[1]['id']
+        status, report = self.request('POST', '/checkins', {'events': [[habit_id, '2024-07-02'],
+                                                                        {'habit_id': habit_id, 'date': 'never'}]})
+        self.assertEqual((200, 1, 2), (status, report['accepted'], report['rejected'][0]['event']))
+
+        with clock.frozen(TODAY + datetime.timedelta(days=10)):
+            status, broken_habits = self.request('POST', '/validate')
+        self.assertEqual((200, [habit_id]), (status, [broken_habit['id'] for broken_habit in broken_habits]))
+
+    def test_errors(self, mock_print):
+        self.assertEqual(404, self.request('GET', '/habits/1')[0])
+        self.assertEqual(404, self.request('POST', '/habits/1/checkin')[0])
+        self.assertEqual(404, self.request('GET', '/nothing')[0])
+        self.assertEqual(405, self.request('POST', '/stats')[0])
+        self.assertEqual(400, self.request('GET', '/trend?grain=year')[0])
+        self.assertEqual(400, self.request('GET', '/habits?limit=0')[0])
+        self.assertEqual(400, self.request('POST', '/habits', {'name': ''})[0])
+        self.assertEqual(400, self.request('POST', '/habits', ['reading'])[0])
+        self.assertEqual('ok', self.request('GET', '/health')[1]['status'])
+
+    def test_invalid_content_length(self, mock_print):
+        for length in ('-1', 'ten'):
+            with self.subTest(length=length):
+                self.connection.putrequest('POST', '/habits')
+                self.connection.putheader('Content-Length', length)
+                self.connection.endheaders()
+                response = self.connection.getresponse()
+                self.assertEqual(400, response.status)
+                self.assertIn('Content-Length', json.loads(response.read())['error'])
+                self.connection.close()
+
+    @patch('service.analytics_module.analyze_habits_from_summary',
+           side_effect=OperationalError('SELECT', {}, sqlite3.OperationalError('disk I/O error')))
+    def test_database_errors_are_internal_errors(self, mock_analyze, mock_print):
+        with patch('service.RequestHandler.log_error'):
+            self.assertEqual((500, {'error': 'internal error'}), self.request('GET', '/stats'))
+        self.assertEqual(200, self.request('GET', '/health')[0])
+
+    def test_completion_is_not_repeated(self, mock_print):
+        habit_id = self.request('POST', '/habits', {'name': 'reading'})[1]['id']
+        busy = OperationalError('DELETE', {}, sqlite3.OperationalError('database is locked'))
+        with patch('habit.HabitManager.delete_checkpoints_for_completed_habit', side_effect=[busy, None]) as delete:
+            self.assertEqual(503, self.request('POST', f'/habits/{habit_id}/complete')[0])
+
+        self.assertEqual(1, delete.call_count)
+        self.assertIsNotNone(self.request('GET', f'/habits/{habit_id}')[1]['completion'])
+
+    def test_locked_database(self, mock_print):
+        habit_id = self.request('POST', '/habits', {'name': 'reading'})[1]['id']
+        writer = sqlite3.connect(self.path, isolation_level=None)
+        try:
+            writer.execute('BEGIN IMMEDIATE')
+            self.connection.request('POST', f'/habits/{habit_id}/checkin')
+            response = self.connection.getresponse()
+            self.assertEqual((503, '1'), (response.status, response.getheader('Retry-After')))
+            response.read()
+            self.assertEqual(200, self.request('GET', f'/habits/{habit_id}')[0])
+        finally:
+            writer.execute('ROLLBACK')
+            writer.close()
+        self.assertEqual(200, self.request('POST', f'/habits/{habit_id}/checkin')[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
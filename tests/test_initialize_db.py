@@ -0,0 +1,76 @@
+import datetime
+import json
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from db.database_module import Base, Habit, Completion, Checkpoint
+from db.initialize_db import bulk_import, iter_json_records
+
+HABITS = [{"id": 1, "name": "smoking", "periodicity": "daily", "created_at": "2024-07-01",
+           "target_date": "2024-07-28"},
+          {"id": 2, "name": "yoga", "periodicity": "weekly", "created_at": "2024-07-02",
+           "target_date": "2024-08-28"}]
+COMPLETIONS = [{"id": 1, "habit_id": 1, "completion_status": "FAILED", "completion_date": "2024-07-28"}]
+CHECKPOINTS = [{"id": 1, "habit_id": 2, "last_checkpoint": "2024-07-11", "current_checkpoint": "2024-07-18",
+                "next_checkpoint": "2024-07-25", "is_valid_streak": 1}]
+
+
+class TestBulkImport(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.session.close()
+        self.directory.cleanup()
+
+    def write(self, name, records, ndjson=False):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            if ndjson:
+                file.write("\n".join(json.dumps(record) for record in records))
+            else:
+                json.dump(records, file, indent=2)
+        return path
+
+    def test_iter_json_records_streams_arrays_in_small_chunks(self):
+        path = self.write("habit.json", HABITS)
+        self.assertEqual(HABITS, list(iter_json_records(path, chunk_size=7)))
+
+    def test_bulk_import_json_arrays(self):
+        report = bulk_import(self.write("habit.json", HABITS), self.write("completions.json", COMPLETIONS),
+                             self.write("checkpoints.json", CHECKPOINTS), db_session=self.session, batch_size=1)
+
+        self.assertEqual(4, report.rows)
+        self.assertEqual(datetime.date(2024, 7, 2), self.session.get(Habit, 2).created_at)
+        self.assertEqual("FAILED", self.session.get(Completion, 1).completion_status)
+        self.assertEqual(datetime.date(2024, 7, 25), self.session.get(Checkpoint, 1).next_checkpoint)
+
+    def test_bulk_import_ndjson(self):
+        report = bulk_import(self.write("habit.ndjson", HABITS, ndjson=True),
+                             self.write("completions.ndjson", COMPLETIONS, ndjson=True),
+                             self.write("checkpoints.ndjson", CHECKPOINTS, ndjson=True), db_session=self.session)
+
+        self.assertEqual(4, report.rows)
+        self.assertEqual(2, self.session.query(Habit).count())
+
+    def test_bulk_import_rolls_back_malformed_record(self):
+        broken_checkpoints = [dict(CHECKPOINTS[0], next_checkpoint="2024-13-45")]
+
+        with self.assertRaises(ValueError):
+            bulk_import(self.write("habit.json", HABITS), self.write("completions.json", COMPLETIONS),
+                        self.write("checkpoints.json", broken_checkpoints), db_session=self.session)
+
+        self.assertEqual(0, self.session.query(Habit).count())
+        self.assertEqual(0, self.session.query(Completion).count())
+
+
+if __name__ == '__main__':
+    unittest.main()
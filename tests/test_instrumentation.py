@@ -0,0 +1,83 @@
+import datetime
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import analytics_module
+from db.database_module import Base, Habit, Checkpoint
+from habit import HabitManager
+from instrumentation import Profiler, UNATTRIBUTED, format_summary
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        today = datetime.date.today()
+        for habit_id in range(1, 4):
+            self.session.add(Habit(id=habit_id, name="habit " + str(habit_id), periodicity="daily",
+                                   created_at=today, target_date=datetime.date.max))
+            self.session.add(Checkpoint(habit_id=habit_id, last_checkpoint=today, current_checkpoint=today,
+                                        next_checkpoint=today + datetime.timedelta(days=1)))
+        self.session.commit()
+        self.manager = HabitManager(self.session)
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_operations_are_counted_inclusively(self):
+        with Profiler() as profiler:
+            self.manager.checkin_habit(1)
+            analytics_module.analyze_habits(self.manager)
+            self.manager.checkin_habit(2)
+        stats = profiler.stats()
+
+        self.assertEqual(2, stats['HabitManager.checkin_habit']['calls'])
+        self.assertEqual(2, stats['HabitManager.get_habit']['calls'])
+        self.assertGreaterEqual(stats['HabitManager.checkin_habit']['statements'],
+                                stats['HabitManager.get_habit']['statements'])
+        self.assertEqual(1, stats['analytics_module.analyze_habits']['calls'])
+        self.assertEqual(3, stats['HabitManager.get_ongoing_habits']['rows'])
+        self.assertIn('HabitManager.get_ongoing_habits', format_summary(stats))
+
+    def test_generators_and_context_managers_are_attributed_while_running(self):
+        with Profiler() as profiler:
+            pages = self.manager.habit_record_pages(page_size=2, status="ongoing")
+            self.assertEqual([2, 1], [len(page) for page in pages])
+            with self.assertRaises(KeyError), self.manager.unit_of_work():
+                self.assertEqual({}, self.manager._states)
+                raise KeyError
+        stats = profiler.stats()
+
+        self.assertEqual(None, self.manager._states)
+        self.assertEqual((1, 2), (stats['HabitManager.habit_record_pages']['calls'],
+                                  stats['HabitManager.habit_record_pages']['statements']))
+        self.assertEqual(1, stats['HabitManager.unit_of_work']['calls'])
+        self.assertNotIn(UNATTRIBUTED, stats)
+
+    def test_lazy_loads_and_unattributed_statements(self):
+        habit = self.session.get(Habit, 1)
+        with Profiler() as profiler:
+            self.assertEqual(1, len(habit.checkpoints))
+
+        self.assertEqual({'statements': 1, 'rows': 1, 'lazy_loads': 1},
+                         {field: profiler.stats()[UNATTRIBUTED][field] for field in ('statements', 'rows',
+                                                                                     'lazy_loads')})
+
+    def test_disable_restores_the_operations(self):
+        original = HabitManager.list_habits
+        profiler = Profiler()
+        profiler.enable()
+        self.assertIsNot(original, HabitManager.list_habits)
+        profiler.disable()
+
+        self.assertIs(original, HabitManager.list_habits)
+        self.manager.list_habits()
+        self.assertEqual({}, profiler.stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import analytics_module
+import parallel_analytics
+from db.database_module import Base, Habit, Completion, Checkpoint
+from habit import HabitManager
+
+
+def create_database(path, count):
+    """Creates count habits with varying streaks; every third habit is completed."""
+    today = datetime.date(2024, 7, 1)
+    engine = create_engine('sqlite:///' + path)
+    Base.metadata.create_all(engine)
+    if not count:
+        engine.dispose()
+        return
+    with engine.begin() as connection:
+        connection.execute(Habit.__table__.insert(), [
+            {'id': habit_id, 'name': 'habit ' + str(habit_id), 'periodicity': 'daily' if habit_id % 2 else 'weekly',
+             'created_at': today - datetime.timedelta(days=habit_id), 'target_date': datetime.date.max}
+            for habit_id in range(1, count + 1)])
+        connection.execute(Checkpoint.__table__.insert(), [
+            {'habit_id': habit_id, 'last_checkpoint': today, 'current_checkpoint': today,
+             'next_checkpoint': today + datetime.timedelta(days=1), 'is_valid_streak': True}
+            for habit_id in range(1, count + 1) if habit_id % 3])
+        connection.execute(Completion.__table__.insert(), [
+            {'habit_id': habit_id, 'completion_status': 'SUCCESSFULLY', 'completion_date': today}
+            for habit_id in range(1, count + 1) if not habit_id % 3])
+    engine.dispose()
+
+
+def cached_engine(path):
+    """Runs in a worker: reports if an engine for path exists before analyzing it."""
+    cached = path in parallel_analytics._engines
+    parallel_analytics.analyze_partition(path)
+    return os.getpid(), cached
+
+
+def analyze_serially(path):
+    engine = create_engine('sqlite:///' + path)
+    session = sessionmaker(bind=engine)()
+    try:
+        return analytics_module.analyze_habits_in_db(HabitManager(session))
+    finally:
+        session.close()
+        engine.dispose()
+
+
+class TestParallelAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'habits.db')
+        create_database(self.path, 50)
+
+    def tearDown(self):
+        for engine in parallel_analytics._engines.values():
+            engine.dispose()
+        parallel_analytics._engines.clear()
+        self.directory.cleanup()
+
+    def test_id_ranges_cover_all_habits(self):
+        ranges = parallel_analytics.id_ranges(self.path, 4)
+
+        self.assertEqual([(1, 14), (14, 27), (27, 40), (40, 51)], ranges)
+
+    def test_id_ranges_of_empty_database(self):
+        path = os.path.join(self.directory.name, 'empty.db')
+        create_database(path, 0)
+
+        self.assertEqual([], parallel_analytics.id_ranges(path, 4))
+
+    def test_partitions_merge_to_serial_result(self):
+        ranges = parallel_analytics.id_ranges(self.path, 7)
+        merged = analytics_module.merge_analyses(parallel_analytics.analyze_partition(self.path, id_range)
+                                                 for id_range in ranges)
+
+        self.assertEqual(analyze_serially(self.path), merged)
+
+    def test_parallel_result_equals_serial_result(self):
+        result = parallel_analytics.analyze_habits_parallel(self.path, workers=2, partitions=5)
+
+        self.assertEqual(analyze_serially(self.path), result)
+        self.assertEqual(48, result['longest total streak'])
+        self.assertIsInstance(result['daily_habits'][0], analytics_module.HabitStreak)
+
+    def test_workers_open_their_own_connection(self):
+        parallel_analytics.id_ranges(self.path, 4)
+        self.assertEqual({}, parallel_analytics._engines)
+        parallel_analytics.analyze_partition(self.path)
+
+        with parallel_analytics._executor(2) as executor:
+            reports = list(executor.map(cached_engine, [self.path] * 4))
+
+        first_reports = {}
+        for pid, cached in reports:
+            first_reports.setdefault(pid, cached)
+        self.assertNotIn(os.getpid(), first_reports)
+        self.assertEqual({False}, set(first_reports.values()))
+
+    def test_files_are_analyzed_per_name(self):
+        other = os.path.join(self.directory.name, 'other.db')
+        create_database(other, 10)
+
+        result = parallel_analytics.analyze_files_parallel({'alice': self.path, 'bob': other}, workers=2)
+
+        self.assertEqual(48, result['longest total streak'])
+        self.assertEqual(17 + 4, len(result['weekly_habits']))
+        self.assertEqual({'alice', 'bob'}, {habit.tenant for habit in result['daily_habits']})
+
+
+if __name__ == '__main__':
+    unittest.main()
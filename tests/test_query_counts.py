@@ -0,0 +1,114 @@
+import datetime
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import analytics_module
+from db.database_module import Base, Habit, Completion, Checkpoint
+from habit import HabitManager
+from main import view_statistics
+from summary_module import rebuild_summaries
+
+
+def seed(session, count):
+    """Creates count ongoing habits with a checkpoint and count completed habits."""
+    today = datetime.date.today()
+    created_at = today - datetime.timedelta(days=30)
+    session.execute(Habit.__table__.insert(), [
+        {'id': habit_id, 'name': 'habit ' + str(habit_id), 'periodicity': 'daily' if habit_id % 2 else 'weekly',
+         'created_at': created_at, 'target_date': datetime.date.max}
+        for habit_id in range(1, 2 * count + 1)])
+    session.execute(Checkpoint.__table__.insert(), [
+        {'habit_id': habit_id, 'last_checkpoint': today, 'current_checkpoint': today,
+         'next_checkpoint': today + datetime.timedelta(days=1), 'is_valid_streak': True}
+        for habit_id in range(1, count + 1)])
+    session.execute(Completion.__table__.insert(), [
+        {'habit_id': habit_id, 'completion_status': 'SUCCESSFULLY', 'completion_date': today}
+        for habit_id in range(count + 1, 2 * count + 1)])
+    session.commit()
+    rebuild_summaries(session)
+
+
+class TestQueryCounts(unittest.TestCase):
+
+    def count_statements(self, habit_count, operation, prefix=''):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        seed(session, habit_count)
+        statements = []
+
+        def record_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', record_statement)
+        try:
+            operation(session)
+        finally:
+            event.remove(engine, 'before_cursor_execute', record_statement)
+            session.close()
+        return len([statement for statement in statements if statement.startswith(prefix)])
+
+    def test_analyze_habits_query_count_is_constant(self):
+        def analyze(session):
+            analytics_module.analyze_habits(HabitManager(session))
+
+        self.assertEqual(self.count_statements(10, analyze), self.count_statements(10000, analyze))
+
+    @patch('builtins.input', return_value='')
+    @patch('builtins.print')
+    @patch('main.clear_screen')
+    @patch('main.questionary')
+    def test_view_statistics_query_count_is_constant(self, mock_questionary, *mocks):
+        mock_questionary.select.return_value.ask.return_value = "get longest streak"
+
+        def render(session):
+            with patch('main.session', session):
+                view_statistics()
+
+        small = self.count_statements(10, render)
+        self.assertEqual(small, self.count_statements(10000, render))
+        # The data version, the longest streaks and the ongoing habits.
+        self.assertLessEqual(small, 3)
+
+    @patch('builtins.input', return_value='')
+    @patch('builtins.print')
+    @patch('main.clear_screen')
+    @patch('main.questionary')
+    def test_repeated_view_statistics_only_checks_the_version(self, mock_questionary, *mocks):
+        mock_questionary.select.return_value.ask.return_value = "get longest streak"
+
+        def render(session, times=1):
+            with patch('main.session', session):
+                for _ in range(times):
+                    view_statistics()
+
+        once = self.count_statements(10, render)
+        self.assertEqual(once + 1, self.count_statements(10, lambda session: render(session, 2)))
+
+    @patch('builtins.print')
+    def test_checkin_habit_selects_once(self, mock_print):
+        def checkin(session):
+            HabitManager(session).checkin_habit(1)
+
+        self.assertEqual(1, self.count_statements(10, checkin, prefix='SELECT'))
+
+    @patch('habit.questionary.print')
+    def test_complete_habit_selects_once_per_unit_of_work(self, mock_print):
+        def complete(session):
+            manager = HabitManager(session)
+            with manager.unit_of_work():
+                self.assertIsNone(manager.get_completed_habit_by_habit_id(1))
+                self.assertIsNotNone(manager.get_habit_by_id(1))
+                self.assertTrue(manager.complete_habit(1))
+                manager.delete_checkpoints_for_completed_habit(1)
+                self.assertIsNone(manager.get_checkpoint_by_habit_id(1))
+                self.assertIsNotNone(manager.get_completion_by_habit_id(1))
+
+        self.assertEqual(1, self.count_statements(10, complete, prefix='SELECT'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import re
+import unittest
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from db.database_module import Base, create_indexes
+from habit import HabitManager
+
+# Queries that return every ongoing habit have to visit the habits table once.
+# Every other table they touch must still be read through an index.
+LISTING_TABLES = {
+    'list_habits': {'habits'},
+    'get_ongoing_habits': {'habits'},
+}
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+class TestQueryPlans(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.manager = HabitManager(self.session)
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self.record_statement)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self.record_statement)
+        self.session.close()
+
+    def record_statement(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            self.statements.append((statement, parameters))
+
+    def full_scans(self, operation):
+        """Runs a HabitManager operation and returns the tables it scans without an index."""
+        self.statements = []
+        operation()
+        self.assertNotEqual([], self.statements)
+        scanned = set()
+        with self.engine.connect() as connection:
+            for statement, parameters in self.statements:
+                for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters):
+                    match = FULL_SCAN.match(row[-1])
+                    if match:
+                        scanned.add(match.group(1))
+        return scanned
+
+    def assert_no_full_scan(self, name, operation):
+        with self.subTest(query=name):
+            self.assertEqual(set(), self.full_scans(operation) - LISTING_TABLES.get(name, set()))
+
+    def test_habit_manager_queries_use_indexes(self):
+        queries = {
+            'get_habit': lambda: self.manager.get_habit(1),
+            'get_habit_by_id': lambda: self.manager.get_habit_by_id(1),
+            'get_habit_by_name': lambda: self.manager.get_habit_by_name("smoking"),
+            'get_checkpoint_by_habit_id': lambda: self.manager.get_checkpoint_by_habit_id(1),
+            'get_completion_by_habit_id': lambda: self.manager.get_completion_by_habit_id(1),
+            'get_completed_habit_by_habit_id': lambda: self.manager.get_completed_habit_by_habit_id(1),
+            'has_checkpoint': lambda: self.manager.has_checkpoint(1),
+            'list_habits': self.manager.list_habits,
+            'get_ongoing_habits': self.manager.get_ongoing_habits,
+            'get_completed_habits': self.manager.get_completed_habits,
+            'find_broken_habits': self.manager.find_broken_habits,
+        }
+        for name, operation in queries.items():
+            self.assert_no_full_scan(name, operation)
+
+    def test_create_indexes_upgrades_existing_database(self):
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(self.engine)
+
+        create_indexes(self.engine)
+
+        self.assertEqual(set(), self.full_scans(lambda: self.manager.get_checkpoint_by_habit_id(1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
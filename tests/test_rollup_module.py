@@ -0,0 +1,114 @@
+import datetime
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import clock
+import main
+from db.database_module import Base, PeriodRollup
+from habit import HabitManager
+from rollup_module import (TrendRow, get_habit_trend, get_trend, period_start, period_starts, rebuild_rollups,
+                           verify_rollups)
+
+# A Wednesday.
+TODAY = datetime.date(2024, 7, 3)
+
+
+class TestPeriods(unittest.TestCase):
+
+    def test_period_start(self):
+        self.assertEqual(TODAY, period_start('day', TODAY))
+        self.assertEqual(datetime.date(2024, 7, 1), period_start('week', TODAY))
+        self.assertEqual(datetime.date(2024, 7, 1), period_start('week', datetime.date(2024, 7, 7)))
+        self.assertEqual(datetime.date(2024, 7, 1), period_start('month', TODAY))
+        with self.assertRaises(ValueError):
+            period_start('year', TODAY)
+
+    def test_period_starts(self):
+        self.assertEqual([datetime.date(2024, 5, 1), datetime.date(2024, 6, 1), datetime.date(2024, 7, 1)],
+                         period_starts('month', TODAY, 3))
+        self.assertEqual([datetime.date(2024, 6, 24), datetime.date(2024, 7, 1)], period_starts('week', TODAY, 2))
+
+
+@patch('builtins.print')
+@patch('habit.questionary.print')
+class TestRollups(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.manager = HabitManager(self.session)
+
+    def tearDown(self):
+        self.session.close()
+
+    def populate(self):
+        with clock.frozen(TODAY - datetime.timedelta(days=30)):
+            self.manager.add_habit('reading', 'daily', datetime.date.max)
+            self.manager.add_habit('running', 'weekly', datetime.date.max)
+        with clock.frozen(TODAY - datetime.timedelta(days=1)):
+            self.manager.add_habit('yoga', 'daily', datetime.date.max)
+            self.manager.checkin_habit(1)
+            self.manager.checkin_habits([(1, TODAY - datetime.timedelta(days=1)), (2, TODAY), (3, TODAY)])
+        with clock.frozen(TODAY):
+            self.manager.complete_habit(2)
+            self.manager.complete_habit(3)
+        with clock.frozen(TODAY + datetime.timedelta(days=40)):
+            self.manager.validate_habits(interactive=False)
+
+    def test_writes_keep_rollups_in_sync(self, *mocks):
+        self.populate()
+
+        self.assertEqual([], verify_rollups(self.session))
+        self.assertEqual([TrendRow(datetime.date(2024, 6, 3), 2, 2, 2, 0, 0, 0),
+                          TrendRow(datetime.date(2024, 6, 10), 0, 0, 0, 0, 0, 0)],
+                         get_trend(self.session, 'week', 2, end=datetime.date(2024, 6, 10)))
+        self.assertEqual(TrendRow(TODAY - datetime.timedelta(days=1), 1, 2, 3, 0, 0, 0),
+                         get_trend(self.session, 'day', 2, end=TODAY)[0])
+        self.assertEqual(TrendRow(TODAY, 0, 2, 2, 1, 1, 0), get_trend(self.session, 'day', 2, end=TODAY)[1])
+        self.assertEqual(TrendRow(datetime.date(2024, 7, 1), 1, 3, 5, 1, 1, 0),
+                         get_trend(self.session, 'month', 1, end=TODAY)[0])
+        self.assertEqual(TrendRow(datetime.date(2024, 8, 12), 0, 0, 0, 0, 1, 0),
+                         get_trend(self.session, 'day', 1, end=TODAY + datetime.timedelta(days=40))[0])
+        self.assertEqual([(datetime.date(2024, 7, 1), 0), (datetime.date(2024, 7, 2), 2)],
+                         get_habit_trend(self.session, 1, 'day', 2, end=datetime.date(2024, 7, 2)))
+        self.assertEqual(1, get_trend(self.session, 'week', 1, end=TODAY, periodicity='weekly')[0].active)
+
+    def test_writes_without_returning(self, *mocks):
+        with patch.object(self.session.get_bind().dialect, 'insert_returning', False):
+            self.populate()
+
+        self.assertEqual([], verify_rollups(self.session))
+        self.assertEqual(TrendRow(TODAY - datetime.timedelta(days=1), 1, 2, 3, 0, 0, 0),
+                         get_trend(self.session, 'day', 2, end=TODAY)[0])
+
+    def test_rebuild(self, *mocks):
+        self.populate()
+        expected = self.session.query(PeriodRollup).count()
+        self.session.query(PeriodRollup).filter_by(grain='day').delete()
+        self.session.commit()
+
+        self.assertNotEqual([], verify_rollups(self.session))
+        self.assertEqual(expected, rebuild_rollups(self.session))
+        self.assertEqual([], verify_rollups(self.session))
+
+    @patch('builtins.input', return_value='')
+    @patch('main.clear_screen')
+    @patch('main.questionary')
+    def test_trend_screen(self, mock_questionary, mock_clear_screen, mock_input, *mocks):
+        self.populate()
+        mock_questionary.select.return_value.ask.side_effect = ["completion trend", "day"]
+
+        with patch('main.session', self.session), clock.frozen(TODAY):
+            main.view_statistics()
+
+        lines = [call.args[0] for call in mock_questionary.print.call_args_list]
+        self.assertEqual(main.TREND_PERIODS, len(lines))
+        self.assertIn("1 successfully, 1 failed, 0 aborted, success rate 50%", lines[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import asyncio
+import datetime
+import importlib.util
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import clock
+from async_habit import AsyncHabitManager
+from db.database_module import Habit
+from scheduler import DueDateScheduler, seconds_until_due
+
+TODAY = datetime.date(2024, 7, 1)
+
+
+class TestHeap(unittest.TestCase):
+
+    def test_reschedule_and_unschedule(self):
+        scheduler = DueDateScheduler(manager=None)
+        scheduler.schedule(1, TODAY)
+        scheduler.schedule(2, TODAY + datetime.timedelta(days=1))
+        scheduler.schedule(3, TODAY - datetime.timedelta(days=1))
+        scheduler.schedule(1, TODAY + datetime.timedelta(days=7))
+        scheduler.unschedule(2)
+        scheduler.schedule(4, None)
+
+        self.assertEqual(2, len(scheduler))
+        self.assertEqual(TODAY - datetime.timedelta(days=1), scheduler.next_deadline())
+        self.assertEqual([3], scheduler.pop_due(TODAY + datetime.timedelta(days=7)))
+        self.assertEqual([1], scheduler.pop_due(TODAY + datetime.timedelta(days=8)))
+        self.assertIsNone(scheduler.next_deadline())
+
+    def test_stale_entries_are_compacted(self):
+        scheduler = DueDateScheduler(manager=None, batch_size=1)
+        for day in range(100):
+            scheduler.schedule(1, TODAY + datetime.timedelta(days=day))
+
+        self.assertLessEqual(len(scheduler._heap), 3)
+        self.assertEqual(TODAY + datetime.timedelta(days=99), scheduler.next_deadline())
+
+    def test_seconds_until_due(self):
+        now = datetime.datetime(2024, 7, 1, 18)
+
+        self.assertEqual(6 * 3600, seconds_until_due(TODAY, now))
+        self.assertEqual(0, seconds_until_due(TODAY - datetime.timedelta(days=1), now))
+
+
+@unittest.skipIf(importlib.util.find_spec('aiosqlite') is None, "aiosqlite is not installed")
+@patch('builtins.print')
+class TestDueDateScheduler(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.manager = await AsyncHabitManager.create(
+            'sqlite+aiosqlite:///' + os.path.join(self.directory.name, 'habits.db'))
+        with clock.frozen(TODAY):
+            self.daily = await self.manager.add_habit('reading', 'daily', datetime.date.max)
+            self.weekly = await self.manager.add_habit('running', 'weekly', datetime.date.max)
+            self.completed = await self.manager.add_habit('yoga', 'daily', datetime.date.max)
+            await self.manager.complete_habit(self.completed.id)
+
+    async def asyncTearDown(self):
+        await self.manager.close()
+        self.directory.cleanup()
+
+    async def test_only_due_habits_are_validated(self, mock_print):
+        scheduler = DueDateScheduler(self.manager)
+        await scheduler.refresh()
+
+        self.assertEqual(2, len(scheduler))
+        with clock.frozen(TODAY + datetime.timedelta(days=1)):
+            self.assertEqual([], await scheduler.run_due())
+        with clock.frozen(TODAY + datetime.timedelta(days=2)):
+            broken_habits = await scheduler.run_due()
+
+        self.assertEqual([self.daily.id], [broken_habit.id for broken_habit in broken_habits])
+        self.assertEqual(TODAY + datetime.timedelta(days=2), broken_habits[0].completion_date)
+        self.assertEqual([self.weekly.id], list(scheduler._deadlines))
+
+    async def add_unchecked_habit(self, name, periodicity):
+        def add(manager):
+            habit = Habit(name=name, periodicity=periodicity, created_at=TODAY, target_date=datetime.date.max)
+            manager.session.add(habit)
+            manager.session.commit()
+            return habit.id
+
+        return await self.manager.run(add)
+
+    async def test_habits_without_checkin_are_validated(self, mock_print):
+        scheduler = DueDateScheduler(self.manager)
+        # Written before the first refresh, e.g. by another process.
+        polled = await self.add_unchecked_habit('stretching', 'daily')
+        await scheduler.refresh()
+        scheduler.listen()
+        try:
+            inserted = await self.add_unchecked_habit('swimming', 'weekly')
+        finally:
+            scheduler.ignore()
+
+        self.assertEqual(TODAY + datetime.timedelta(days=1), scheduler._deadlines[polled])
+        self.assertEqual(TODAY + datetime.timedelta(days=7), scheduler._deadlines[inserted])
+        with clock.frozen(TODAY + datetime.timedelta(days=8)):
+            broken_habits = await scheduler.run_due()
+
+        self.assertEqual({self.daily.id, self.weekly.id, polled, inserted},
+                         {broken_habit.id for broken_habit in broken_habits})
+        self.assertEqual(0, len(scheduler))
+
+    async def test_checkins_move_deadlines(self, mock_print):
+        scheduler = DueDateScheduler(self.manager)
+        await scheduler.refresh()
+        scheduler.listen()
+        try:
+            await self.manager.run(lambda manager: manager.checkin_habit(self.daily.id,
+                                                                         TODAY + datetime.timedelta(days=1)))
+        finally:
+            scheduler.ignore()
+
+        self.assertEqual(TODAY + datetime.timedelta(days=2), scheduler._deadlines[self.daily.id])
+        with clock.frozen(TODAY + datetime.timedelta(days=2)):
+            self.assertEqual([], await scheduler.run_due())
+            self.assertEqual([], scheduler.pop_due())
+
+    async def test_missed_checkins_are_rescheduled(self, mock_print):
+        scheduler = DueDateScheduler(self.manager)
+        await scheduler.refresh()
+        # A check-in of another process, which the heap does not see.
+        await self.manager.run(lambda manager: manager.checkin_habit(self.daily.id,
+                                                                     TODAY + datetime.timedelta(days=1)))
+
+        with clock.frozen(TODAY + datetime.timedelta(days=2)):
+            self.assertEqual([], await scheduler.run_due())
+        self.assertEqual(TODAY + datetime.timedelta(days=2), scheduler._deadlines[self.daily.id])
+
+    async def test_run_until_stopped(self, mock_print):
+        reported = []
+        scheduler = DueDateScheduler(self.manager, poll_seconds=0.01, on_broken=reported.extend)
+
+        with clock.frozen(TODAY + datetime.timedelta(days=10)):
+            task = asyncio.create_task(scheduler.run())
+            while len(reported) < 2:
+                await asyncio.sleep(0.01)
+            habit = await self.manager.add_habit('swimming', 'daily', datetime.date.max)
+            await asyncio.sleep(0.05)
+            scheduler.stop()
+            await asyncio.wait_for(task, 5)
+
+        self.assertEqual({self.daily.id, self.weekly.id}, {broken_habit.id for broken_habit in reported})
+        self.assertEqual(TODAY + datetime.timedelta(days=11), scheduler._deadlines[habit.id])
+
+
+if __name__ == '__main__':
+    unittest.main()
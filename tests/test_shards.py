@@ -0,0 +1,61 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import analytics_module
+from db.config import load_settings
+from db.shards import ShardRouter
+
+
+@patch('builtins.print')
+class TestShardRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.router = ShardRouter(load_settings(environ={}), directory=self.directory.name, max_open=2)
+
+    def tearDown(self):
+        self.router.dispose()
+        self.directory.cleanup()
+
+    def add_habits(self, tenant, *names):
+        with self.router.habit_manager(tenant) as manager:
+            for name in names:
+                manager.add_habit(name, "daily", datetime.date.max)
+
+    def test_tenants_are_isolated(self, mock_print):
+        self.add_habits('alice', 'yoga', 'reading')
+        self.add_habits('bob', 'running')
+
+        with self.router.habit_manager('bob') as manager:
+            self.assertEqual(['running'], [habit.name for habit in manager.list_habits()])
+        self.assertEqual(['alice', 'bob'], self.router.tenants())
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, 'tenant_alice.db')))
+
+    def test_engines_are_evicted_least_recently_used_first(self, mock_print):
+        for tenant in ('a', 'b', 'a', 'c'):
+            self.router.get_engine(tenant)
+
+        self.assertEqual(['a', 'c'], self.router.open_tenants())
+
+    def test_invalid_tenant_ids_are_rejected(self, mock_print):
+        for tenant in ('../etc', '', 'a b', 'alice\n'):
+            with self.assertRaises(ValueError):
+                self.router.path_for(tenant)
+
+    def test_analyze_tenants_fans_out(self, mock_print):
+        self.add_habits('alice', 'yoga', 'reading')
+        self.add_habits('bob', 'running')
+        self.add_habits('carol', 'rowing')
+
+        result = analytics_module.analyze_tenants(self.router)
+
+        self.assertEqual([('alice', 'yoga'), ('alice', 'reading'), ('bob', 'running'), ('carol', 'rowing')],
+                         [(habit.tenant, habit.name) for habit in result['daily_habits']])
+        self.assertEqual(0, result['longest ongoing streak'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import analytics_module
+from db.database_module import Base, Habit, Completion, Checkpoint, to_day_number
+from habit import HabitManager
+from snapshot import NULL_DAY, Snapshot, export_snapshot
+
+TODAY = datetime.date(2024, 7, 1)
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'habits.snapshot')
+        self.engine = create_engine('sqlite:///' + os.path.join(self.directory.name, 'habits.db'))
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        days = datetime.timedelta
+        self.session.add_all([
+            Habit(id=1, name='reading', periodicity='daily', created_at=TODAY - days(10), target_date=None,
+                  checkpoints=[Checkpoint(current_checkpoint=TODAY - days(2)), Checkpoint(current_checkpoint=TODAY)]),
+            Habit(id=2, name='läufen 🏃', periodicity='weekly', created_at=TODAY - days(30),
+                  target_date=TODAY + days(30), checkpoints=[Checkpoint(current_checkpoint=TODAY)]),
+            Habit(id=3, name='yoga', periodicity='daily', created_at=TODAY - days(40),
+                  completions=[Completion(completion_status='SUCCESSFULLY', completion_date=TODAY - days(5)),
+                               Completion(completion_status='FAILED', completion_date=TODAY)]),
+            Habit(id=4, name='', periodicity='monthly', created_at=TODAY - days(50),
+                  checkpoints=[Checkpoint(current_checkpoint=TODAY)]),
+            Habit(id=5, name='no checkpoint', periodicity='daily', created_at=TODAY),
+        ])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def test_columns(self):
+        self.assertEqual({'habits': 5, 'completions': 2, 'checkpoints': 4}, export_snapshot(self.session, self.path))
+
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(5, len(snapshot))
+            self.assertEqual([1, 2, 3, 4, 5], snapshot.column('habits', 'id').tolist())
+            self.assertEqual(['reading', 'läufen 🏃', 'yoga', '', 'no checkpoint'],
+                             [snapshot.name(index) for index in range(len(snapshot))])
+            self.assertEqual([NULL_DAY, to_day_number(TODAY + datetime.timedelta(days=30)), NULL_DAY, NULL_DAY,
+                              NULL_DAY], snapshot.column('habits', 'target_date').tolist())
+            self.assertEqual(['daily', 'weekly', 'daily', 'monthly', 'daily'],
+                             [snapshot.values('habits', 'periodicity')[code]
+                              for code in snapshot.column('habits', 'periodicity')])
+            self.assertEqual(['SUCCESSFULLY', 'FAILED'],
+                             [snapshot.values('completions', 'completion_status')[code]
+                              for code in snapshot.column('completions', 'completion_status')])
+            self.assertEqual(4, snapshot.column('checkpoints', 'current_checkpoint').itemsize)
+
+    def test_analyze_snapshot_equals_analyze_habits_in_db(self):
+        export_snapshot(self.session, self.path)
+
+        with Snapshot(self.path) as snapshot:
+            result = analytics_module.analyze_snapshot(snapshot)
+
+        self.assertEqual(analytics_module.analyze_habits_in_db(HabitManager(self.session)), result)
+        self.assertEqual((50, 35), (result['longest ongoing streak'], result['longest total streak']))
+
+    @patch('builtins.print')
+    def test_export_replaces_snapshot_in_use(self, mock_print):
+        export_snapshot(self.session, self.path)
+        with Snapshot(self.path) as snapshot:
+            HabitManager(self.session).add_habit('running', 'daily', datetime.date.max)
+            export_snapshot(self.session, self.path)
+
+            self.assertEqual(5, len(snapshot))
+        with Snapshot(self.path) as snapshot:
+            self.assertEqual(6, len(snapshot))
+
+    def test_rejects_other_files(self):
+        path = os.path.join(self.directory.name, 'habits.db')
+
+        with self.assertRaises(ValueError):
+            Snapshot(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
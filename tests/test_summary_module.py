@@ -0,0 +1,105 @@
+import datetime
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import analytics_module
+from db.database_module import Base, Habit, Checkpoint, HabitSummary
+from habit import HabitManager
+from summary_module import rebuild_summaries, verify_summaries
+
+
+@patch('builtins.print')
+class TestHabitSummaries(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.manager = HabitManager(self.session)
+        self.today = datetime.date.today()
+
+    def tearDown(self):
+        self.session.close()
+
+    def add_habit(self, habit_id, days_ago, periodicity="daily"):
+        self.session.add(Habit(id=habit_id, name="habit " + str(habit_id), periodicity=periodicity,
+                               created_at=self.today - datetime.timedelta(days=days_ago),
+                               target_date=datetime.date.max))
+        self.session.commit()
+        self.manager.checkin_habit(habit_id)
+
+    def summary(self, habit_id):
+        self.session.expire_all()
+        summary = self.session.get(HabitSummary, habit_id)
+        return summary.current_streak, summary.best_streak, summary.status
+
+    def test_writes_keep_summaries_in_sync(self, mock_print):
+        self.add_habit(1, 5)
+        self.add_habit(2, 7, periodicity="weekly")
+        self.add_habit(3, 9)
+        self.manager.checkin_habit(1)
+        self.manager.complete_habit(2)
+        checkpoint = self.manager.get_checkpoint_by_habit_id(3)
+        checkpoint.next_checkpoint = self.today - datetime.timedelta(days=1)
+        self.session.commit()
+        self.manager.validate_habits(interactive=False)
+
+        self.assertEqual((5, 5, "ONGOING"), self.summary(1))
+        self.assertEqual((7, 7, "SUCCESSFULLY"), self.summary(2))
+        self.assertEqual((9, 9, "FAILED"), self.summary(3))
+        self.assertEqual([], verify_summaries(self.session))
+
+    def test_checkin_keeps_completed_summary(self, mock_print):
+        self.add_habit(1, 5)
+        self.manager.complete_habit(1)
+        self.manager.checkin_habit(1, self.today + datetime.timedelta(days=1))
+
+        self.assertEqual((5, 5, "SUCCESSFULLY"), self.summary(1))
+        self.assertEqual([], verify_summaries(self.session))
+
+    def test_analyze_habits_from_summary_matches_orm(self, mock_print):
+        self.add_habit(1, 5)
+        self.add_habit(2, 7, periodicity="weekly")
+        self.add_habit(3, 9)
+        self.manager.complete_habit(3)
+
+        expected = analytics_module.analyze_habits(self.manager)
+        result = analytics_module.analyze_habits_from_summary(self.manager)
+
+        self.assertEqual(expected['longest ongoing streak'], result['longest ongoing streak'])
+        self.assertEqual(expected['longest total streak'], result['longest total streak'])
+        self.assertEqual([1], [habit.id for habit in result['daily_habits']])
+        self.assertEqual([(2, 7)], [(habit.id, habit.streak) for habit in result['weekly_habits']])
+
+    def test_analyze_habits_from_summary_matches_sql(self, mock_print):
+        self.add_habit(1, 5)
+        self.add_habit(2, 7, periodicity="weekly")
+        self.manager.complete_habit(2)
+        # Never checked in, so it has no summary.
+        self.session.add(Habit(id=3, name="habit 3", periodicity="daily", created_at=self.today,
+                               target_date=datetime.date.max))
+        self.session.commit()
+
+        result = analytics_module.analyze_habits_from_summary(self.manager)
+
+        self.assertEqual(analytics_module.analyze_habits_in_db(self.manager), result)
+        self.assertEqual([(1, 5), (3, 0)], [(habit.id, habit.streak) for habit in result['daily_habits']])
+
+    def test_rebuild_and_verify(self, mock_print):
+        self.add_habit(1, 5)
+        self.add_habit(2, 7)
+        self.session.query(HabitSummary).filter_by(habit_id=1).delete()
+        self.session.get(Checkpoint, 2).current_checkpoint = self.today - datetime.timedelta(days=1)
+        self.session.commit()
+
+        self.assertEqual([1, 2], verify_summaries(self.session))
+        self.assertEqual(2, rebuild_summaries(self.session))
+        self.assertEqual([], verify_summaries(self.session))
+        self.assertEqual((6, 6, "ONGOING"), self.summary(2))
+
+
+if __name__ == '__main__':
+    unittest.main()